@@ -1,4 +1,7 @@
 import json
+import os
+
+from ai_modules.rule_compiler import CompiledRules, compile_rules
 
 def load_rules(filepath="rules.json"):
     """Loads the knowledge base from a JSON file."""
@@ -12,66 +15,16 @@ def load_rules(filepath="rules.json"):
         print(f"Error: Could not decode JSON from {filepath}")
         return []
 
-def check_condition(fact_value, operator, rule_value):
-    """
-    Checks if a single fact condition is met.
-    This is the core of the reasoning logic.
-    """
-    try:
-        # Check for numeric comparisons
-        if operator == "greater_than":
-            return float(fact_value) > float(rule_value)
-        if operator == "less_than":
-            return float(fact_value) < float(rule_value)
-        
-        # Check for string equality
-        if operator == "equals":
-            return str(fact_value) == str(rule_value)
-        
-        # You can easily add more operators
-        # if operator == "not_equals":
-        #     return str(fact_value) != str(rule_value)
-            
-    except Exception as e:
-        print(f"Warning: Could not check condition ({fact_value} {operator} {rule_value}). Error: {e}")
-        return False
-    return False
-
 def run_inference_engine(facts, rules):
     """
     Runs the inference engine (forward chaining) to get recommendations.
     This is the XAI "glass box" part.
+    `rules` is either the raw rules.json list or a CompiledRules (compile once
+    at startup, see rule_compiler.py). Each recommendation is a fresh dict:
+    the 'then' block plus the rule name as 'reason'.
     """
-    triggered_recommendations = []
-    
-    # Loop through every rule in the knowledge base
-    for rule in rules:
-        all_conditions_met = True
-        
-        # Check every 'if' condition for the rule
-        for condition in rule['if']:
-            fact_name = condition['fact']
-            
-            if fact_name not in facts:
-                # If we don't have the fact, this rule can't fire
-                all_conditions_met = False
-                break
-            
-            fact_value = facts[fact_name]
-            
-            # If any condition is false, stop checking this rule
-            if not check_condition(fact_value, condition['operator'], condition['value']):
-                all_conditions_met = False
-                break
-        
-        # If all conditions were true, this rule "fires"!
-        if all_conditions_met:
-            # We add the 'then' block AND the rule name for explainability
-            recommendation = rule['then']
-            recommendation['reason'] = rule['rule_name'] # This is the XAI
-            triggered_recommendations.append(recommendation)
-            
-    return triggered_recommendations
+    compiled = rules if isinstance(rules, CompiledRules) else compile_rules(rules)
+    return [dict(output) for output in compiled.evaluate(facts)]
 
 # --- This is how we test our engine ---
 if __name__ == "__main__":
@@ -96,8 +49,8 @@ if __name__ == "__main__":
     print(f"--- Running Advisor Engine ---")
     print(f"Facts loaded: {json.dumps(mock_facts, indent=2)}\n")
     
-    # 2. Load the rules (from the updated rules.json)
-    all_rules = load_rules("rules.json")
+    # 2. Load the rules (from the updated rules.json) - run with: python -m ai_modules.advisor_engine
+    all_rules = compile_rules(load_rules(os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules.json")))
     
     if all_rules:
         # 3. Run the engine
@@ -0,0 +1,176 @@
+# distance_cache.py
+# -----------------------------------------------
+# 🗃️ Purpose: Persistent cache of Google driving distances between coordinate pairs.
+# Branches and clients don't move, so a distance fetched once is reused by
+# every later /planning/route call; only pairs missing from the cache go to
+# the Distance Matrix API.
+#
+# - Backed by one SQLite file (WAL mode), shared by the API process and the
+#   optimizer worker processes
+# - Keys are coordinates rounded to COORD_DECIMALS (5 decimals ~ 1 m)
+# - Entries older than FINSIGHT_DISTANCE_CACHE_TTL seconds count as misses
+# - At most FINSIGHT_DISTANCE_CACHE_SIZE pairs; least recently used go first
+# - Hit / miss / store / eviction counters are kept in the same file, so
+#   they add up across processes
+# -----------------------------------------------
+
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+DISTANCE_CACHE_PATH = os.getenv("FINSIGHT_DISTANCE_CACHE_PATH", os.path.join(DATA_DIR, "distance_cache.sqlite3"))
+DISTANCE_CACHE_TTL = int(os.getenv("FINSIGHT_DISTANCE_CACHE_TTL", str(30 * 24 * 3600)))
+DISTANCE_CACHE_SIZE = int(os.getenv("FINSIGHT_DISTANCE_CACHE_SIZE", "2000000"))
+COORD_DECIMALS = 5
+TOUCH_INTERVAL = 3600   # last_used is refreshed at most once an hour per pair
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS distance_pair (
+        origin TEXT NOT NULL,
+        destination TEXT NOT NULL,
+        km REAL NOT NULL,
+        fetched_at REAL NOT NULL,
+        last_used REAL NOT NULL,
+        PRIMARY KEY (origin, destination)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_distance_pair_last_used ON distance_pair (last_used)",
+    """
+    CREATE TABLE IF NOT EXISTS cache_metric (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    )
+    """,
+]
+METRICS = ("hits", "misses", "stores", "evictions")
+
+
+def coord_key(lat, lon):
+    """Cache key for a point: rounded "lat,lon"."""
+    return f"{float(lat):.{COORD_DECIMALS}f},{float(lon):.{COORD_DECIMALS}f}"
+
+
+class DistanceCache:
+    """Pairwise distance cache in SQLite; one connection per process."""
+
+    def __init__(self, path=DISTANCE_CACHE_PATH, ttl_seconds=DISTANCE_CACHE_TTL, max_entries=DISTANCE_CACHE_SIZE):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    def _connection(self):
+        # Forked worker processes must not reuse the parent's connection
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def _bump(self, conn, **counts):
+        conn.executemany(
+            "INSERT INTO cache_metric (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            [(name, int(value)) for name, value in counts.items() if value]
+        )
+
+    def lookup(self, keys):
+        """
+        Cached distances between every pair of the given keys.
+        Returns a (len(keys), len(keys)) float64 array with NaN where the
+        pair is missing or expired (the diagonal is left to the caller).
+        """
+        n = len(keys)
+        found = np.full((n, n), np.nan)
+        if n == 0:
+            return found
+        index = {key: i for i, key in enumerate(keys)}
+        now = time.time()
+
+        with self._lock:
+            conn = self._connection()
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS lookup_key (k TEXT PRIMARY KEY)")
+            conn.execute("DELETE FROM lookup_key")
+            conn.executemany("INSERT OR IGNORE INTO lookup_key (k) VALUES (?)", [(k,) for k in index])
+            rows = conn.execute(
+                """
+                SELECT p.origin, p.destination, p.km, p.last_used
+                FROM distance_pair p
+                JOIN lookup_key o ON p.origin = o.k
+                JOIN lookup_key d ON p.destination = d.k
+                WHERE p.fetched_at >= ?
+                """,
+                (now - self.ttl_seconds,)
+            ).fetchall()
+
+            stale = []
+            for origin, destination, km, last_used in rows:
+                found[index[origin], index[destination]] = km
+                if last_used < now - TOUCH_INTERVAL:
+                    stale.append((now, origin, destination))
+            if stale:
+                conn.executemany("UPDATE distance_pair SET last_used = ? WHERE origin = ? AND destination = ?", stale)
+
+            hits = len(rows)
+            self._bump(conn, hits=hits, misses=n * (n - 1) - hits)
+            conn.commit()
+        return found
+
+    def store(self, entries):
+        """Saves [(origin_key, destination_key, km), ...] and enforces the size limit."""
+        if not entries:
+            return 0
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                "INSERT OR REPLACE INTO distance_pair (origin, destination, km, fetched_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(o, d, float(km), now, now) for o, d, km in entries]
+            )
+            evicted = self._evict(conn, now)
+            self._bump(conn, stores=len(entries), evictions=evicted)
+            conn.commit()
+        return len(entries)
+
+    def _evict(self, conn, now):
+        expired = conn.execute("DELETE FROM distance_pair WHERE fetched_at < ?", (now - self.ttl_seconds,)).rowcount
+        excess = conn.execute("SELECT COUNT(*) FROM distance_pair").fetchone()[0] - self.max_entries
+        if excess > 0:
+            conn.execute(
+                """
+                DELETE FROM distance_pair WHERE (origin, destination) IN (
+                    SELECT origin, destination FROM distance_pair ORDER BY last_used LIMIT ?
+                )
+                """,
+                (excess,)
+            )
+        return max(expired, 0) + max(excess, 0)
+
+    def stats(self):
+        with self._lock:
+            conn = self._connection()
+            snapshot = {name: 0 for name in METRICS}
+            snapshot.update(dict(conn.execute("SELECT name, value FROM cache_metric").fetchall()))
+            snapshot["entries"] = conn.execute("SELECT COUNT(*) FROM distance_pair").fetchone()[0]
+        lookups = snapshot["hits"] + snapshot["misses"]
+        snapshot["hit_rate"] = round(snapshot["hits"] / lookups, 4) if lookups else 0.0
+        snapshot["max_entries"] = self.max_entries
+        snapshot["ttl_seconds"] = self.ttl_seconds
+        snapshot["path"] = self.path
+        return snapshot
+
+
+distance_cache = DistanceCache()
@@ -0,0 +1,184 @@
+# distance_fetcher.py
+# -----------------------------------------------
+# 🌐 Purpose: Concurrent, rate-limited Google Distance Matrix fetching.
+# 1. The missing cells of the matrix are tiled into origin x destination
+#    blocks of TILE_SIDE x TILE_SIDE (= 100 elements, Google's per-request
+#    element limit; 25 origins / destinations is the per-side limit)
+# 2. Tiles are fetched in parallel over one pooled keep-alive session
+#    (FINSIGHT_GOOGLE_CONCURRENCY requests in flight)
+# 3. A token bucket keeps the element rate under the account quota
+#    (FINSIGHT_GOOGLE_ELEMENTS_PER_SECOND)
+# 4. Transient failures are retried with jittered exponential backoff; the
+#    sleep only holds that tile's worker, never the others. A tile that
+#    still fails keeps the caller's haversine fallback for its block.
+# -----------------------------------------------
+
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+GOOGLE_MAPS_BASE_URL = os.getenv("FINSIGHT_GOOGLE_MAPS_BASE_URL", "https://maps.googleapis.com")  # point at distance_matrix_stub.py locally
+TILE_SIDE = 10   # 10 x 10 = 100 elements per request
+FETCH_CONCURRENCY = int(os.getenv("FINSIGHT_GOOGLE_CONCURRENCY", "8"))
+ELEMENTS_PER_SECOND = float(os.getenv("FINSIGHT_GOOGLE_ELEMENTS_PER_SECOND", "1000"))
+RETRY_STATUSES = {"OVER_QUERY_LIMIT", "UNKNOWN_ERROR"}   # top-level statuses worth retrying
+
+_session = None
+_session_pid = None
+_bucket = None
+_state_lock = threading.Lock()
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(rate, TILE_SIDE * TILE_SIDE))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def http_session():
+    """Per-process pooled keep-alive session for all Google Maps calls."""
+    global _session, _session_pid
+    with _state_lock:
+        if _session is None or _session_pid != os.getpid():
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(FETCH_CONCURRENCY, 4))
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session, _session_pid = session, os.getpid()
+        return _session
+
+
+def _rate_limiter():
+    global _bucket
+    with _state_lock:
+        if _bucket is None:
+            _bucket = TokenBucket(ELEMENTS_PER_SECOND)
+        return _bucket
+
+
+class _PermanentError(Exception):
+    """A request Google will keep rejecting (bad key, invalid request): not retried."""
+
+
+def call_distance_matrix(origins_coords, destinations_coords, api_key, timeout):
+    """
+    Single request to Google Distance Matrix for the given origins/destinations.
+    origins_coords/destinations_coords are lists of "lat,lon" strings.
+    Returns JSON dict (raises requests exceptions on HTTP issues).
+    """
+    url = f"{GOOGLE_MAPS_BASE_URL}/maps/api/distancematrix/json"
+    params = {
+        "origins": "|".join(origins_coords),
+        "destinations": "|".join(destinations_coords),
+        "key": api_key,
+        "mode": "driving",
+        "units": "metric"
+    }
+    resp = http_session().get(url, params=params, timeout=timeout)
+    resp.raise_for_status()
+    return resp.json()
+
+
+def plan_tiles(missing, side=TILE_SIDE):
+    """
+    Splits the missing cells of a square boolean matrix into request tiles.
+    Returns [(origin_indices, destination_indices), ...], each at most side x side,
+    and only over destinations that origin block still lacks.
+    """
+    tiles = []
+    rows = np.nonzero(missing.any(axis=1))[0]
+    for start in range(0, len(rows), side):
+        block = rows[start:start + side]
+        cols = np.nonzero(missing[block].any(axis=0))[0]
+        for col_start in range(0, len(cols), side):
+            tiles.append((block, cols[col_start:col_start + side]))
+    return tiles
+
+
+def _describe(error, api_key):
+    # requests puts the full URL (including key=...) into its error messages
+    return str(error).replace(api_key, "***") if api_key else str(error)
+
+
+def _fetch_tile(keys, origins, destinations, api_key, max_retries, timeout):
+    """Returns ([(i, j, km), ...], ok) for one tile."""
+    for attempt in range(1, max_retries + 1):
+        try:
+            if attempt > 1:
+                time.sleep(0.5 * (2 ** (attempt - 2)) * (1 + random.random()))
+            _rate_limiter().acquire(len(origins) * len(destinations))
+
+            resp_json = call_distance_matrix(
+                [keys[i] for i in origins], [keys[j] for j in destinations], api_key, timeout
+            )
+            status = resp_json.get("status", "")
+            if status != "OK":
+                message = f"Distance Matrix top-level status: {status} ({resp_json.get('error_message')})"
+                raise RuntimeError(message) if status in RETRY_STATUSES else _PermanentError(message)
+
+            found = []
+            for ri, row in enumerate(resp_json.get("rows", [])):
+                for ci, elem in enumerate(row.get("elements", [])):
+                    if elem.get("status") == "OK" and "distance" in elem and "value" in elem["distance"]:
+                        found.append((int(origins[ri]), int(destinations[ci]), float(elem["distance"]["value"]) / 1000.0))
+            return found, True
+
+        except _PermanentError as e:
+            print(f"[DistanceFetcher] tile failed permanently: {_describe(e, api_key)}")
+            return [], False
+        except Exception as e:
+            if isinstance(e, requests.HTTPError) and e.response is not None and 400 <= e.response.status_code < 500 \
+                    and e.response.status_code != 429:
+                print(f"[DistanceFetcher] tile failed permanently: {_describe(e, api_key)}")
+                return [], False
+            print(f"[DistanceFetcher] tile attempt {attempt}/{max_retries} error: {_describe(e, api_key)}")
+    return [], False
+
+
+def fetch_missing_distances(keys, missing, api_key, max_retries=3, timeout=10, concurrency=FETCH_CONCURRENCY):
+    """
+    Fetches every missing (True) cell of the keys x keys matrix.
+    keys are "lat,lon" strings. Returns [(i, j, km), ...] for the cells Google answered.
+    """
+    tiles = plan_tiles(missing)
+    if not tiles:
+        return []
+    started = time.perf_counter()
+    found, failed = [], 0
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(tiles))), thread_name_prefix="finsight-gmaps") as pool:
+        futures = [
+            pool.submit(_fetch_tile, keys, origins, destinations, api_key, max_retries, timeout)
+            for origins, destinations in tiles
+        ]
+        for future in futures:
+            tile_found, ok = future.result()
+            # Tiles are rectangular, so they also cover some cells that were already known
+            found.extend(cell for cell in tile_found if missing[cell[0], cell[1]])
+            failed += not ok
+    print(f"[DistanceFetcher] {len(tiles)} tiles ({len(found)} distances) in {time.perf_counter() - started:.2f}s, "
+          f"{failed} tile(s) kept the haversine fallback.")
+    return found
@@ -0,0 +1,69 @@
+# distance_matrix.py
+# -----------------------------------------------
+# 📏 Purpose: Dense distance matrix engine for the route optimizer.
+# All-pairs haversine distances are computed in one vectorized NumPy
+# operation into an (n, n) float64 array; node ids map to row/column
+# indices. Optimizers index the array directly instead of walking
+# dict-of-dicts keyed by str(id), so a 1,000-stop matrix takes
+# milliseconds rather than seconds of Python loops.
+# -----------------------------------------------
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_matrix(lats, lons, dest_lats=None, dest_lons=None):
+    """
+    Great-circle distances in km between every origin and every destination.
+    Returns an array of shape (len(lats), len(dest_lats)); destinations
+    default to the origins (square all-pairs matrix).
+    """
+    lat1 = np.radians(np.asarray(lats, dtype=np.float64))[:, None]
+    lon1 = np.radians(np.asarray(lons, dtype=np.float64))[:, None]
+    lat2 = lat1.T if dest_lats is None else np.radians(np.asarray(dest_lats, dtype=np.float64))[None, :]
+    lon2 = lon1.T if dest_lons is None else np.radians(np.asarray(dest_lons, dtype=np.float64))[None, :]
+
+    a = (np.sin((lat2 - lat1) / 2) ** 2 +
+         np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    np.clip(a, 0.0, 1.0, out=a)
+    return EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+class DistanceMatrix:
+    """
+    Dense distance matrix in km.
+    - ids:   node ids as strings, in row/column order
+    - km:    float64 array, km[i, j] = distance from ids[i] to ids[j]
+    - index: id -> row/column index
+    """
+
+    def __init__(self, ids, km):
+        self.ids = [str(i) for i in ids]
+        self.km = np.asarray(km, dtype=np.float64)
+        self.index = {node_id: i for i, node_id in enumerate(self.ids)}
+
+    @classmethod
+    def from_locations(cls, locations, tortuosity=1.0):
+        """
+        Straight-line matrix for a list of { 'id', 'lat', 'lon' } dicts,
+        scaled by `tortuosity` to approximate road distance.
+        """
+        lats = [loc["lat"] for loc in locations]
+        lons = [loc["lon"] for loc in locations]
+        km = haversine_matrix(lats, lons)
+        if tortuosity != 1.0:
+            km = np.round(km * tortuosity, 6)
+        np.fill_diagonal(km, 0.0)
+        return cls([loc.get("id", loc.get("name", "")) for loc in locations], km)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def distance(self, from_id, to_id):
+        return float(self.km[self.index[str(from_id)], self.index[str(to_id)]])
+
+    def to_dict(self):
+        """Legacy dict-of-dicts view: matrix[from_id][to_id] = km."""
+        rows = self.km.tolist()
+        return {from_id: dict(zip(self.ids, row)) for from_id, row in zip(self.ids, rows)}
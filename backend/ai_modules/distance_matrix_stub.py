@@ -0,0 +1,133 @@
+# distance_matrix_stub.py
+# -----------------------------------------------
+# 🧪 Purpose: Local stand-in for the Google Distance Matrix / Directions APIs.
+# Answers in Google's JSON format with haversine x STUB_TORTUOSITY, counts
+# requests and elements, and never bills anything. Point the optimizer at it:
+#
+#   python -m ai_modules.distance_matrix_stub --port 8765
+#   FINSIGHT_GOOGLE_MAPS_BASE_URL=http://127.0.0.1:8765 uvicorn main:app
+#
+# GET /stats returns the counters (handy to check what the cache saved);
+# --latency-ms and --fail-rate simulate a slow / flaky upstream.
+# -----------------------------------------------
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from ai_modules.distance_matrix import haversine_matrix
+
+STUB_TORTUOSITY = 1.3
+
+
+def _parse_points(value):
+    points = []
+    for part in value.split("|"):
+        lat, lon = part.split(",")
+        points.append((float(lat), float(lon)))
+    return points
+
+
+class StubState:
+    def __init__(self, latency_ms=0, fail_rate=0.0):
+        self.latency_ms = latency_ms
+        self.fail_rate = fail_rate
+        self.lock = threading.Lock()
+        self.counters = {"matrix_requests": 0, "matrix_elements": 0, "directions_requests": 0, "failures": 0}
+
+    def count(self, **increments):
+        with self.lock:
+            for name, value in increments.items():
+                self.counters[name] += value
+
+
+def distance_matrix_response(origins, destinations):
+    km = haversine_matrix(
+        [p[0] for p in origins], [p[1] for p in origins],
+        [p[0] for p in destinations], [p[1] for p in destinations]
+    ) * STUB_TORTUOSITY
+    return {
+        "status": "OK",
+        "origin_addresses": [f"{lat},{lon}" for lat, lon in origins],
+        "destination_addresses": [f"{lat},{lon}" for lat, lon in destinations],
+        "rows": [
+            {"elements": [
+                {"status": "OK",
+                 "distance": {"value": int(round(d * 1000)), "text": f"{d:.1f} km"},
+                 "duration": {"value": int(round(d / 25 * 3600)), "text": f"{d / 25 * 60:.0f} mins"}}
+                for d in row
+            ]}
+            for row in km.tolist()
+        ],
+    }
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            if url.path == "/stats":
+                with state.lock:
+                    return self._send(200, dict(state.counters))
+
+            if state.latency_ms:
+                time.sleep(state.latency_ms / 1000.0)
+            if state.fail_rate and random.random() < state.fail_rate:
+                state.count(failures=1)
+                return self._send(500, {"status": "UNKNOWN_ERROR"})
+
+            if url.path == "/maps/api/distancematrix/json":
+                origins = _parse_points(params["origins"])
+                destinations = _parse_points(params["destinations"])
+                state.count(matrix_requests=1, matrix_elements=len(origins) * len(destinations))
+                return self._send(200, distance_matrix_response(origins, destinations))
+
+            if url.path == "/maps/api/directions/json":
+                # No polyline encoder here; a Directions failure makes the optimizer keep straight lines
+                state.count(directions_requests=1)
+                return self._send(200, {"status": "ZERO_RESULTS", "routes": []})
+
+            self._send(404, {"status": "NOT_FOUND"})
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return Handler
+
+
+def start_stub_server(host="127.0.0.1", port=0, latency_ms=0, fail_rate=0.0):
+    """Starts the stub in a background thread; returns (server, base_url). Call server.shutdown() to stop."""
+    state = StubState(latency_ms, fail_rate)
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Google Distance Matrix stub.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=int, default=0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server, base_url = start_stub_server(args.host, args.port, args.latency_ms, args.fail_rate)
+    print(f"[DistanceMatrixStub] serving on {base_url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -1,10 +1,14 @@
 # route_optimizer.py
 import math
 import random
-import requests
-import time
-import os
-from math import ceil
+
+import numpy as np
+
+from ai_modules.distance_cache import coord_key, distance_cache
+from ai_modules.distance_fetcher import GOOGLE_MAPS_BASE_URL, fetch_missing_distances, http_session
+from ai_modules.distance_matrix import DistanceMatrix
+from ai_modules.route_solver import solve_tour
+from ai_modules.vrp_solver import solve_vrp
 
 try:
     import polyline as polyline_decoder
@@ -14,152 +18,85 @@ except Exception:
 # --------------------------
 # Constants & Config
 # --------------------------
-GOOGLE_MATRIX_MAX = 25   # conservative chunk size per request (adjust if you know your account limits)
 DEFAULT_TORTUOSITY = 1.4  # factor to approximate road distance from straight-line when falling back
 REQUEST_TIMEOUT = 10      # seconds per HTTP request
 MAX_RETRIES = 3           # retries for Google API calls
+DEFAULT_TIME_BUDGET_MS = 1000  # local search budget for the 2opt / oropt strategies
+VRP_GOOGLE_MAX_NODES = 200     # larger multi-officer plans use haversine (n² Google elements is too slow)
 
 
 # --------------------------
-# 1) Geometry utils
-# --------------------------
-def haversine_distance(lat1, lon1, lat2, lon2):
-    """
-    Haversine great-circle distance in kilometers.
-    """
-    lat1, lon1, lat2, lon2 = map(float, [lat1, lon1, lat2, lon2])
-    R = 6371.0  # Earth radius in km
-    d_lat = math.radians(lat2 - lat1)
-    d_lon = math.radians(lon2 - lon1)
-    a = (math.sin(d_lat / 2) ** 2 +
-         math.cos(math.radians(lat1)) *
-         math.cos(math.radians(lat2)) *
-         math.sin(d_lon / 2) ** 2)
-    a = min(1.0, max(0.0, a))
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
-
-
-# --------------------------
-# 2) Google Distance Matrix (robust, batched)
+# 1) Google Distance Matrix (cached, tiled + concurrent fetching)
 # --------------------------
-def _call_distance_matrix(origins_coords, destinations_coords, api_key, timeout=REQUEST_TIMEOUT):
-    """
-    Single request to Google Distance Matrix for the given origins/destinations.
-    origins_coords/destinations_coords are lists of "lat,lon" strings.
-    Returns JSON dict (raises requests exceptions on HTTP issues).
-    """
-    url = "https://maps.googleapis.com/maps/api/distancematrix/json"
-    params = {
-        "origins": "|".join(origins_coords),
-        "destinations": "|".join(destinations_coords),
-        "key": api_key,
-        "mode": "driving",
-        "units": "metric"
-    }
-    resp = requests.get(url, params=params, timeout=timeout)
-    resp.raise_for_status()
-    return resp.json()
-
-
-def get_google_distance_matrix(locations, api_key, max_retries=MAX_RETRIES):
+def get_google_distance_matrix(locations, api_key, max_retries=MAX_RETRIES, cache=distance_cache):
     """
     Build a full distance matrix using Google Maps Distance Matrix API.
     - locations: list of dicts { 'id', 'lat', 'lon' }
     - api_key: Google Maps API Key (string)
-    Returns: dict matrix[from_id][to_id] = distance_km (float)
-    Guarantees a filled matrix: uses haversine fallback when needed.
+    - cache: persistent pairwise cache (distance_cache.py); only pairs it
+             does not hold are requested from Google. None disables it.
+    Returns: DistanceMatrix (dense km array + id -> index map)
+    Guarantees a filled matrix: starts from the vectorized haversine fallback
+    (with the tortuosity penalty) and overwrites it with every distance Google returns.
     """
     n = len(locations)
     print(f"[DistanceMatrix] preparing distances for {n} locations...")
 
+    matrix = DistanceMatrix.from_locations(locations, tortuosity=DEFAULT_TORTUOSITY)
     if n == 0:
-        return {}
-
-    coords = [f"{loc['lat']},{loc['lon']}" for loc in locations]
-    ids = [str(loc['id']) for loc in locations]
-
-    # Initialize matrix with empty dicts
-    matrix = {loc_id: {} for loc_id in ids}
-
-    # Create origin chunks to respect Google limits
-    chunk_size = GOOGLE_MATRIX_MAX
-    origin_chunks = [coords[i:i+chunk_size] for i in range(0, n, chunk_size)]
-    origin_index_chunks = [list(range(i, min(i+chunk_size, n))) for i in range(0, n, chunk_size)]
-
-    destinations_coords = coords  # we send full destinations set each request
-
-    for chunk_idx, origin_chunk in enumerate(origin_chunks):
-        origin_indices = origin_index_chunks[chunk_idx]
-        attempt = 0
-        success = False
-
-        while not success and attempt < max_retries:
-            attempt += 1
-            try:
-                if attempt > 1:
-                    backoff = 0.5 * (2 ** (attempt - 2))
-                    print(f"[DistanceMatrix] retry {attempt}/{max_retries} for chunk {chunk_idx}, sleeping {backoff}s")
-                    time.sleep(backoff)
-
-                resp_json = _call_distance_matrix(origin_chunk, destinations_coords, api_key)
-                status = resp_json.get("status", "")
-                if status != "OK":
-                    raise RuntimeError(f"Distance Matrix top-level status: {status} ({resp_json.get('error_message')})")
-
-                rows = resp_json.get("rows", [])
-                # Parse rows for this chunk
-                for ri, row in enumerate(rows):
-                    origin_global_index = origin_indices[ri]
-                    from_id = ids[origin_global_index]
-                    elements = row.get("elements", [])
-                    for j, elem in enumerate(elements):
-                        to_id = ids[j]
-                        if elem.get("status") == "OK" and "distance" in elem and "value" in elem["distance"]:
-                            dist_km = float(elem["distance"]["value"]) / 1000.0
-                            matrix[from_id][to_id] = dist_km
-                        else:
-                            # fallback to Haversine with penalty factor to discourage these routes
-                            fallback = haversine_distance(
-                                locations[origin_global_index]["lat"], locations[origin_global_index]["lon"],
-                                locations[j]["lat"], locations[j]["lon"]
-                            )
-                            matrix[from_id][to_id] = float(round(fallback * DEFAULT_TORTUOSITY, 6))
-                success = True
-
-            except Exception as e:
-                print(f"[DistanceMatrix] chunk {chunk_idx} attempt {attempt} error: {e}")
-                if attempt >= max_retries:
-                    print(f"[DistanceMatrix] max retries reached for chunk {chunk_idx}; filling fallback distances for these origins.")
-                    # Fill fallback haversine for this chunk
-                    for origin_global_index in origin_indices:
-                        from_id = ids[origin_global_index]
-                        for j in range(n):
-                            to_id = ids[j]
-                            fallback = haversine_distance(
-                                locations[origin_global_index]["lat"], locations[origin_global_index]["lon"],
-                                locations[j]["lat"], locations[j]["lon"]
-                            )
-                            matrix[from_id][to_id] = float(round(fallback * DEFAULT_TORTUOSITY, 6))
-                    success = True
-                else:
-                    # retry loop continues
-                    continue
-
-    # Ensure diagonal zero and all entries present
-    for i_idx, i_id in enumerate(ids):
-        matrix[i_id][i_id] = 0.0
-        for j_idx, j_id in enumerate(ids):
-            if j_id not in matrix[i_id]:
-                fallback = haversine_distance(locations[i_idx]["lat"], locations[i_idx]["lon"], locations[j_idx]["lat"], locations[j_idx]["lon"])
-                matrix[i_id][j_id] = float(round(fallback * DEFAULT_TORTUOSITY, 6))
+        return matrix
+
+    # Work on distinct (rounded) coordinates; the keys double as "lat,lon" request strings
+    keys, inverse = np.unique([coord_key(loc['lat'], loc['lon']) for loc in locations], return_inverse=True)
+    keys = keys.tolist()
+    known = np.full((len(keys), len(keys)), np.nan)
+    if cache is not None:
+        try:
+            known = cache.lookup(keys)
+        except Exception as e:
+            print(f"[DistanceMatrix] distance cache unavailable ({e}); fetching every pair.")
+            cache = None
+    np.fill_diagonal(known, 0.0)
+    missing = np.isnan(known)
+    print(f"[DistanceMatrix] {known.size - len(keys) - int(missing.sum())} pairs cached, {int(missing.sum())} to fetch.")
+
+    # Tiled, concurrent, rate-limited fetch of the missing cells (distance_fetcher.py);
+    # elements Google cannot answer keep their haversine fallback (penalised to discourage these routes)
+    fetched = []
+    for i, j, km in fetch_missing_distances(keys, missing, api_key, max_retries=max_retries, timeout=REQUEST_TIMEOUT):
+        known[i, j] = km
+        fetched.append((keys[i], keys[j], km))
+
+    if cache is not None and fetched:
+        try:
+            cache.store(fetched)
+        except Exception as e:
+            print(f"[DistanceMatrix] could not store {len(fetched)} distances in the cache: {e}")
 
+    # Expand distinct coordinates back to one row/column per location
+    resolved = known[np.ix_(inverse, inverse)]
+    matrix.km = np.where(np.isnan(resolved), matrix.km, resolved)
+    np.fill_diagonal(matrix.km, 0.0)
     print("[DistanceMatrix] matrix build completed.")
     return matrix
 
 
+def build_route_matrix(nodes, api_key=None):
+    """
+    Distance matrix for a list of nodes (start node first).
+    Returns (DistanceMatrix, data_source): Google driving distances when an
+    api_key is given and the API answers, plain straight-line otherwise.
+    """
+    if api_key:
+        try:
+            return get_google_distance_matrix(nodes, api_key), "Google Maps API"
+        except Exception as e:
+            print(f"[DistanceMatrix] Google matrix retrieval failed: {e}. Falling back to Haversine.")
+    return DistanceMatrix.from_locations(nodes), "Haversine Math (Simulated)"
+
+
 # --------------------------
-# 3) Google Directions helper (optional) - produces polyline coords
+# 2) Google Directions helper (optional) - produces polyline coords
 # --------------------------
 def get_directions_polyline_coords(ordered_coords, api_key):
     """
@@ -186,7 +123,7 @@ def get_directions_polyline_coords(ordered_coords, api_key):
         waypoints = ordered_coords[1:-1]
         waypoints_str = "|".join([f"{lat},{lon}" for lat, lon in waypoints]) if waypoints else None
 
-        url = "https://maps.googleapis.com/maps/api/directions/json"
+        url = f"{GOOGLE_MAPS_BASE_URL}/maps/api/directions/json"
         params = {
             "origin": origin,
             "destination": destination,
@@ -198,7 +135,7 @@ def get_directions_polyline_coords(ordered_coords, api_key):
         if waypoints_str:
             params["waypoints"] = waypoints_str
 
-        resp = requests.get(url, params=params, timeout=REQUEST_TIMEOUT)
+        resp = http_session().get(url, params=params, timeout=REQUEST_TIMEOUT)
         resp.raise_for_status()
         j = resp.json()
         if j.get("status") != "OK":
@@ -216,7 +153,7 @@ def get_directions_polyline_coords(ordered_coords, api_key):
 
 
 # --------------------------
-# 4) Mock data generator
+# 3) Mock data generator
 # --------------------------
 def generate_mock_coordinates(center_lat, center_lon, num_points, radius_km=10):
     """
@@ -237,16 +174,65 @@ def generate_mock_coordinates(center_lat, center_lon, num_points, radius_km=10):
 
 
 # --------------------------
-# 5) Greedy optimizer (nearest neighbor) - supports real matrix
+# 4) Route optimizer - greedy construction + optional local search (see route_solver.py)
 # --------------------------
-def optimize_route_greedy(start_node, clients, api_key=None, include_polyline=True):
+def route_from_tour(all_nodes, km, tour):
+    """
+    Turns a tour of matrix indices ([0, ..., 0], index 0 = branch) into the
+    optimized_route steps. Returns (path, total_distance_km).
     """
-    Greedy nearest-neighbour route generation.
+    start_node = all_nodes[0]
+    path = [{
+        "step": 1,
+        "id": start_node['id'],
+        "name": start_node.get('name', 'Branch Office'),
+        "lat": start_node['lat'],
+        "lon": start_node['lon'],
+        "type": "branch",
+        "distance_from_last": 0.0
+    }]
+    total_distance = 0.0
+
+    for step_counter, (prev, current) in enumerate(zip(tour[:-2], tour[1:-1]), start=2):
+        dist = float(km[prev, current])
+        total_distance += dist
+        node = all_nodes[current]
+        path.append({
+            "step": step_counter,
+            "id": node['id'],
+            "name": node.get('name', ''),
+            "lat": node['lat'],
+            "lon": node['lon'],
+            "distance_from_last": round(dist, 2),
+            "type": "client"
+        })
+
+    # Return to branch
+    return_dist = float(km[tour[-2], tour[-1]])
+    total_distance += return_dist
+    path.append({
+        "step": len(tour),
+        "id": "BRANCH_RETURN",
+        "name": "Return to Branch",
+        "lat": start_node['lat'],
+        "lon": start_node['lon'],
+        "distance_from_last": round(return_dist, 2),
+        "type": "branch"
+    })
+    return path, total_distance
+
+
+def optimize_route(start_node, clients, api_key=None, include_polyline=True,
+                   strategy="greedy", time_budget_ms=DEFAULT_TIME_BUDGET_MS):
+    """
+    Single-officer route generation.
     - start_node: dict { 'id','name','lat','lon' }
     - clients: list of dicts { 'id', 'name', 'lat', 'lon' }
     - api_key: optional Google Maps API key string; if provided the function
                will attempt to use real driving distances from Google Maps.
     - include_polyline: if True and Google Directions available, returns 'polyline' in result
+    - strategy: "greedy" (nearest neighbour), "2opt" or "oropt" (greedy + local search)
+    - time_budget_ms: upper bound on local search time
     Returns dict:
       {
         "optimized_route": [ {step, id, name, lat, lon, distance_from_last, type}, ... ],
@@ -254,127 +240,23 @@ def optimize_route_greedy(start_node, clients, api_key=None, include_polyline=Tr
         "client_count": int,
         "estimated_fuel_cost": int,
         "data_source": "Google Maps API" | "Haversine Math (Simulated)",
-        "polyline": [[lat, lon], ...]   # optional
+        "polyline": [[lat, lon], ...],   # optional
+        "strategy": str,
+        "solver": {greedy_distance_km, distance_km, passes, solve_ms}
       }
     """
     print("Starting Route Optimization...")
     all_nodes = [start_node] + clients
 
-    distance_matrix = None
-    data_source = "Haversine Math (Simulated)"
+    # Row/column i of the matrix is all_nodes[i]; the start node is index 0
+    matrix, data_source = build_route_matrix(all_nodes, api_key)
 
-    # Attempt Google Matrix if api_key provided
-    if api_key:
-        try:
-            distance_matrix = get_google_distance_matrix(all_nodes, api_key)
-            if distance_matrix:
-                data_source = "Google Maps API"
-        except Exception as e:
-            print(f"[optimize_route_greedy] Google matrix retrieval failed: {e}. Falling back to Haversine.")
-            distance_matrix = None
-            data_source = "Haversine Math (Simulated)"
-
-    # Defensive: ensure ids are strings for consistent lookups
+    # Defensive: ensure ids are strings for consistent output
     for node in all_nodes:
         node['id'] = str(node.get('id', node.get('name', '')))
 
-    # Make a shallow copy of clients for mutation
-    unvisited = [dict(c) for c in clients]
-    current_node = dict(start_node)
-    current_node['id'] = str(current_node.get('id', 'BRANCH'))
-
-    path = []
-    total_distance = 0.0
-
-    # Add start node
-    path.append({
-        "step": 1,
-        "id": current_node['id'],
-        "name": current_node.get('name', 'Branch Office'),
-        "lat": current_node['lat'],
-        "lon": current_node['lon'],
-        "type": "branch",
-        "distance_from_last": 0.0
-    })
-
-    step_counter = 2
-
-    while unvisited:
-        nearest_client = None
-        nearest_index = -1
-        min_dist = float('inf')
-
-        for i, candidate in enumerate(unvisited):
-            cand_id = str(candidate['id'])
-            cur_id = str(current_node['id'])
-
-            # Prefer distance from matrix if present and keys exist
-            dist = None
-            if distance_matrix and cur_id in distance_matrix and cand_id in distance_matrix[cur_id]:
-                try:
-                    dist = float(distance_matrix[cur_id][cand_id])
-                except Exception:
-                    dist = None
-
-            if dist is None:
-                # fallback to straight-line
-                dist = haversine_distance(current_node['lat'], current_node['lon'],
-                                          candidate['lat'], candidate['lon'])
-
-            if dist < min_dist:
-                min_dist = dist
-                nearest_client = candidate
-                nearest_index = i
-
-        if nearest_index == -1 or nearest_client is None:
-            print("[optimize_route_greedy] Could not find next node, breaking.")
-            break
-
-        # Update totals & path
-        total_distance += min_dist
-        current_node = dict(nearest_client)
-        current_node['id'] = str(current_node['id'])
-
-        path.append({
-            "step": step_counter,
-            "id": current_node['id'],
-            "name": current_node.get('name', ''),
-            "lat": current_node['lat'],
-            "lon": current_node['lon'],
-            "distance_from_last": round(min_dist, 2),
-            "type": "client"
-        })
-
-        # remove visited
-        unvisited.pop(nearest_index)
-        step_counter += 1
-
-    # Return to branch
-    return_dist = None
-    cur_id = str(current_node['id'])
-    branch_id = str(start_node['id'])
-
-    if distance_matrix and cur_id in distance_matrix and branch_id in distance_matrix[cur_id]:
-        try:
-            return_dist = float(distance_matrix[cur_id][branch_id])
-        except Exception:
-            return_dist = None
-
-    if return_dist is None:
-        return_dist = haversine_distance(current_node['lat'], current_node['lon'],
-                                         start_node['lat'], start_node['lon'])
-
-    total_distance += return_dist
-
-    path.append({
-        "step": step_counter,
-        "id": "BRANCH_RETURN",
-        "name": "Return to Branch",
-        "lat": start_node['lat'],
-        "lon": start_node['lon'],
-        "distance_from_last": round(return_dist, 2),
-        "type": "branch"
-    })
+    tour, solver_stats = solve_tour(matrix.km, strategy, time_budget_ms / 1000.0)
+    path, total_distance = route_from_tour(all_nodes, matrix.km, tour)
 
     # Optionally obtain a directions polyline for the ordered route (real road path)
     polyline_coords = None
@@ -383,10 +265,10 @@ def optimize_route_greedy(start_node, clients, api_key=None, include_polyline=Tr
             ordered_coords = [(p['lat'], p['lon']) for p in path if p.get('lat') is not None and p.get('lon') is not None]
             polyline_coords = get_directions_polyline_coords(ordered_coords, api_key)
         except Exception as e:
-            print(f"[optimize_route_greedy] Directions polyline failed: {e}")
+            print(f"[optimize_route] Directions polyline failed: {e}")
             polyline_coords = None
 
-    print(f"Optimization complete. Total Dist: {total_distance} km. Source: {data_source}")
+    print(f"Optimization complete ({strategy}). Total Dist: {total_distance} km. Source: {data_source}")
 
     return {
         "optimized_route": path,
@@ -394,12 +276,85 @@ def optimize_route_greedy(start_node, clients, api_key=None, include_polyline=Tr
         "client_count": len(clients),
         "estimated_fuel_cost": round(total_distance * 5.5),
         "data_source": data_source,
-        "polyline": polyline_coords  # may be None if not available
+        "polyline": polyline_coords,  # may be None if not available
+        "strategy": strategy,
+        "solver": solver_stats
+    }
+
+
+def optimize_route_greedy(start_node, clients, api_key=None, include_polyline=True):
+    """Greedy nearest-neighbour route generation (optimize_route with strategy="greedy")."""
+    return optimize_route(start_node, clients, api_key=api_key, include_polyline=include_polyline, strategy="greedy")
+
+
+def plan_officer_routes(start_node, clients, officers, max_stops, max_route_km=None, api_key=None,
+                        strategy="oropt", time_budget_ms=DEFAULT_TIME_BUDGET_MS):
+    """
+    Multi-officer route generation (capacitated VRP, see vrp_solver.py).
+    - clients: list of dicts { 'id', 'name', 'lat', 'lon' } in priority order
+               (most urgent first); only the first officers * max_stops are planned
+    - officers: number of loan officers available
+    - max_stops: visits one officer can make per day
+    - max_route_km: optional cap on a single officer's round trip
+    Returns dict:
+      {
+        "routes": [ {officer, optimized_route, total_distance_km, client_count, estimated_fuel_cost}, ... ],
+        "unassigned": [ {id, name, lat, lon}, ... ],
+        "officer_count", "client_count", "total_distance_km", "estimated_fuel_cost",
+        "data_source", "solver": {...}
+      }
+    """
+    print(f"Starting Multi-Officer Route Planning ({officers} officers, {len(clients)} clients)...")
+    capacity = officers * max_stops
+    planned, overflow = clients[:capacity], clients[capacity:]
+    all_nodes = [start_node] + planned
+
+    if api_key and len(all_nodes) > VRP_GOOGLE_MAX_NODES:
+        print(f"[plan_officer_routes] {len(all_nodes)} stops > {VRP_GOOGLE_MAX_NODES}; using Haversine matrix.")
+        api_key = None
+    matrix, data_source = build_route_matrix(all_nodes, api_key)
+    for node in all_nodes + overflow:
+        node['id'] = str(node.get('id', node.get('name', '')))
+
+    tours, unassigned_idx, solver_stats = solve_vrp(
+        matrix.km, officers, max_stops, max_route_km, strategy, time_budget_ms / 1000.0
+    )
+
+    routes = []
+    total_distance = 0.0
+    for officer, tour in enumerate(tours, start=1):
+        path, distance = route_from_tour(all_nodes, matrix.km, tour)
+        total_distance += distance
+        routes.append({
+            "officer": officer,
+            "optimized_route": path,
+            "total_distance_km": round(distance, 2),
+            "client_count": len(tour) - 2,
+            "estimated_fuel_cost": round(distance * 5.5),
+        })
+
+    unassigned = [
+        {"id": node['id'], "name": node.get('name', ''), "lat": node['lat'], "lon": node['lon']}
+        for node in [all_nodes[i] for i in unassigned_idx] + overflow
+    ]
+    solver_stats["strategy"] = strategy
+
+    print(f"Planning complete. {len(routes)} routes, {len(unassigned)} unassigned, Total Dist: {total_distance} km.")
+
+    return {
+        "routes": routes,
+        "unassigned": unassigned,
+        "officer_count": len(routes),
+        "client_count": sum(r["client_count"] for r in routes),
+        "total_distance_km": round(total_distance, 2),
+        "estimated_fuel_cost": round(total_distance * 5.5),
+        "data_source": data_source,
+        "solver": solver_stats
     }
 
 
 # --------------------------
-# 6) Example quick-run (if executed directly) - helpful for local dev
+# 5) Example quick-run (if executed directly) - helpful for local dev
 # --------------------------
 if __name__ == "__main__":
     # Quick local sanity test (no API key)
@@ -411,5 +366,5 @@ if __name__ == "__main__":
 
     branch = {"id": "BRANCH", "name": "Branch Demo", "lat": center_lat, "lon": center_lon}
     print("Running local optimizer (no API key)...")
-    res = optimize_route_greedy(branch, clients, api_key=None)
+    res = optimize_route(branch, clients, api_key=None, strategy="oropt")
     print(res)
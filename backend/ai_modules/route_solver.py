@@ -0,0 +1,186 @@
+# route_solver.py
+# -----------------------------------------------
+# 🧭 Purpose: TSP tour construction + local search over a dense distance matrix.
+# Tours are lists of matrix indices that start and end at the depot (index 0).
+#   greedy  - nearest-neighbour construction (one argmin per step)
+#   2opt    - greedy, then 2-opt segment reversals
+#   oropt   - greedy, then 2-opt + Or-opt (move chains of 1-3 stops)
+# Local search only looks at each stop's K nearest neighbours and stops at
+# a local optimum or when the time budget runs out, whichever comes first.
+# Asymmetric matrices (Google driving distances) are handled exactly: the
+# cost of a reversed segment is taken from prefix sums of the reverse edges.
+# -----------------------------------------------
+
+import time
+
+import numpy as np
+
+STRATEGIES = ("greedy", "2opt", "oropt")
+DEFAULT_STRATEGY = "oropt"   # /planning/* default and the stored plans (services/route_plans.py)
+NEIGHBOURS = 10          # candidate list size per stop
+OR_OPT_MAX_CHAIN = 3     # longest chain of consecutive stops Or-opt relocates
+EPS = 1e-9
+
+
+def greedy_tour(km):
+    """Nearest-neighbour tour from the depot: [0, ..., 0]."""
+    n = len(km)
+    visited = np.zeros(n, dtype=bool)
+    visited[0] = True
+    tour = [0]
+    current = 0
+    for _ in range(n - 1):
+        current = int(np.argmin(np.where(visited, np.inf, km[current])))
+        visited[current] = True
+        tour.append(current)
+    tour.append(0)
+    return tour
+
+
+def tour_length(km, tour):
+    t = np.asarray(tour)
+    return float(km[t[:-1], t[1:]].sum())
+
+
+def neighbour_lists(km, k=NEIGHBOURS):
+    """The k nearest other stops of every stop (either direction), nearest first."""
+    n = len(km)
+    k = min(k, n - 1)
+    if k <= 0:
+        return [[] for _ in range(n)]
+    d = np.minimum(km, km.T).astype(np.float64, copy=True)
+    np.fill_diagonal(d, np.inf)
+    nearest = np.argpartition(d, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(d, nearest, axis=1).argsort(axis=1)
+    return np.take_along_axis(nearest, order, axis=1).tolist()
+
+
+class _LocalSearch:
+    """Mutable tour state shared by the 2-opt and Or-opt moves."""
+
+    def __init__(self, km, tour, deadline):
+        self.km = km
+        self.D = km.tolist()      # plain nested lists: fastest scalar indexing from Python
+        self.symmetric = bool(np.allclose(km, km.T))
+        self.neigh = neighbour_lists(km)
+        self.deadline = deadline
+        self.tour = list(tour)
+        self._reindex()
+
+    def _reindex(self):
+        t = self.tour
+        self.pos = [0] * len(self.km)
+        for i in range(len(t) - 1):
+            self.pos[t[i]] = i
+        if not self.symmetric:
+            arr = np.asarray(t)
+            # fwd[i] / bwd[i]: cost of the first i edges walked forwards / backwards
+            self.fwd = np.concatenate(([0.0], np.cumsum(self.km[arr[:-1], arr[1:]]))).tolist()
+            self.bwd = np.concatenate(([0.0], np.cumsum(self.km[arr[1:], arr[:-1]]))).tolist()
+
+    def out_of_time(self):
+        return time.perf_counter() >= self.deadline
+
+    def two_opt_pass(self):
+        """One sweep of 2-opt moves; returns True if the tour improved."""
+        D, t, pos, neigh = self.D, self.tour, self.pos, self.neigh
+        n = len(t) - 1
+        improved = False
+        for i in range(n):
+            if i % 64 == 0 and self.out_of_time():
+                break
+            a, b = t[i], t[i + 1]
+            d_ab = D[a][b]
+            for c in neigh[a]:
+                if D[a][c] >= d_ab and D[c][a] >= d_ab:
+                    break
+                j = pos[c]
+                lo, hi = (i, j) if i < j else (j, i)
+                if hi - lo < 2:
+                    continue
+                p, q, r, s = t[lo], t[lo + 1], t[hi], t[hi + 1]
+                delta = D[p][r] + D[q][s] - D[p][q] - D[r][s]
+                if not self.symmetric:
+                    delta += (self.bwd[hi] - self.bwd[lo + 1]) - (self.fwd[hi] - self.fwd[lo + 1])
+                if delta < -EPS:
+                    t[lo + 1:hi + 1] = t[lo + 1:hi + 1][::-1]
+                    if self.symmetric:
+                        for k in range(lo + 1, hi + 1):
+                            pos[t[k]] = k
+                    else:
+                        self._reindex()
+                        pos = self.pos
+                    improved = True
+                    a, b = t[i], t[i + 1]
+                    d_ab = D[a][b]
+                    break
+        return improved
+
+    def or_opt_pass(self):
+        """One sweep of Or-opt moves (chains keep their direction); True if improved."""
+        D, neigh = self.D, self.neigh
+        improved = False
+        for length in range(1, OR_OPT_MAX_CHAIN + 1):
+            i = 1
+            while i + length <= len(self.tour) - 1:
+                if i % 64 == 0 and self.out_of_time():
+                    return improved
+                t = self.tour
+                s, e = t[i], t[i + length - 1]
+                p, nx = t[i - 1], t[i + length]
+                gain = D[p][s] + D[e][nx] - D[p][nx]
+                best, best_at = -EPS, None
+                for c in neigh[s] + neigh[e]:
+                    j = self.pos[c]
+                    if i <= j < i + length:
+                        continue
+                    # insert between (c, next) when c precedes the chain, or (prev, c) when it follows
+                    for u_at in (j, j - 1 if c != 0 else len(t) - 2):
+                        if u_at < 0 or i - 1 <= u_at < i + length:
+                            continue
+                        u, v = t[u_at], t[u_at + 1]
+                        delta = D[u][s] + D[e][v] - D[u][v] - gain
+                        if delta < best:
+                            best, best_at = delta, u_at
+                if best_at is not None:
+                    chain = t[i:i + length]
+                    rest = t[:i] + t[i + length:]
+                    at = best_at if best_at < i else best_at - length
+                    self.tour = rest[:at + 1] + chain + rest[at + 1:]
+                    self._reindex()
+                    improved = True
+                i += 1
+        return improved
+
+
+def solve_tour(km, strategy="greedy", time_budget_s=1.0, initial_tour=None):
+    """
+    Returns (tour, stats) for the given strategy. stats holds the starting
+    (greedy unless initial_tour is given) and final lengths, the number of
+    improvement passes and the time spent.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown route strategy '{strategy}'. Use one of: {', '.join(STRATEGIES)}")
+    km = np.asarray(km, dtype=np.float64)
+    started = time.perf_counter()
+    tour = list(initial_tour) if initial_tour is not None else greedy_tour(km)
+    greedy_km = tour_length(km, tour)
+    passes = 0
+
+    if strategy != "greedy" and len(km) > 3:
+        search = _LocalSearch(km, tour, started + time_budget_s)
+        improved = True
+        while improved and not search.out_of_time():
+            improved = search.two_opt_pass()
+            if strategy == "oropt" and not search.out_of_time():
+                improved = search.or_opt_pass() or improved
+            passes += 1
+        tour = search.tour
+
+    return tour, {
+        "strategy": strategy,
+        "greedy_distance_km": round(greedy_km, 2),
+        "distance_km": round(tour_length(km, tour), 2),
+        "passes": passes,
+        "solve_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
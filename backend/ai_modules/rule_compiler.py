@@ -0,0 +1,253 @@
+# rule_compiler.py
+# -----------------------------------------------
+# ⚡ Purpose: Compiles the advisor knowledge base (rules.json) into a
+# discrimination network that is evaluated with NumPy instead of walking
+# every rule and condition in Python.
+#
+# - Alpha tests: each distinct (fact, operator, value) condition is compiled
+#   once and shared by every rule that uses it. Rule values are parsed once,
+#   at compile time; fact values once per evaluation, not once per condition.
+# - Fact index: the tests of one fact are stored together (sorted thresholds
+#   for greater_than / less_than, a value -> test map for equals), so a fact
+#   is checked against all of its thresholds in one vectorized comparison.
+# - Beta join: rules are rows of test ids; a rule fires when all its tests
+#   hold (one fancy-indexed .all() over every rule).
+# - Outputs (the rule's 'then' block + 'reason') are read-only mappings built
+#   at compile time; nothing a caller does can change the rule base.
+# - FactTable / evaluate_table run the same network over many entities at
+#   once: every condition becomes a boolean mask over a fact column.
+#
+# Semantics match the original rule-by-rule loop (kept as the reference in
+# tests/test_rule_compiler.py): numeric operators compare float(fact) with
+# float(value), equals compares str(fact) with str(value), a missing fact or
+# unknown operator makes the condition false.
+# -----------------------------------------------
+
+from types import MappingProxyType
+
+import numpy as np
+
+NUMERIC_OPERATORS = ("greater_than", "less_than")
+OPERATORS = NUMERIC_OPERATORS + ("equals",)
+ALWAYS_TRUE = 0    # test id used to pad rules with fewer conditions
+ALWAYS_FALSE = 1   # test id of conditions that can never hold (bad value / unknown operator)
+TABLE_CHUNK_ROWS = 20000   # entities evaluated per block by evaluate_table (bounds memory)
+
+_is_known = np.frompyfunc(lambda v: v is not None, 1, 1)
+
+
+def _to_float(values):
+    """Float view of an object column: None -> NaN; values float() rejects -> NaN with a warning."""
+    try:
+        return np.where(_is_known(values).astype(bool), values, np.nan).astype(np.float64)
+    except (TypeError, ValueError):
+        out = np.full(len(values), np.nan)
+        bad = 0
+        for i, v in enumerate(values):
+            if v is not None:
+                try:
+                    out[i] = float(v)
+                except (TypeError, ValueError):
+                    bad += 1
+        print(f"Warning: {bad} fact value(s) could not be checked against numeric conditions.")
+        return out
+
+
+class _FactTests:
+    """All compiled tests that read one fact."""
+
+    def __init__(self):
+        self.thresholds = {op: [] for op in NUMERIC_OPERATORS}   # op -> [(threshold, test_id)]
+        self.equals = {}                                        # str(value) -> [test_id]
+
+    def freeze(self):
+        for op, pairs in self.thresholds.items():
+            pairs.sort()
+            setattr(self, f"{op}_values", np.array([p[0] for p in pairs], dtype=np.float64))
+            setattr(self, f"{op}_ids", np.array([p[1] for p in pairs], dtype=np.int64))
+        self.numeric_ids = np.concatenate((self.greater_than_ids, self.less_than_ids))
+        self.equals = {value: np.array(ids, dtype=np.int64) for value, ids in self.equals.items()}
+        self.equals_ids = np.concatenate(list(self.equals.values())) if self.equals else np.empty(0, dtype=np.int64)
+        self.all_ids = np.concatenate((self.numeric_ids, self.equals_ids))
+
+    def apply(self, value, truth):
+        """Writes the outcome of every test on this fact into truth (1-D, or 2-D with tests last)."""
+        if value is None:
+            truth[..., self.all_ids] = False
+            return
+        if len(self.numeric_ids):
+            try:
+                v = float(value)
+            except (TypeError, ValueError):
+                print(f"Warning: Could not check numeric conditions against fact value {value!r}.")
+                truth[..., self.numeric_ids] = False
+            else:
+                truth[..., self.greater_than_ids] = self.greater_than_values < v   # fact > threshold
+                truth[..., self.less_than_ids] = self.less_than_values > v         # fact < threshold
+        if len(self.equals_ids):
+            truth[..., self.equals_ids] = False
+            matched = self.equals.get(str(value))
+            if matched is not None:
+                truth[..., matched] = True
+
+    def apply_column(self, values, truth):
+        """Column version of apply(): values is an object array (None = unknown), truth is (rows, tests)."""
+        if len(self.numeric_ids):
+            v = _to_float(values)[:, None]
+            truth[:, self.greater_than_ids] = self.greater_than_values < v
+            truth[:, self.less_than_ids] = self.less_than_values > v
+        if len(self.equals_ids):
+            known = _is_known(values).astype(bool)
+            text = np.array([str(v) for v in values], dtype=object)
+            truth[:, self.equals_ids] = False
+            for value, ids in self.equals.items():
+                truth[:, ids] |= ((text == value) & known)[:, None]
+
+
+class FactTable:
+    """Columnar facts: one row per entity (branch, client), one column per fact; None = unknown."""
+
+    def __init__(self, ids, columns, branches=None):
+        self.ids = list(ids)
+        self.branches = list(branches) if branches is not None else [None] * len(self.ids)
+        self.columns = {}
+        for fact, values in columns.items():
+            column = np.empty(len(self.ids), dtype=object)
+            column[:] = list(values)
+            self.columns[fact] = column
+
+    def __len__(self):
+        return len(self.ids)
+
+    def row(self, i):
+        return {fact: column[i] for fact, column in self.columns.items() if column[i] is not None}
+
+    def take(self, rows):
+        """A new table with only the given row positions."""
+        rows = np.asarray(rows, dtype=np.int64)
+        table = FactTable([], {})
+        table.ids = [self.ids[i] for i in rows.tolist()]
+        table.branches = [self.branches[i] for i in rows.tolist()]
+        table.columns = {fact: column[rows] for fact, column in self.columns.items()}
+        return table
+
+
+class CompiledRules:
+    """rules.json compiled once; evaluate(facts) returns the read-only outputs of the rules that fire."""
+
+    def __init__(self, rules):
+        self.rule_names = tuple(rule.get("rule_name", f"rule_{i}") for i, rule in enumerate(rules))
+        self.outputs = tuple(
+            MappingProxyType({**rule.get("then", {}), "reason": name})
+            for rule, name in zip(rules, self.rule_names)
+        )
+
+        test_ids = {}
+        self.tests = {}          # fact -> _FactTests
+        rule_tests, rule_facts = [], []
+        for rule in rules:
+            ids, facts = [], set()
+            for condition in rule.get("if", []):
+                fact, op, value = condition["fact"], condition["operator"], condition["value"]
+                facts.add(fact)
+                ids.append(self._compile_test(test_ids, fact, op, value))
+            rule_tests.append(ids)
+            rule_facts.append(facts)
+
+        for tests in self.tests.values():
+            tests.freeze()
+        self.n_tests = len(test_ids) + 2
+        width = max((len(ids) for ids in rule_tests), default=0) or 1
+        self.rule_tests = np.full((len(rules), width), ALWAYS_TRUE, dtype=np.int64)
+        for i, ids in enumerate(rule_tests):
+            self.rule_tests[i, :len(ids)] = ids
+
+        # Fact index for incremental evaluation: fact -> rules that read it
+        fact_rules = {}
+        for i, facts in enumerate(rule_facts):
+            for fact in facts:
+                fact_rules.setdefault(fact, []).append(i)
+        self.fact_rules = {fact: np.array(ids, dtype=np.int64) for fact, ids in fact_rules.items()}
+        self.condition_count = sum(len(ids) for ids in rule_tests)
+
+    def _compile_test(self, test_ids, fact, op, value):
+        if op not in OPERATORS:
+            print(f"Warning: Unknown operator '{op}' on fact '{fact}'; condition can never hold.")
+            return ALWAYS_FALSE
+        if op in NUMERIC_OPERATORS:
+            try:
+                key = (fact, op, float(value))
+            except (TypeError, ValueError):
+                print(f"Warning: Non-numeric value {value!r} for '{op}' on fact '{fact}'; condition can never hold.")
+                return ALWAYS_FALSE
+        else:
+            key = (fact, op, str(value))
+        if key not in test_ids:
+            test_id = test_ids[key] = len(test_ids) + 2
+            tests = self.tests.setdefault(fact, _FactTests())
+            if op in NUMERIC_OPERATORS:
+                tests.thresholds[op].append((key[2], test_id))
+            else:
+                tests.equals.setdefault(key[2], []).append(test_id)
+        return test_ids[key]
+
+    def __len__(self):
+        return len(self.rule_names)
+
+    # Read-only mappings do not pickle; ship plain dicts to the process pool and re-wrap
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["outputs"] = tuple(dict(output) for output in self.outputs)
+        return state
+
+    def __setstate__(self, state):
+        state["outputs"] = tuple(MappingProxyType(output) for output in state["outputs"])
+        self.__dict__.update(state)
+
+    def new_truth(self, shape=()):
+        """Test outcomes with nothing known yet: only the padding test holds."""
+        truth = np.zeros(tuple(shape) + (self.n_tests,), dtype=bool)
+        truth[..., ALWAYS_TRUE] = True
+        return truth
+
+    def test_facts(self, facts, truth=None):
+        """Outcome of every compiled test for one set of facts."""
+        truth = self.new_truth() if truth is None else truth
+        for fact, tests in self.tests.items():
+            if fact in facts:
+                tests.apply(facts[fact], truth)
+        return truth
+
+    def fired(self, truth, rules=None):
+        """Boolean per rule (or per rule in `rules`): do all of its tests hold?"""
+        rows = self.rule_tests if rules is None else self.rule_tests[rules]
+        return truth[..., rows].all(axis=-1)
+
+    def evaluate(self, facts):
+        """Read-only outputs of every rule that fires, in rules.json order."""
+        fired = self.fired(self.test_facts(facts))
+        return tuple(self.outputs[i] for i in np.flatnonzero(fired))
+
+    def evaluate_table(self, table, chunk_rows=TABLE_CHUNK_ROWS, rules_subset=None):
+        """
+        Every (row, rule) that fires over a FactTable, as two int arrays in
+        row-then-rule order. Rows are processed in blocks of chunk_rows.
+        rules_subset (sorted rule indices) limits which rules are evaluated.
+        """
+        rows, rules = [], []
+        for start in range(0, len(table), chunk_rows):
+            stop = min(start + chunk_rows, len(table))
+            truth = self.new_truth((stop - start,))
+            for fact, tests in self.tests.items():
+                if fact in table.columns:
+                    tests.apply_column(table.columns[fact][start:stop], truth)
+            r, k = np.nonzero(self.fired(truth, rules_subset))
+            rows.append(r + start)
+            rules.append(k if rules_subset is None else np.asarray(rules_subset)[k])
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.concatenate(rows), np.concatenate(rules)
+
+
+def compile_rules(rules):
+    return CompiledRules(rules)
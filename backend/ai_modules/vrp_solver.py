@@ -0,0 +1,168 @@
+# vrp_solver.py
+# -----------------------------------------------
+# 🚐 Purpose: Multi-officer routing (capacitated VRP) over a dense distance matrix.
+# Index 0 is the branch; every officer starts and ends there.
+# 1. Clarke-Wright savings: every client starts on its own route and routes
+#    are joined end -> start in order of the distance they save,
+#    s(i, j) = d(i, 0) + d(0, j) - d(i, j), as long as the joined route stays
+#    within max_stops and max_route_km. Savings are only computed for each
+#    client's K nearest neighbours, so the candidate list is O(n * K), not n².
+# 2. Each route is polished with the single-tour local search (route_solver).
+# 3. The N officers get the N fullest routes. Clients of the routes beyond N
+#    are cheapest-inserted into the kept tours that still have room (stops
+#    and km), and those tours are polished again; a client is unassigned only
+#    if it fits in no tour (more clients than N * max_stops, or too far for
+#    max_route_km).
+# -----------------------------------------------
+
+import time
+
+import numpy as np
+
+from ai_modules.route_solver import EPS, neighbour_lists, solve_tour, tour_length
+
+SAVINGS_NEIGHBOURS = 25
+
+
+def savings_routes(km, max_stops, max_route_km=None, k=SAVINGS_NEIGHBOURS):
+    """
+    Clarke-Wright savings. Returns (routes, unreachable): routes are lists of
+    client indices in visiting order; unreachable clients cannot be served
+    within max_route_km even on their own.
+    """
+    n = len(km)
+    limit = max_route_km if max_route_km else np.inf
+    solo = km[0, 1:] + km[1:, 0]
+    unreachable = [int(i) + 1 for i in np.nonzero(solo > limit)[0]]
+    if n <= 1:
+        return [], unreachable
+
+    # Candidate joins i -> j among each client's nearest neighbours, best saving first
+    neigh = neighbour_lists(km[1:, 1:], min(k, n - 2))
+    i_idx = np.repeat(np.arange(1, n), [len(row) for row in neigh])
+    j_idx = np.asarray([j + 1 for row in neigh for j in row], dtype=np.int64)
+    if len(j_idx):
+        saving = km[i_idx, 0] + km[0, j_idx] - km[i_idx, j_idx]
+        order = np.argsort(-saving, kind="stable")
+        keep = saving[order] > 0
+        candidates = zip(i_idx[order][keep].tolist(), j_idx[order][keep].tolist(), saving[order][keep].tolist())
+    else:
+        candidates = []
+
+    blocked = set(unreachable)
+    routes = {c: [c] for c in range(1, n) if c not in blocked}
+    route_of = {c: c for c in routes}
+    length = {c: float(solo[c - 1]) for c in routes}
+
+    for i, j, s in candidates:
+        ri, rj = route_of.get(i), route_of.get(j)
+        if ri is None or rj is None or ri == rj:
+            continue
+        # i must end its route and j must start its route (no reversal: the matrix may be asymmetric)
+        if routes[ri][-1] != i or routes[rj][0] != j:
+            continue
+        if len(routes[ri]) + len(routes[rj]) > max_stops:
+            continue
+        joined_length = length[ri] + length[rj] - s
+        if joined_length > limit:
+            continue
+        routes[ri].extend(routes[rj])
+        for c in routes[rj]:
+            route_of[c] = ri
+        length[ri] = joined_length
+        del routes[rj], length[rj]
+
+    return list(routes.values()), unreachable
+
+
+def insert_leftovers(km, tours, clients, max_stops, max_route_km=None):
+    """
+    Cheapest insertion of `clients` into `tours` ([0, ..., 0] lists, changed in
+    place) as long as each tour stays within max_stops and max_route_km.
+    Returns (clients that fit nowhere, indices of the tours that changed).
+    """
+    limit = max_route_km if max_route_km else np.inf
+    pending = np.asarray(sorted(clients), dtype=np.int64)
+    changed = set()
+    if not len(pending) or not tours:
+        return pending.tolist(), changed
+
+    lengths = [tour_length(km, t) for t in tours]
+    # extra[c, t]: cheapest added km to put pending[c] into tours[t], after position at[c, t]
+    extra = np.full((len(pending), len(tours)), np.inf)
+    at = np.zeros((len(pending), len(tours)), dtype=np.int64)
+
+    def score(t):
+        tour = np.asarray(tours[t])
+        if len(tour) - 2 >= max_stops:
+            extra[:, t] = np.inf
+            return
+        a, b = tour[:-1], tour[1:]
+        cost = km[np.ix_(a, pending)].T + km[np.ix_(pending, b)] - km[a, b]
+        best = cost.argmin(axis=1)
+        added = cost[np.arange(len(pending)), best]
+        added[lengths[t] + added > limit + EPS] = np.inf
+        extra[:, t], at[:, t] = added, best
+
+    for t in range(len(tours)):
+        score(t)
+    left = np.ones(len(pending), dtype=bool)
+    while left.any():
+        masked = np.where(left[:, None], extra, np.inf)
+        c, t = np.unravel_index(int(masked.argmin()), masked.shape)
+        if not np.isfinite(masked[c, t]):
+            break
+        tours[t].insert(int(at[c, t]) + 1, int(pending[c]))
+        lengths[t] += float(extra[c, t])
+        left[c] = False
+        changed.add(int(t))
+        score(t)
+    return pending[left].tolist(), changed
+
+
+def _polish(km, tour, strategy, budget):
+    """Local search on the tour's own sub-matrix, starting from its current order (only ever shortens it)."""
+    nodes = np.asarray(tour[:-1])
+    initial = list(range(len(nodes))) + [0]
+    sub_tour, _ = solve_tour(km[np.ix_(nodes, nodes)], strategy, budget, initial_tour=initial)
+    return [int(nodes[i]) for i in sub_tour]
+
+
+def solve_vrp(km, officers, max_stops, max_route_km=None, strategy="oropt", time_budget_s=1.0):
+    """
+    Splits clients 1..n-1 across `officers` routes.
+    Returns (tours, unassigned, stats): tours are [0, ..., 0] index lists
+    (one per officer that got work), unassigned are client indices.
+    """
+    km = np.asarray(km, dtype=np.float64)
+    started = time.perf_counter()
+    routes, unassigned = savings_routes(km, max_stops, max_route_km)
+
+    # Polish each route on its own sub-matrix; the budget is shared across routes
+    tours = []
+    deadline = started + time_budget_s
+    for route in routes:
+        budget = max(0.0, (deadline - time.perf_counter()) / max(1, len(routes) - len(tours)))
+        # Local search starts from the savings order and only ever shortens it, so max_route_km still holds
+        tours.append(_polish(km, [0] + route + [0], strategy, budget))
+
+    # Fullest routes first; shortest first among equals
+    tours.sort(key=lambda t: (-(len(t) - 2), tour_length(km, t)))
+    leftovers = unassigned + [c for tour in tours[officers:] for c in tour[1:-1]]
+    tours = tours[:officers]
+
+    # Officers with room take the clients of the routes that got no officer; polishing
+    # can free km under max_route_km, so repeat while clients still find a place
+    unassigned, changed = leftovers, True
+    while unassigned and changed:
+        unassigned, changed = insert_leftovers(km, tours, unassigned, max_stops, max_route_km)
+        for done, t in enumerate(sorted(changed)):
+            budget = max(0.0, (deadline - time.perf_counter()) / (len(changed) - done))
+            tours[t] = _polish(km, tours[t], strategy, budget)
+
+    return tours, sorted(unassigned), {
+        "routes_built": len(routes),
+        "reinserted": len(leftovers) - len(unassigned),
+        "solve_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
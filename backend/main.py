@@ -5,8 +5,12 @@
 # Run this file using: uvicorn main:app --reload --port 8080
 # -----------------------------------------------
 
+import asyncio
+
 from fastapi import FastAPI
 from api import routes as financial_router
+from services.executors import shutdown_executors
+from services.forecast_cache import warm_forecast_cache
 from fastapi.middleware.cors import CORSMiddleware  # <-- 1. IMPORT THIS
 
 app = FastAPI()
@@ -29,6 +33,17 @@ app.add_middleware(
 # Include financial data routes under /api
 app.include_router(financial_router.router, prefix="/api")
 
+# Precompute forecasts so dashboard requests are served from memory
+# (in the background, so the server starts accepting requests immediately)
+@app.on_event("startup")
+async def warm_caches():
+    app.state.forecast_warmup = asyncio.create_task(warm_forecast_cache())
+
+# Stop the DB thread pool and forecast/optimizer process pool with the server
+@app.on_event("shutdown")
+def stop_executors():
+    shutdown_executors()
+
 @app.get("/")
 def read_root():
     return {"message": "FinSight AI API is running. Go to /docs for API documentation."}
\ No newline at end of file
@@ -0,0 +1,433 @@
+# advisor_alerts.py
+# -----------------------------------------------
+# 🔔 Purpose: Event-driven, incremental advisor alerts.
+# Instead of re-running every rule when the dashboard opens, the advisor keeps
+# its last known facts and the alerts currently raised in the database, and
+# only recomputes what new data can have changed:
+#
+# 1. Affected entities: branches / clients with loan_repayment or loan rows
+#    created or modified since the last watermark, or the ones a loader
+#    passes explicitly (arrears has no timestamps; see services/upload_csv.py)
+# 2. Facts of just those entities are recomputed with the batch fact queries
+#    (services/advisor_batch.py) and compared with advisor_fact
+# 3. Only rules that read a fact that changed are re-evaluated
+# 4. Newly firing rules insert an advisor_alert row (raised_at); rules that
+#    stopped firing get cleared_at set. Nothing is deleted, so the table is
+#    also the alert history.
+# 5. The network-wide facts (entity_type "network", what /advisor shows when
+#    no branch is given) are recomputed whenever any branch or client is,
+#    so the network view is one entity's alerts, not every branch's
+#
+# Tables:
+#   advisor_fact   - last computed value of every fact per entity
+#   advisor_alert  - one row per raised alert; cleared_at IS NULL = active
+#   advisor_state  - refresh watermark
+#
+# Facts with a time window (30-day collection rate, last month's growth) drift
+# without new rows, so run a full rebuild once a day as well.
+#
+# Run manually with:  python -m services.advisor_alerts [--full]
+# -----------------------------------------------
+
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+from mysql.connector import errors
+
+from ai_modules.advisor_engine import load_rules
+from ai_modules.rule_compiler import compile_rules
+from services.advisor_batch import NETWORK_ID, load_fact_table
+
+RULES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ai_modules", "rules.json")
+ENTITY_TYPES = {"branches": "branch", "clients": "client", "network": "network"}
+REFRESH_CHUNK = 5000   # entities recomputed per transaction
+
+ALERT_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS advisor_fact (
+        entity_type VARCHAR(16) NOT NULL,
+        entity_id VARCHAR(100) NOT NULL,
+        fact VARCHAR(100) NOT NULL,
+        fact_value VARCHAR(255) NULL,
+        updated_at DATETIME NOT NULL,
+        PRIMARY KEY (entity_type, entity_id, fact)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS advisor_alert (
+        id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        entity_type VARCHAR(16) NOT NULL,
+        entity_id VARCHAR(100) NOT NULL,
+        branch_key VARCHAR(100) NULL,
+        rule_name VARCHAR(255) NOT NULL,
+        alert VARCHAR(255) NULL,
+        recommendation TEXT NULL,
+        raised_at DATETIME NOT NULL,
+        cleared_at DATETIME NULL,
+        INDEX idx_advisor_alert_entity (entity_type, entity_id, cleared_at),
+        INDEX idx_advisor_alert_branch (branch_key, entity_type, cleared_at)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS advisor_state (
+        state_key VARCHAR(64) NOT NULL PRIMARY KEY,
+        state_value VARCHAR(64) NULL
+    )
+    """,
+]
+
+CHANGED_ENTITIES_QUERY = """
+SELECT c.id, o.branch_key
+FROM loan_repayment lr
+JOIN loan l ON lr.loan_id = l.id
+JOIN client c ON l.client_id = c.id
+JOIN office o ON c.office_id = o.id
+WHERE lr.created_date >= %(since)s OR lr.lastmodified_date >= %(since)s
+UNION
+SELECT c.id, o.branch_key
+FROM loan l
+JOIN client c ON l.client_id = c.id
+JOIN office o ON c.office_id = o.id
+WHERE l.submittedon_date >= %(since)s OR l.approvedon_date >= %(since)s
+"""
+
+
+def ensure_alert_tables(conn):
+    cursor = conn.cursor()
+    for ddl in ALERT_DDL:
+        cursor.execute(ddl)
+    cursor.close()
+    conn.commit()
+
+
+def _get_state(cursor, key):
+    cursor.execute("SELECT state_value FROM advisor_state WHERE state_key = %s", (key,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _set_state(cursor, key, value):
+    cursor.execute(
+        "INSERT INTO advisor_state (state_key, state_value) VALUES (%s, %s) "
+        "ON DUPLICATE KEY UPDATE state_value = VALUES(state_value)",
+        (key, value)
+    )
+
+
+def _network_built(cursor):
+    """True once the network entity's facts have been computed."""
+    cursor.execute(
+        "SELECT 1 FROM advisor_fact WHERE entity_type = 'network' AND entity_id = %s LIMIT 1", (NETWORK_ID,)
+    )
+    return cursor.fetchone() is not None
+
+
+def _in_list(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def _fact_text(value):
+    """Stored form of a fact value, used only to detect changes."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value[:255]
+    return f"{float(value):.12g}"
+
+
+# --------------------------
+# 1) Affected entities
+# --------------------------
+def changed_entities(conn, since):
+    """(branches, clients) with repayment / loan rows created or modified on or after `since`."""
+    cursor = conn.cursor()
+    cursor.execute(CHANGED_ENTITIES_QUERY, {"since": since})
+    rows = cursor.fetchall()
+    cursor.close()
+    return {r[1].strip() for r in rows if r[1]}, {r[0] for r in rows}
+
+
+def entities_for_loans(conn, loan_ids):
+    """
+    (branches, clients) a set of loan ids can affect: the loans' owners, plus
+    the clients the /delinquency arrears join (arrears.loan_id = client.id)
+    attributes those rows to.
+    """
+    branches, clients = set(), set()
+    loan_ids = list(loan_ids)
+    cursor = conn.cursor()
+    for start in range(0, len(loan_ids), REFRESH_CHUNK):
+        chunk = loan_ids[start:start + REFRESH_CHUNK]
+        cursor.execute(
+            f"""
+            SELECT c.id, o.branch_key
+            FROM client c
+            JOIN office o ON c.office_id = o.id
+            WHERE c.id IN (SELECT l.client_id FROM loan l WHERE l.id IN ({_in_list(chunk)}))
+               OR c.id IN ({_in_list(chunk)})
+            """,
+            chunk + chunk
+        )
+        for client_id, branch in cursor.fetchall():
+            clients.add(client_id)
+            if branch:
+                branches.add(branch.strip())
+    cursor.close()
+    return branches, clients
+
+
+# --------------------------
+# 2) Incremental refresh of one scope
+# --------------------------
+def _stored_facts(cursor, entity_type, entity_ids):
+    cursor.execute(
+        f"SELECT entity_id, fact, fact_value FROM advisor_fact "
+        f"WHERE entity_type = %s AND entity_id IN ({_in_list(entity_ids)})",
+        [entity_type] + entity_ids
+    )
+    return {(row[0], row[1]): row[2] for row in cursor.fetchall()}
+
+
+def _active_alerts(cursor, entity_type, entity_ids):
+    cursor.execute(
+        f"SELECT id, entity_id, rule_name FROM advisor_alert "
+        f"WHERE entity_type = %s AND cleared_at IS NULL AND entity_id IN ({_in_list(entity_ids)})",
+        [entity_type] + entity_ids
+    )
+    return {(row[1], row[2]): row[0] for row in cursor.fetchall()}
+
+
+def _refresh_chunk(conn, compiled, scope, ids, full):
+    """Recomputes facts for `ids` and raises / clears alerts. Returns (raised, cleared, rows_evaluated)."""
+    entity_type = ENTITY_TYPES[scope]
+    table = load_fact_table(conn, scope, ids=ids)
+    keys = [str(i) for i in ids]
+    table_keys = [str(i) for i in table.ids]
+    cursor = conn.cursor()
+    stored = _stored_facts(cursor, entity_type, keys)
+    active = _active_alerts(cursor, entity_type, keys)
+
+    # Which facts changed, per row
+    facts = list(table.columns)
+    new_text = {fact: [_fact_text(v) for v in table.columns[fact]] for fact in facts}
+    changed = np.zeros((len(table), len(facts)), dtype=bool)
+    for j, fact in enumerate(facts):
+        changed[:, j] = [stored.get((key, fact), "\0") != text for key, text in zip(table_keys, new_text[fact])]
+
+    if full:
+        rows = np.arange(len(table))
+        rules = np.arange(len(compiled))
+    else:
+        rows = np.flatnonzero(changed.any(axis=1))
+        touched = [compiled.fact_rules[f] for j, f in enumerate(facts) if changed[:, j].any() and f in compiled.fact_rules]
+        rules = np.unique(np.concatenate(touched)) if touched else np.empty(0, dtype=np.int64)
+
+    raised, cleared = [], []
+    if len(rows) and len(rules):
+        subset = table.take(rows)
+        hit_rows, hit_rules = compiled.evaluate_table(subset, rules_subset=rules)
+        fired = {(table_keys[rows[r]], compiled.rule_names[k]) for r, k in zip(hit_rows.tolist(), hit_rules.tolist())}
+        for r, k in zip(hit_rows.tolist(), hit_rules.tolist()):
+            key = table_keys[rows[r]]
+            if (key, compiled.rule_names[k]) not in active:
+                output = compiled.outputs[k]
+                raised.append((
+                    entity_type, key, table.branches[rows[r]], compiled.rule_names[k],
+                    output.get("alert"), output.get("recommendation")
+                ))
+        evaluated = {table_keys[i] for i in rows.tolist()}
+        names = {compiled.rule_names[k] for k in rules.tolist()}
+        for (key, rule_name), alert_id in active.items():
+            if key in evaluated and rule_name in names and (key, rule_name) not in fired:
+                cleared.append(alert_id)
+
+    # Entities that no longer exist, and (full runs) rules removed from rules.json
+    present, known_rules = set(table_keys), set(compiled.rule_names)
+    for (key, rule_name), alert_id in active.items():
+        if key not in present or (full and rule_name not in known_rules):
+            cleared.append(alert_id)
+    gone = [key for key in keys if key not in present]
+    cleared = sorted(set(cleared))
+
+    fact_rows = [
+        (entity_type, table_keys[i], fact, new_text[fact][i])
+        for j, fact in enumerate(facts) for i in np.flatnonzero(changed[:, j]).tolist()
+    ]
+    try:
+        if fact_rows:
+            cursor.executemany(
+                "INSERT INTO advisor_fact (entity_type, entity_id, fact, fact_value, updated_at) "
+                "VALUES (%s, %s, %s, %s, NOW()) "
+                "ON DUPLICATE KEY UPDATE fact_value = VALUES(fact_value), updated_at = VALUES(updated_at)",
+                fact_rows
+            )
+        if gone:
+            cursor.execute(
+                f"DELETE FROM advisor_fact WHERE entity_type = %s AND entity_id IN ({_in_list(gone)})",
+                [entity_type] + gone
+            )
+        if raised:
+            cursor.executemany(
+                "INSERT INTO advisor_alert (entity_type, entity_id, branch_key, rule_name, alert, recommendation, raised_at) "
+                "VALUES (%s, %s, %s, %s, %s, %s, NOW())",
+                raised
+            )
+        if cleared:
+            cursor.execute(
+                f"UPDATE advisor_alert SET cleared_at = NOW() WHERE id IN ({_in_list(cleared)})",
+                cleared
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return len(raised), len(cleared), len(rows)
+
+
+def _all_ids(conn, scope):
+    cursor = conn.cursor()
+    if scope == "branches":
+        cursor.execute("SELECT DISTINCT branch_key FROM office WHERE branch_key IS NOT NULL")
+        ids = sorted({row[0].strip() for row in cursor.fetchall() if row[0]})
+    elif scope == "network":
+        ids = [NETWORK_ID]
+    else:
+        cursor.execute("SELECT id FROM client ORDER BY id")
+        ids = [row[0] for row in cursor.fetchall()]
+    # Entities that had facts before but are gone now still need their alerts cleared
+    cursor.execute("SELECT DISTINCT entity_id FROM advisor_fact WHERE entity_type = %s", (ENTITY_TYPES[scope],))
+    known = {str(i) for i in ids}
+    ids += [row[0] for row in cursor.fetchall() if row[0] not in known]
+    cursor.close()
+    return ids
+
+
+# --------------------------
+# 3) Entry point used by the loader, the CLI and POST /advisor/refresh
+# --------------------------
+def refresh_alerts(conn, branches=None, clients=None, loan_ids=None, full=False, compiled=None):
+    """
+    Brings advisor_alert up to date.
+    - full=True (or first run): recompute every branch and client, all rules
+    - branches / clients / loan_ids: recompute exactly those entities (loaders)
+    - otherwise: entities with repayment / loan rows changed since the last watermark
+    Returns a small report dict.
+    """
+    started = datetime.now()
+    compiled = compiled or compile_rules(load_rules(RULES_PATH))
+    ensure_alert_tables(conn)
+    cursor = conn.cursor()
+    watermark = _get_state(cursor, "watermark")
+
+    if full or watermark is None:
+        mode, full = "full", True
+        targets = {scope: _all_ids(conn, scope) for scope in ENTITY_TYPES}
+    elif branches is not None or clients is not None or loan_ids is not None:
+        mode = "explicit"
+        branches, clients = set(branches or ()), set(clients or ())
+        if loan_ids:
+            loan_branches, loan_clients = entities_for_loans(conn, loan_ids)
+            branches |= loan_branches
+            clients |= loan_clients
+        targets = {"branches": sorted(b.strip() for b in branches if b), "clients": sorted(clients, key=str)}
+    else:
+        mode = "incremental"
+        branches, clients = changed_entities(conn, watermark)
+        targets = {"branches": sorted(branches), "clients": sorted(clients, key=str)}
+
+    # Any changed branch / client moves the network totals; also build them once if never built
+    if not full and (targets["branches"] or targets["clients"] or not _network_built(cursor)):
+        targets["network"] = [NETWORK_ID]
+
+    report = {"mode": mode, "raised": 0, "cleared": 0}
+    for scope, ids in targets.items():
+        evaluated = 0
+        for start in range(0, len(ids), REFRESH_CHUNK):
+            raised, cleared, rows = _refresh_chunk(conn, compiled, scope, ids[start:start + REFRESH_CHUNK], full)
+            report["raised"] += raised
+            report["cleared"] += cleared
+            evaluated += rows
+        if scope != "network":
+            report[f"{scope}_checked"] = len(ids)
+            report[f"{scope}_reevaluated"] = evaluated
+    report["network_reevaluated"] = "network" in targets
+
+    # Same DATE-granular watermark as the summary refresh
+    if mode != "explicit":
+        _set_state(cursor, "watermark", started.strftime("%Y-%m-%d"))
+    _set_state(cursor, "refreshed_at", started.strftime("%Y-%m-%d %H:%M:%S"))
+    conn.commit()
+    cursor.close()
+
+    report["seconds"] = round((datetime.now() - started).total_seconds(), 3)
+    print(f"[Alerts] {mode} refresh: {report}")
+    return report
+
+
+# --------------------------
+# 4) Reads used by the API routes
+# --------------------------
+def read_alerts(conn, branch=None, entity_type="branch", include_cleared=False, limit=500):
+    """
+    Alerts from advisor_alert (active only unless include_cleared), newest
+    first; None if the alert tables (or, for entity_type "network", the
+    network entity) have not been built yet.
+    """
+    # State lookups index rows by position: plain cursor
+    cursor = conn.cursor()
+    try:
+        refreshed_at = _get_state(cursor, "refreshed_at")
+        ready = refreshed_at is not None and (entity_type != "network" or _network_built(cursor))
+    except errors.ProgrammingError:
+        # advisor_state does not exist yet
+        return None
+    finally:
+        cursor.close()
+    if not ready:
+        return None
+
+    cursor = conn.cursor(dictionary=True)
+
+    where, params = ["entity_type = %s"], [entity_type]
+    if branch:
+        where.append("branch_key = %s")
+        params.append(branch.strip())
+    if not include_cleared:
+        where.append("cleared_at IS NULL")
+    cursor.execute(
+        f"""
+        SELECT entity_type, entity_id, branch_key, rule_name, alert, recommendation, raised_at, cleared_at
+        FROM advisor_alert
+        WHERE {' AND '.join(where)}
+        ORDER BY raised_at DESC, id DESC
+        LIMIT %s
+        """,
+        params + [limit]
+    )
+    rows = cursor.fetchall()
+    cursor.close()
+
+    alerts = []
+    for row in rows:
+        alerts.append({
+            "alert": row["alert"],
+            "recommendation": row["recommendation"],
+            "reason": row["rule_name"],
+            "entity_type": row["entity_type"],
+            "entity_id": row["entity_id"],
+            "branch": row["branch_key"],
+            "raised_at": row["raised_at"].isoformat() if row["raised_at"] else None,
+            "cleared_at": row["cleared_at"].isoformat() if row["cleared_at"] else None,
+        })
+    return {"alerts": alerts, "refreshed_at": refreshed_at}
+
+
+if __name__ == "__main__":
+    from services.db import db_connection
+
+    with db_connection() as conn:
+        print(refresh_alerts(conn, full="--full" in sys.argv))
@@ -0,0 +1,235 @@
+# advisor_batch.py
+# -----------------------------------------------
+# 🧠 Purpose: Batch advisor - runs the compiled rules over every branch, or
+# every client (of one branch or the whole network), in one call.
+# /advisor runs three aggregate queries for one branch per request; here each
+# fact family is one grouped query over all entities, the results form a
+# columnar FactTable, and the rules run as boolean masks over its columns
+# (CompiledRules.evaluate_table in ai_modules/rule_compiler.py).
+# The "network" scope is one entity holding the network-wide facts (what
+# /advisor evaluates when no branch is given); services/advisor_alerts.py
+# keeps its alerts.
+#
+# Only facts the database actually holds are loaded: the forecast / risk
+# score facts /advisor fills with fixed demo values are left unknown, so
+# rules that need them do not fire in batch mode.
+# -----------------------------------------------
+
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from ai_modules.rule_compiler import FactTable
+
+SCOPES = ("branches", "clients")
+NETWORK_ID = "network"
+
+
+# --------------------------
+# 1) Fact families: (fact, grouped query, default for entities the query returns no row for)
+#    Each query returns (entity_id, value); {entity_filter} narrows it to one branch
+#    or to a list of branches / clients (see _entity_filter)
+# --------------------------
+BRANCH_FACTS = [
+    (
+        "branch_collection_rate_30d",
+        """
+        SELECT o.branch_key, SUM(lr.principal_completed_derived) / SUM(lr.principal_amount) * 100
+        FROM loan_repayment lr
+        JOIN loan l ON lr.loan_id = l.id
+        JOIN client c ON l.client_id = c.id
+        JOIN office o ON c.office_id = o.id
+        WHERE lr.duedate >= %(last_30_days)s {entity_filter}
+        GROUP BY o.branch_key
+        """,
+        100,
+    ),
+    (
+        "customer_growth_30d",
+        """
+        SELECT o.branch_key, COUNT(DISTINCT c.id)
+        FROM loan l
+        JOIN client c ON l.client_id = c.id
+        JOIN office o ON c.office_id = o.id
+        WHERE l.approvedon_date >= %(last_month_start)s AND l.approvedon_date < %(this_month_start)s {entity_filter}
+        GROUP BY o.branch_key
+        """,
+        0,
+    ),
+    (
+        "current_par_percent",
+        """
+        SELECT o.branch_key,
+               SUM(CASE WHEN a.dpd_days > 30 THEN a.total_overdue_derived ELSE 0 END) /
+               SUM(l.principal_disbursed_derived) * 100
+        FROM loan l
+        LEFT JOIN arrears a ON l.id = a.loan_id
+        JOIN client c ON l.client_id = c.id
+        JOIN office o ON c.office_id = o.id
+        WHERE 1 = 1 {entity_filter}
+        GROUP BY o.branch_key
+        """,
+        0,
+    ),
+]
+
+# Same arrears -> client join as /delinquency; clients without arrears are not overdue
+CLIENT_FACTS = [
+    (
+        "client_current_dpd",
+        """
+        SELECT c.id, MAX(a.dpd_days)
+        FROM arrears a
+        JOIN client c ON a.loan_id = c.id
+        JOIN office o ON c.office_id = o.id
+        WHERE 1 = 1 {entity_filter}
+        GROUP BY c.id
+        """,
+        0,
+    ),
+]
+
+# The branch facts over the whole network (same queries as /advisor without a branch)
+NETWORK_FACTS = [
+    (
+        "branch_collection_rate_30d",
+        """
+        SELECT 'network', SUM(lr.principal_completed_derived) / SUM(lr.principal_amount) * 100
+        FROM loan_repayment lr
+        JOIN loan l ON lr.loan_id = l.id
+        JOIN client c ON l.client_id = c.id
+        JOIN office o ON c.office_id = o.id
+        WHERE lr.duedate >= %(last_30_days)s {entity_filter}
+        """,
+        100,
+    ),
+    (
+        "customer_growth_30d",
+        """
+        SELECT 'network', COUNT(DISTINCT c.id)
+        FROM loan l
+        JOIN client c ON l.client_id = c.id
+        JOIN office o ON c.office_id = o.id
+        WHERE l.approvedon_date >= %(last_month_start)s AND l.approvedon_date < %(this_month_start)s {entity_filter}
+        """,
+        0,
+    ),
+    (
+        "current_par_percent",
+        """
+        SELECT 'network',
+               SUM(CASE WHEN a.dpd_days > 30 THEN a.total_overdue_derived ELSE 0 END) /
+               SUM(l.principal_disbursed_derived) * 100
+        FROM loan l
+        LEFT JOIN arrears a ON l.id = a.loan_id
+        JOIN client c ON l.client_id = c.id
+        JOIN office o ON c.office_id = o.id
+        WHERE 1 = 1 {entity_filter}
+        """,
+        0,
+    ),
+]
+
+# (entity_id, branch_key) of every entity in scope
+ENTITY_QUERIES = {
+    "branches": "SELECT DISTINCT o.branch_key, o.branch_key FROM office o WHERE o.branch_key IS NOT NULL {entity_filter}",
+    "clients": "SELECT c.id, o.branch_key FROM client c JOIN office o ON c.office_id = o.id WHERE 1 = 1 {entity_filter} ORDER BY c.id",
+    "network": "SELECT 'network', NULL FROM DUAL WHERE 1 = 1 {entity_filter}",
+}
+ENTITY_COLUMNS = {"branches": "o.branch_key", "clients": "c.id", "network": "'network'"}
+FACT_FAMILIES = {"branches": BRANCH_FACTS, "clients": CLIENT_FACTS, "network": NETWORK_FACTS}
+
+
+def _fact_params(branch):
+    this_month_start = datetime.today().replace(day=1)
+    return {
+        "branch": branch.strip() if branch else None,
+        "last_30_days": datetime.now() - timedelta(days=30),
+        "this_month_start": this_month_start,
+        "last_month_start": (this_month_start - timedelta(days=1)).replace(day=1),
+    }
+
+
+def _entity_filter(scope, branch, ids, params):
+    parts = []
+    if branch:
+        parts.append("AND o.branch_key = %(branch)s")
+    if ids is not None:
+        names = [f"e{i}" for i in range(len(ids))]
+        params.update(zip(names, ids))
+        in_list = ", ".join(f"%({name})s" for name in names) or "NULL"
+        parts.append(f"AND {ENTITY_COLUMNS[scope]} IN ({in_list})")
+    return " ".join(parts)
+
+
+def load_fact_table(conn, scope="branches", branch=None, ids=None):
+    """
+    One grouped query per fact family -> FactTable with one row per branch / client.
+    ids restricts the table to those branch keys / client ids (ones that no
+    longer exist are left out). scope="network" is the single NETWORK_ID row.
+    """
+    if scope not in FACT_FAMILIES:
+        raise ValueError(f"Unknown advisor scope '{scope}'. Use one of: {', '.join(FACT_FAMILIES)}")
+    if scope == "network" and branch:
+        raise ValueError("The network scope cannot be filtered by branch.")
+    params = _fact_params(branch)
+    entity_filter = _entity_filter(scope, branch, ids, params)
+    cursor = conn.cursor()
+
+    cursor.execute(ENTITY_QUERIES[scope].format(entity_filter=entity_filter), params)
+    rows = cursor.fetchall()
+    ids = [row[0].strip() if isinstance(row[0], str) else row[0] for row in rows]
+    branches = [row[1].strip() if row[1] else row[1] for row in rows]
+    index = {entity: i for i, entity in enumerate(ids)}
+
+    columns = {}
+    for fact, query, default in FACT_FAMILIES[scope]:
+        column = [default] * len(ids)
+        cursor.execute(query.format(entity_filter=entity_filter), params)
+        for entity, value in cursor.fetchall():
+            i = index.get(entity.strip() if isinstance(entity, str) else entity)
+            if i is not None and value is not None:
+                column[i] = value
+        columns[fact] = column
+    cursor.close()
+    return FactTable(ids, columns, branches)
+
+
+# --------------------------
+# 2) Evaluation (CPU work - runs on the process pool)
+# --------------------------
+def evaluate_batch(compiled, table, include_facts=False):
+    """
+    Runs the compiled rules over a FactTable.
+    Returns { entities, flagged, rule_counts, results: [{id, recommendations, facts?}, ...] }
+    listing only entities at least one rule fired for.
+    """
+    started = time.perf_counter()
+    rows, rules = compiled.evaluate_table(table)
+
+    results = []
+    if len(rows):
+        # rows come out sorted, so each entity's rules are one contiguous run
+        starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+        ends = np.r_[starts[1:], len(rows)]
+        for s, e in zip(starts.tolist(), ends.tolist()):
+            row = int(rows[s])
+            entry = {
+                "id": table.ids[row],
+                "recommendations": [dict(compiled.outputs[k]) for k in rules[s:e].tolist()],
+            }
+            if include_facts:
+                entry["facts"] = {fact: (float(v) if not isinstance(v, str) else v) for fact, v in table.row(row).items()}
+            results.append(entry)
+
+    counts = np.bincount(rules, minlength=len(compiled))
+    elapsed = time.perf_counter() - started
+    print(f"[AdvisorBatch] {len(table)} entities, {len(results)} flagged in {elapsed:.3f}s")
+    return {
+        "entities": len(table),
+        "flagged": len(results),
+        "rule_counts": {compiled.rule_names[k]: int(n) for k, n in enumerate(counts) if n},
+        "seconds": round(elapsed, 3),
+        "results": results,
+    }
@@ -0,0 +1,77 @@
+# cache.py
+# -----------------------------------------------
+# 🗃️ Purpose: Small in-process TTL + LRU cache shared by the API layers.
+# Thread-safe (routes hit it from the event loop and from executor threads)
+# and keeps hit/miss/eviction counters for the monitoring routes.
+# -----------------------------------------------
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Least-recently-used cache whose entries also expire after ttl_seconds."""
+
+    def __init__(self, max_entries=256, ttl_seconds=3600, name="cache"):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.name = name
+        self._data = OrderedDict()   # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return default
+            self._data.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def set(self, key, value, ttl_seconds=None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, predicate=None):
+        """Drops every entry (or only keys where predicate(key) is true). Returns the count."""
+        with self._lock:
+            if predicate is None:
+                removed = len(self._data)
+                self._data.clear()
+            else:
+                doomed = [key for key in self._data if predicate(key)]
+                for key in doomed:
+                    del self._data[key]
+                removed = len(doomed)
+            self._stats["invalidations"] += removed
+            return removed
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["entries"] = len(self._data)
+        lookups = snapshot["hits"] + snapshot["misses"]
+        snapshot["hit_rate"] = round(snapshot["hits"] / lookups, 4) if lookups else 0.0
+        snapshot["name"] = self.name
+        snapshot["max_entries"] = self.max_entries
+        snapshot["ttl_seconds"] = self.ttl_seconds
+        return snapshot
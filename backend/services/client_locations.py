@@ -0,0 +1,315 @@
+# client_locations.py
+# -----------------------------------------------
+# 🗺️ Purpose: Stored client / branch coordinates for route planning.
+# The route endpoints used to invent random coordinates on every request and
+# pick clients with an unordered LIMIT. Locations now live in two tables,
+# filled by an offline geocoding job, and the planners pick their stops with
+# indexed queries.
+#
+# Tables:
+#   client_location  - one point per client, plus its grid cell
+#                      (cell_x, cell_y) = floor(lon / GRID_DEG), floor(lat / GRID_DEG)
+#                      indexed on (branch_key, cell_x, cell_y)
+#   branch_location  - one point per branch (the depot of its routes)
+#
+# Selection:
+#   nearest - grid search outwards from the branch: query a box of cells,
+#             rank it by exact haversine distance, and widen the box until
+#             the N-th nearest client is inside the radius the box fully covers
+#   overdue - most overdue delinquent clients that have a location
+#
+# Geocoding (see services/geocoding.py) is incremental: only clients without
+# a location, or whose branch changed, are geocoded; one commit per batch.
+#
+# Run manually with:  python -m services.client_locations [--full]
+# -----------------------------------------------
+
+import sys
+import time
+
+import numpy as np
+from mysql.connector import errors
+
+from ai_modules.distance_matrix import haversine_matrix
+from services.geocoding import NETWORK_CENTER, get_geocoder
+
+GRID_DEG = 0.01              # ~1.1 km cells
+KM_PER_DEG_LAT = 110.574
+MAX_SEARCH_CELLS = 64        # beyond this ring radius, rank the whole branch instead
+GEOCODE_BATCH = 2000         # clients geocoded / upserted per transaction
+SELECTIONS = ("nearest", "overdue")
+
+LOCATION_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS client_location (
+        client_id BIGINT NOT NULL PRIMARY KEY,
+        branch_key VARCHAR(100) NOT NULL,
+        lat DOUBLE NOT NULL,
+        lon DOUBLE NOT NULL,
+        cell_x INT NOT NULL,
+        cell_y INT NOT NULL,
+        source VARCHAR(32) NOT NULL,
+        geocoded_at DATETIME NOT NULL,
+        INDEX idx_client_location_cell (branch_key, cell_x, cell_y)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS branch_location (
+        branch_key VARCHAR(100) NOT NULL PRIMARY KEY,
+        lat DOUBLE NOT NULL,
+        lon DOUBLE NOT NULL,
+        source VARCHAR(32) NOT NULL,
+        geocoded_at DATETIME NOT NULL
+    )
+    """,
+]
+
+
+def ensure_location_tables(conn):
+    cursor = conn.cursor()
+    for ddl in LOCATION_DDL:
+        cursor.execute(ddl)
+    cursor.close()
+    conn.commit()
+
+
+def grid_cell(lat, lon):
+    """Grid cell(s) of the given point(s): (cell_x, cell_y) as int arrays."""
+    cell_x = np.floor(np.asarray(lon, dtype=np.float64) / GRID_DEG).astype(np.int64)
+    cell_y = np.floor(np.asarray(lat, dtype=np.float64) / GRID_DEG).astype(np.int64)
+    return cell_x, cell_y
+
+
+# --------------------------
+# 1) Offline geocoding job
+# --------------------------
+PENDING_CLIENTS_QUERY = """
+SELECT c.id, o.branch_key
+FROM client c
+JOIN office o ON c.office_id = o.id
+LEFT JOIN client_location cl ON cl.client_id = c.id
+WHERE o.branch_key IS NOT NULL
+  AND (cl.client_id IS NULL OR cl.branch_key <> o.branch_key)
+ORDER BY c.id
+"""
+
+ALL_CLIENTS_QUERY = """
+SELECT c.id, o.branch_key
+FROM client c
+JOIN office o ON c.office_id = o.id
+WHERE o.branch_key IS NOT NULL
+ORDER BY c.id
+"""
+
+CLIENT_UPSERT = """
+INSERT INTO client_location (client_id, branch_key, lat, lon, cell_x, cell_y, source, geocoded_at)
+VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
+ON DUPLICATE KEY UPDATE
+    branch_key = VALUES(branch_key), lat = VALUES(lat), lon = VALUES(lon),
+    cell_x = VALUES(cell_x), cell_y = VALUES(cell_y),
+    source = VALUES(source), geocoded_at = VALUES(geocoded_at)
+"""
+
+BRANCH_UPSERT = """
+INSERT INTO branch_location (branch_key, lat, lon, source, geocoded_at)
+VALUES (%s, %s, %s, %s, NOW())
+ON DUPLICATE KEY UPDATE
+    lat = VALUES(lat), lon = VALUES(lon), source = VALUES(source), geocoded_at = VALUES(geocoded_at)
+"""
+
+
+def _geocode_branches(conn, geocoder, full):
+    """Geocodes branches without a location (all of them with full=True); returns {branch_key: (lat, lon)}."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT DISTINCT branch_key FROM office WHERE branch_key IS NOT NULL")
+    branches = sorted(row[0].strip() for row in cursor.fetchall() if row[0])
+    cursor.execute("SELECT branch_key, lat, lon FROM branch_location")
+    known = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+
+    pending = branches if full else [b for b in branches if b not in known]
+    if pending:
+        located = geocoder.geocode_branches(pending)
+        try:
+            cursor.executemany(
+                BRANCH_UPSERT,
+                [(b, lat, lon, geocoder.name) for b, (lat, lon) in located.items()]
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        known.update(located)
+        print(f"[Geocode] {len(located)} branch location(s) stored")
+    cursor.close()
+    return known
+
+
+def geocode_clients(conn, geocoder=None, full=False, batch_size=GEOCODE_BATCH):
+    """
+    Fills client_location / branch_location.
+    - default: only clients with no location yet (or a changed branch)
+    - full=True: re-geocode every branch and client
+    Returns a small report dict.
+    """
+    started = time.perf_counter()
+    geocoder = geocoder or get_geocoder()
+    ensure_location_tables(conn)
+    anchors = _geocode_branches(conn, geocoder, full)
+
+    cursor = conn.cursor()
+    cursor.execute(ALL_CLIENTS_QUERY if full else PENDING_CLIENTS_QUERY)
+    pending = [(row[0], row[1].strip()) for row in cursor.fetchall()]
+
+    stored = 0
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        client_ids = [client_id for client_id, _ in batch]
+        centers = [anchors.get(branch, NETWORK_CENTER) for _, branch in batch]
+        lats, lons = geocoder.geocode_clients(client_ids, centers)
+        cell_x, cell_y = grid_cell(lats, lons)
+        rows = [
+            (client_id, branch, float(lat), float(lon), int(cx), int(cy), geocoder.name)
+            for (client_id, branch), lat, lon, cx, cy in zip(batch, lats, lons, cell_x, cell_y)
+        ]
+        try:
+            cursor.executemany(CLIENT_UPSERT, rows)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        stored += len(rows)
+    cursor.close()
+
+    elapsed = time.perf_counter() - started
+    rate = stored / elapsed if elapsed > 0 else 0.0
+    print(f"[Geocode] {stored} client location(s) stored in {elapsed:.2f}s ({rate:,.0f} rows/s)")
+    return {
+        "geocoder": geocoder.name,
+        "mode": "full" if full else "incremental",
+        "branches": len(anchors),
+        "clients_geocoded": stored,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(rate, 1),
+    }
+
+
+# --------------------------
+# 2) Reads used by the route planners
+# --------------------------
+def read_branch_location(conn, branch):
+    """(lat, lon) of the branch, or None if it has not been geocoded."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT lat, lon FROM branch_location WHERE branch_key = %s", (branch.strip(),))
+    row = cursor.fetchone()
+    cursor.close()
+    return (float(row[0]), float(row[1])) if row else None
+
+
+NEAREST_BOX_QUERY = """
+SELECT cl.client_id AS id, c.display_name, cl.lat, cl.lon
+FROM client_location cl
+JOIN client c ON c.id = cl.client_id
+WHERE cl.branch_key = %s
+  AND cl.cell_x BETWEEN %s AND %s
+  AND cl.cell_y BETWEEN %s AND %s
+"""
+
+NEAREST_BRANCH_QUERY = """
+SELECT cl.client_id AS id, c.display_name, cl.lat, cl.lon
+FROM client_location cl
+JOIN client c ON c.id = cl.client_id
+WHERE cl.branch_key = %s
+"""
+
+
+def _rank_by_distance(rows, origin, n):
+    """The n rows closest to origin (nearest first, ties by id) and the n-th distance."""
+    if not rows:
+        return [], np.inf
+    km = haversine_matrix(
+        [origin[0]], [origin[1]], [r["lat"] for r in rows], [r["lon"] for r in rows]
+    )[0]
+    order = np.lexsort(([r["id"] for r in rows], km))[:n]
+    nearest = []
+    for i in order:
+        row = dict(rows[i])
+        row["distance_km"] = round(float(km[i]), 3)
+        nearest.append(row)
+    return nearest, (float(km[order[-1]]) if len(order) == n else np.inf)
+
+
+def nearest_clients(conn, branch, origin, n):
+    """The n located clients of the branch closest to origin (straight-line distance)."""
+    branch = branch.strip()
+    cell_x, cell_y = (int(v) for v in grid_cell(origin[0], origin[1]))
+    # The box [c - r, c + r] covers at least r whole cells around origin in every direction
+    cell_km = GRID_DEG * min(KM_PER_DEG_LAT, 111.320 * np.cos(np.radians(abs(origin[0]) + GRID_DEG)))
+
+    cursor = conn.cursor(dictionary=True)
+    ring = 1
+    try:
+        while ring <= MAX_SEARCH_CELLS:
+            cursor.execute(
+                NEAREST_BOX_QUERY,
+                (branch, cell_x - ring, cell_x + ring, cell_y - ring, cell_y + ring)
+            )
+            nearest, nth_km = _rank_by_distance(cursor.fetchall(), origin, n)
+            if nth_km <= ring * cell_km:
+                return nearest
+            ring *= 2
+        # Sparse branch (or one spread far from its office): rank all of its clients
+        cursor.execute(NEAREST_BRANCH_QUERY, (branch,))
+        return _rank_by_distance(cursor.fetchall(), origin, n)[0]
+    finally:
+        cursor.close()
+
+
+MOST_OVERDUE_QUERY = """
+SELECT c.id, c.display_name, cl.lat, cl.lon, MAX(a.dpd_days) AS dpd_days
+FROM client_location cl
+JOIN client c ON c.id = cl.client_id
+JOIN arrears a ON a.loan_id = c.id
+WHERE cl.branch_key = %s AND a.dpd_days > 0
+GROUP BY c.id, c.display_name, cl.lat, cl.lon
+ORDER BY dpd_days DESC, c.id
+LIMIT %s
+"""
+
+
+def most_overdue_clients(conn, branch, n):
+    """The n most overdue delinquent clients of the branch that have a location."""
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(MOST_OVERDUE_QUERY, (branch.strip(), n))
+    rows = cursor.fetchall()
+    cursor.close()
+    return rows
+
+
+def select_route_clients(conn, branch, n, selection="nearest"):
+    """
+    Route stops for a branch from the stored locations.
+    Returns (branch_lat_lon, clients) - clients carry id, display_name, lat, lon
+    (+ distance_km or dpd_days) - or None when the branch has no located
+    clients yet (tables missing or geocoding job not run).
+    """
+    if selection not in SELECTIONS:
+        raise ValueError(f"Unknown client selection '{selection}'. Use one of: {', '.join(SELECTIONS)}")
+    try:
+        origin = read_branch_location(conn, branch)
+        if origin is None:
+            return None
+        if selection == "nearest":
+            clients = nearest_clients(conn, branch, origin, n)
+        else:
+            clients = most_overdue_clients(conn, branch, n)
+    except errors.ProgrammingError:
+        # client_location / branch_location do not exist yet
+        return None
+    return (origin, clients) if clients else None
+
+
+if __name__ == "__main__":
+    from services.db import db_connection
+
+    with db_connection() as conn:
+        print(geocode_clients(conn, full="--full" in sys.argv))
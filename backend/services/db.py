@@ -0,0 +1,166 @@
+# db.py
+# -----------------------------------------------
+# 🔌 Purpose: Shared, pooled MySQL connection layer.
+# Every API route borrows a connection from one process-wide pool instead of
+# opening (and sometimes leaking) its own mysql.connector.connect(...).
+#
+# Usage inside an async route (runs on the DB executor, see services/executors.py):
+#     await run_db(with_connection, my_work, arg)     # my_work(conn, arg)
+# Usage anywhere else:
+#     with db_connection() as conn: ...
+# -----------------------------------------------
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from mysql.connector import pooling, errors
+
+# --------------------------
+# Config (override with environment variables)
+# --------------------------
+DB_CONFIG = {
+    "host": os.getenv("FINSIGHT_DB_HOST", "localhost"),
+    "user": os.getenv("FINSIGHT_DB_USER", "root"),
+    "password": os.getenv("FINSIGHT_DB_PASSWORD", "BtKQ@448"),
+    "database": os.getenv("FINSIGHT_DB_NAME", "FinSight"),
+}
+POOL_NAME = "finsight_pool"
+POOL_SIZE = int(os.getenv("FINSIGHT_DB_POOL_SIZE", "10"))        # hard cap on concurrent DB sessions
+POOL_TIMEOUT = float(os.getenv("FINSIGHT_DB_POOL_TIMEOUT", "5"))  # seconds to wait for a free connection
+
+if not 1 <= POOL_SIZE <= pooling.CNX_POOL_MAXSIZE:
+    raise ValueError(
+        f"FINSIGHT_DB_POOL_SIZE={POOL_SIZE}: mysql.connector pools hold 1 to {pooling.CNX_POOL_MAXSIZE} connections."
+    )
+
+
+class PoolExhaustedError(RuntimeError):
+    """Raised when no pooled connection frees up within POOL_TIMEOUT."""
+
+
+# --------------------------
+# Pool state
+# --------------------------
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(POOL_SIZE)
+
+_metrics = {
+    "pool_size": POOL_SIZE,
+    "in_use": 0,
+    "checkouts": 0,
+    "timeouts": 0,
+    "reconnects": 0,
+    "errors": 0,
+    "total_wait_ms": 0.0,
+    "max_wait_ms": 0.0,
+}
+_metrics_lock = threading.Lock()
+
+
+def _bump(key, amount=1):
+    with _metrics_lock:
+        _metrics[key] += amount
+
+
+def get_pool():
+    """Creates the pool lazily so importing this module never touches MySQL."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = pooling.MySQLConnectionPool(
+                    pool_name=POOL_NAME,
+                    pool_size=POOL_SIZE,
+                    pool_reset_session=True,
+                    **DB_CONFIG
+                )
+                print(f"[DB] connection pool '{POOL_NAME}' created with {POOL_SIZE} connections.")
+    return _pool
+
+
+def _checkout():
+    """
+    Borrows a healthy connection from the pool.
+    Blocks up to POOL_TIMEOUT seconds when every connection is busy.
+    """
+    started = time.perf_counter()
+    if not _slots.acquire(timeout=POOL_TIMEOUT):
+        _bump("timeouts")
+        raise PoolExhaustedError(f"No DB connection available after {POOL_TIMEOUT}s (pool size {POOL_SIZE}).")
+
+    try:
+        conn = get_pool().get_connection()
+        # Health check: revive connections MySQL dropped while idle (wait_timeout etc.)
+        if not conn.is_connected():
+            _bump("reconnects")
+            conn.reconnect(attempts=2, delay=0)
+    except Exception:
+        _slots.release()
+        _bump("errors")
+        raise
+
+    waited_ms = (time.perf_counter() - started) * 1000
+    with _metrics_lock:
+        _metrics["checkouts"] += 1
+        _metrics["in_use"] += 1
+        _metrics["total_wait_ms"] += waited_ms
+        _metrics["max_wait_ms"] = max(_metrics["max_wait_ms"], waited_ms)
+    return conn
+
+
+def _release(conn):
+    """Returns a connection to the pool (close() on a pooled connection does that)."""
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.close()
+    except errors.Error as e:
+        _bump("errors")
+        print(f"[DB] error while releasing connection: {e}")
+    finally:
+        _bump("in_use", -1)
+        _slots.release()
+
+
+@contextmanager
+def db_connection():
+    """Context manager that always hands the connection back to the pool."""
+    conn = _checkout()
+    try:
+        yield conn
+    finally:
+        _release(conn)
+
+
+def pool_metrics():
+    """Snapshot of pool usage for monitoring endpoints."""
+    with _metrics_lock:
+        snapshot = dict(_metrics)
+    checkouts = snapshot["checkouts"]
+    snapshot["avg_wait_ms"] = round(snapshot["total_wait_ms"] / checkouts, 3) if checkouts else 0.0
+    snapshot["total_wait_ms"] = round(snapshot["total_wait_ms"], 3)
+    snapshot["max_wait_ms"] = round(snapshot["max_wait_ms"], 3)
+    snapshot["available"] = POOL_SIZE - snapshot["in_use"]
+    return snapshot
+
+
+def check_health():
+    """Runs a trivial query through the pool; used by the /health/db route."""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+        return {"status": "ok", **pool_metrics()}
+    except Exception as e:
+        return {"status": "error", "error": str(e), **pool_metrics()}
+
+
+def with_connection(fn, *args, **kwargs):
+    """Calls fn(conn, *args) on a pooled connection; handy for executor-submitted DB work."""
+    with db_connection() as conn:
+        return fn(conn, *args, **kwargs)
@@ -0,0 +1,395 @@
+# delta_load.py
+# -----------------------------------------------
+# 🔁 Purpose: Delta (idempotent) loads of the FinSight extracts.
+# A refreshed export is mostly the same rows as yesterday's. Instead of
+# re-inserting the whole file, every row is hashed per key and compared
+# with the fingerprint stored for that key on the previous load:
+#
+#   - key not seen before        -> insert  ('I')
+#   - key seen, row hash differs -> update  ('U')
+#   - key seen, same hash        -> nothing
+#   - stored key missing from the file -> delete ('D')   (the file is a full snapshot)
+#
+# Inserts and updates are applied with batched INSERT ... ON DUPLICATE KEY
+# UPDATE; each batch writes its rows, their new fingerprints and their
+# load_change_log entries in one transaction. Running the same file twice is
+# therefore a no-op, and an interrupted delta load is simply run again.
+# Daily cost scales with the number of changed rows, not the table size
+# (the file is still read and hashed, but that is vectorized pandas/NumPy).
+#
+# Tables:
+#   load_fingerprint  - (table, 64-bit key hash) -> key text, 64-bit row hash
+#   load_change_log   - one row per applied insert / update / delete, plus one
+#                       'L' row (row_key '*') per table a plain insert load
+#                       touched; other processes (the API's query cache) poll
+#                       it by id (latest_change_id, changed_tables). In-process
+#                       listeners (add_change_listener) hear about every
+#                       finished load run directly.
+#
+# The target table needs a PRIMARY / UNIQUE key on the task's "key" columns
+# (migration 002_delta_keys in services/migrations.py).
+#
+# Limits (environment variables):
+#   FINSIGHT_DELTA_MAX_DELETE_FRACTION  refuse to delete more than this share of
+#                                       the stored rows in one run (default 0.5;
+#                                       protects against a truncated export)
+#
+# Run from backend/ with:  python -m services.load_orchestrator --delta
+# -----------------------------------------------
+
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from services.ingest_schema import Quarantine, clean_chunk, derived_cols
+from services.upload_csv import (
+    BATCH_ROWS, CHUNK_ROWS, DATA_DIR, MAX_ROW_ERRORS_LOGGED, alert_loan_columns, chunk_rows_as_tuples, read_chunks
+)
+
+MAX_DELETE_FRACTION = float(os.getenv("FINSIGHT_DELTA_MAX_DELETE_FRACTION", "0.5"))
+KEY_SEPARATOR = "\x1f"
+
+DELTA_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS load_fingerprint (
+        table_name VARCHAR(64) NOT NULL,
+        key_hash BIGINT UNSIGNED NOT NULL,
+        row_key VARCHAR(255) NOT NULL,
+        row_hash BIGINT UNSIGNED NOT NULL,
+        PRIMARY KEY (table_name, key_hash)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS load_change_log (
+        id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        run_id VARCHAR(32) NOT NULL,
+        table_name VARCHAR(64) NOT NULL,
+        row_key VARCHAR(255) NOT NULL,
+        op CHAR(1) NOT NULL,
+        changed_at DATETIME NOT NULL,
+        INDEX idx_load_change_log_table (table_name, id)
+    )
+    """,
+]
+
+FINGERPRINT_UPSERT = """
+INSERT INTO load_fingerprint (table_name, key_hash, row_key, row_hash) VALUES (%s, %s, %s, %s)
+ON DUPLICATE KEY UPDATE row_key = VALUES(row_key), row_hash = VALUES(row_hash)
+"""
+CHANGE_LOG_INSERT = """
+INSERT INTO load_change_log (run_id, table_name, row_key, op, changed_at) VALUES (%s, %s, %s, %s, NOW())
+"""
+
+
+def ensure_delta_tables(conn):
+    cursor = conn.cursor()
+    for ddl in DELTA_DDL:
+        cursor.execute(ddl)
+    cursor.close()
+    conn.commit()
+
+
+def _in_list(values):
+    return ", ".join(["%s"] * len(values))
+
+
+# --------------------------
+# 1) Hashing (vectorized, one chunk at a time)
+# --------------------------
+def frame_hashes(df, columns):
+    """
+    64-bit hash per row of df[columns]. Numeric columns are hashed as float64
+    and everything else as text, so the same value hashes the same whether a
+    chunk parsed the column as int, float (because of a blank) or object.
+    """
+    parts = {}
+    for col in columns:
+        series = df[col]
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            parts[col] = series.astype("float64")
+        else:
+            parts[col] = series.astype("string")
+    return pd.util.hash_pandas_object(pd.DataFrame(parts, index=df.index), index=False).to_numpy(np.uint64)
+
+
+def _key_text(values):
+    """Stored form of a key: values joined by KEY_SEPARATOR, integral floats without '.0'."""
+    return KEY_SEPARATOR.join(
+        str(int(v)) if isinstance(v, float) and v.is_integer() else str(v)
+        for v in values
+    )[:255]
+
+
+def _stored_fingerprints(cursor, table_name):
+    """(key hashes, row hashes) of every row loaded so far, sorted by key hash."""
+    cursor.execute("SELECT key_hash, row_hash FROM load_fingerprint WHERE table_name = %s", (table_name,))
+    rows = cursor.fetchall()
+    if not rows:
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.uint64)
+    pairs = np.array(rows, dtype=np.uint64)
+    order = np.argsort(pairs[:, 0], kind="stable")
+    return pairs[order, 0], pairs[order, 1]
+
+
+# --------------------------
+# 2) Applying changes (one transaction per batch)
+# --------------------------
+def _upsert_sql(table_name, columns, key):
+    placeholders = ",".join(["%s"] * len(columns))
+    updates = ", ".join(f"{c} = VALUES({c})" for c in columns if c not in key) or f"{key[0]} = {key[0]}"
+    return f"INSERT INTO {table_name} ({','.join(columns)}) VALUES ({placeholders}) ON DUPLICATE KEY UPDATE {updates}"
+
+
+def _apply_batch(conn, cursor, sql, table_name, run_id, rows, fingerprints, ops, errors_seen,
+                 quarantine, columns, row_numbers):
+    """
+    Upserts one batch together with its fingerprints and change log entries.
+    Falls back to row-by-row when MySQL rejects the batch; rejected rows are
+    quarantined and keep their old fingerprint, so the next delta load tries them again.
+    Returns the positions (within the batch) of the rows that were applied.
+    """
+    try:
+        cursor.executemany(sql, rows)
+        cursor.executemany(FINGERPRINT_UPSERT, fingerprints)
+        cursor.executemany(CHANGE_LOG_INSERT, [(run_id, table_name, f[2], op) for f, op in zip(fingerprints, ops)])
+        conn.commit()
+        return list(range(len(rows)))
+    except Exception:
+        conn.rollback()
+
+    applied, failed, reasons = [], [], []
+    for i, row in enumerate(rows):
+        try:
+            cursor.execute(sql, row)
+            applied.append(i)
+        except Exception as e:
+            errors_seen[0] += 1
+            failed.append(i)
+            reasons.append(f"mysql: {e}")
+            if errors_seen[0] <= MAX_ROW_ERRORS_LOGGED:
+                print(f"❌ Error upserting key {fingerprints[i][2]} in {table_name}: {e}")
+    if applied:
+        cursor.executemany(FINGERPRINT_UPSERT, [fingerprints[i] for i in applied])
+        cursor.executemany(CHANGE_LOG_INSERT, [(run_id, table_name, fingerprints[i][2], ops[i]) for i in applied])
+    conn.commit()
+    if failed:
+        quarantine.add_rows(columns, [rows[i] for i in failed], reasons, [row_numbers[i] for i in failed])
+    return applied
+
+
+def _key_condition(key, n):
+    if len(key) == 1:
+        return f"{key[0]} IN ({_in_list(range(n))})"
+    row = "(" + ", ".join(["%s"] * len(key)) + ")"
+    return f"({', '.join(key)}) IN ({', '.join([row] * n)})"
+
+
+def _apply_deletes(conn, cursor, table_name, key, run_id, key_hashes, batch_rows):
+    """Deletes the rows of the given stored key hashes. Returns (deleted, failed, loan ids)."""
+    loan_col = alert_loan_columns.get(table_name)
+    deleted, failed, loan_ids = 0, 0, set()
+    for start in range(0, len(key_hashes), batch_rows):
+        hashes = [int(h) for h in key_hashes[start:start + batch_rows]]
+        cursor.execute(
+            f"SELECT key_hash, row_key FROM load_fingerprint WHERE table_name = %s AND key_hash IN ({_in_list(hashes)})",
+            [table_name] + hashes
+        )
+        row_keys = [row[1] for row in cursor.fetchall()]
+        key_values = [tuple(k.split(KEY_SEPARATOR)) for k in row_keys]
+        params = [v for values in key_values for v in values]
+        try:
+            batch_loans = set()
+            if loan_col in key:
+                batch_loans = {values[key.index(loan_col)] for values in key_values}
+            elif loan_col:
+                cursor.execute(
+                    f"SELECT DISTINCT {loan_col} FROM {table_name} WHERE {_key_condition(key, len(key_values))}", params
+                )
+                batch_loans = {row[0] for row in cursor.fetchall()}
+            if key_values:
+                cursor.execute(f"DELETE FROM {table_name} WHERE {_key_condition(key, len(key_values))}", params)
+            cursor.execute(
+                f"DELETE FROM load_fingerprint WHERE table_name = %s AND key_hash IN ({_in_list(hashes)})",
+                [table_name] + hashes
+            )
+            cursor.executemany(CHANGE_LOG_INSERT, [(run_id, table_name, k, "D") for k in row_keys])
+            conn.commit()
+        except Exception as e:
+            # Typically a row another table still references; its fingerprint stays, so it is retried next run
+            conn.rollback()
+            failed += len(hashes)
+            print(f"❌ Could not delete {len(hashes)} row(s) from {table_name}: {e}")
+            continue
+        deleted += len(row_keys)
+        loan_ids |= {int(v) for v in batch_loans if v is not None and str(v).lstrip("-").isdigit()}
+    return deleted, failed, loan_ids
+
+
+# --------------------------
+# 3) One file
+# --------------------------
+def delta_load_table(conn, task, run_id, apply_deletes=True, chunk_rows=CHUNK_ROWS, batch_rows=BATCH_ROWS,
+                     references=None):
+    """
+    Applies the difference between one load_tasks file and what the previous
+    loads wrote. Returns a report like insert_csv_to_table's, with
+    inserted / updated / deleted / unchanged counts instead of inserted only.
+    Rows that fail cleaning / FK checks (references) are quarantined, and their
+    stored rows are left alone rather than deleted.
+    """
+    table_name, file_name, key = task["table"], task["file"], list(task["key"])
+    file_path = os.path.join(DATA_DIR, file_name)
+    started = time.perf_counter()
+    loan_col = alert_loan_columns.get(table_name)
+    quarantine = Quarantine(file_name)
+
+    ensure_delta_tables(conn)
+    cursor = conn.cursor()
+    stored_keys, stored_rows = _stored_fingerprints(cursor, table_name)
+    seen = np.zeros(len(stored_keys), dtype=bool)
+
+    counts = {"I": 0, "U": 0}
+    total, unchanged, coerced = 0, 0, 0
+    errors_seen = [0]
+    loan_ids = set()
+    columns, sql = None, None
+    for raw in read_chunks(file_path, task.get("is_excel", False), chunk_rows, table_name=table_name):
+        raw.columns = raw.columns.str.strip()
+        chunk, reasons, chunk_coerced = clean_chunk(raw, table_name, conn, references)
+        coerced += chunk_coerced
+        row_numbers = np.arange(total + 1, total + len(raw) + 1)
+        valid = pd.isna(reasons)
+        if not valid.all():
+            quarantine.add(raw[~valid], reasons[~valid], row_numbers[~valid])
+        if sql is None:
+            columns = list(task["columns"]) + [
+                c for c in derived_cols.get(table_name, {}) if c in chunk.columns and c not in task["columns"]
+            ]
+            sql = _upsert_sql(table_name, columns, key)
+        missing = [c for c in columns + key if c not in chunk.columns]
+        if missing:
+            cursor.close()
+            raise ValueError(f"{file_name} has no column(s) {', '.join(missing)} for table {table_name}")
+
+        key_hash = frame_hashes(chunk, key)
+        row_hash = frame_hashes(chunk, columns)
+        last = ~pd.Series(key_hash).duplicated(keep="last").to_numpy()   # a key repeated in the chunk: last row wins
+        if len(stored_keys):
+            pos = np.minimum(np.searchsorted(stored_keys, key_hash), len(stored_keys) - 1)
+            found = stored_keys[pos] == key_hash
+            seen[pos[found]] = True
+            changed = last & (~found | (stored_rows[pos] != row_hash))
+        else:
+            found = np.zeros(len(chunk), dtype=bool)
+            changed = last
+        unchanged += int((last & ~changed & valid).sum())
+        changed &= valid   # quarantined rows still count as present (not deleted), but are not applied
+
+        idx = np.flatnonzero(changed)
+        if len(idx):
+            sub = chunk.iloc[idx]
+            rows = chunk_rows_as_tuples(sub, columns)
+            key_texts = [_key_text(values) for values in chunk_rows_as_tuples(sub, key)]
+            fingerprints = list(zip(
+                [table_name] * len(idx), key_hash[idx].tolist(), key_texts, row_hash[idx].tolist()
+            ))
+            ops = np.where(found[idx], "U", "I").tolist()
+            loan_pos = columns.index(loan_col) if loan_col else None
+            for start in range(0, len(rows), batch_rows):
+                stop = start + batch_rows
+                applied = _apply_batch(
+                    conn, cursor, sql, table_name, run_id, rows[start:stop], fingerprints[start:stop],
+                    ops[start:stop], errors_seen, quarantine, columns, row_numbers[idx[start:stop]]
+                )
+                for i in applied:
+                    counts[ops[start + i]] += 1
+                    if loan_pos is not None and rows[start + i][loan_pos] is not None:
+                        loan_ids.add(int(rows[start + i][loan_pos]))
+        total += len(chunk)
+
+    # Stored keys the file no longer has
+    deleted = 0
+    gone = stored_keys[~seen]
+    if apply_deletes and len(gone):
+        if len(gone) > MAX_DELETE_FRACTION * len(stored_keys):
+            print(f"⚠️ {file_name} is missing {len(gone)} of {len(stored_keys)} known `{table_name}` rows; "
+                  f"not deleting (over FINSIGHT_DELTA_MAX_DELETE_FRACTION={MAX_DELETE_FRACTION}).")
+        else:
+            deleted, _, deleted_loans = _apply_deletes(
+                conn, cursor, table_name, key, run_id, gone, batch_rows
+            )
+            loan_ids |= deleted_loans
+    cursor.close()
+
+    elapsed = time.perf_counter() - started
+    rate = total / elapsed if elapsed > 0 else 0.0
+    print(f"✅ Δ `{table_name}` from {file_name}: {counts['I']} inserted, {counts['U']} updated, {deleted} deleted, "
+          f"{unchanged} unchanged in {elapsed:.1f}s ({rate:,.0f} rows/s), {quarantine.count} quarantined, "
+          f"{coerced} unreadable dates.")
+    return {
+        "file": file_name,
+        "table": table_name,
+        "mode": "delta",
+        "rows": total,
+        "inserted": counts["I"],
+        "updated": counts["U"],
+        "deleted": deleted,
+        "unchanged": unchanged,
+        "rejected": quarantine.count,
+        "dates_coerced": coerced,
+        "quarantine_file": quarantine.path if quarantine.count else None,
+        "deletes_pending": int(len(gone)) - deleted,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(rate, 1),
+        "loan_ids": loan_ids,
+    }
+
+
+# --------------------------
+# 4) Change notification (cache invalidation, monitoring)
+# --------------------------
+_change_listeners = []
+
+
+def add_change_listener(listener):
+    """listener(tables) is called after every load run that changed rows of those tables."""
+    if listener not in _change_listeners:
+        _change_listeners.append(listener)
+
+
+def notify_change(tables):
+    tables = set(tables)
+    if not tables:
+        return
+    for listener in list(_change_listeners):
+        try:
+            listener(tables)
+        except Exception as e:
+            print(f"Warning: change listener {getattr(listener, '__name__', listener)} failed: {e}")
+
+
+def log_bulk_load(cursor, run_id, table_name):
+    """One change log row standing for every row a plain (non-delta) load inserted into table_name."""
+    cursor.execute(CHANGE_LOG_INSERT, (run_id, table_name, "*", "L"))
+
+
+def latest_change_id(conn):
+    """Id of the newest load_change_log row (0 if none); cheap enough to poll."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM load_change_log")
+    row = cursor.fetchone()
+    cursor.close()
+    return int(row[0])
+
+
+def changed_tables(conn, since_id):
+    """{table: number of changes} logged after since_id."""
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT table_name, COUNT(*) FROM load_change_log WHERE id > %s GROUP BY table_name", (since_id,)
+    )
+    result = {row[0]: int(row[1]) for row in cursor.fetchall()}
+    cursor.close()
+    return result
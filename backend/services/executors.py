@@ -0,0 +1,102 @@
+# executors.py
+# -----------------------------------------------
+# ⚙️ Purpose: Bounded execution pools for blocking work behind async routes.
+# Routes are `async def`, so nothing blocking may run on the event loop.
+# Work is split into classes, each with its own pool and concurrency limit:
+#   - "db":        MySQL queries        -> thread pool sized to the DB pool
+#   - "forecast":  Prophet predict      -> process pool (CPU bound)
+#   - "optimizer": route optimization   -> process pool (CPU + Google calls)
+#   - "advisor":   batch rule scoring   -> process pool (CPU bound)
+# A slow forecast or route plan can therefore never take the threads that
+# the latency-sensitive dashboard endpoints (/kpis, /delinquency) need.
+#
+# Limits (environment variables):
+#   FINSIGHT_DB_CONCURRENCY         default = DB pool size
+#   FINSIGHT_FORECAST_CONCURRENCY   default 2
+#   FINSIGHT_OPTIMIZER_CONCURRENCY  default 2
+#   FINSIGHT_ADVISOR_CONCURRENCY    default 1
+#   FINSIGHT_CPU_WORKERS            process pool size (0 = use threads instead)
+# -----------------------------------------------
+
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from services.db import POOL_SIZE
+from services.model_registry import preload_hot_models
+
+LIMITS = {
+    "db": int(os.getenv("FINSIGHT_DB_CONCURRENCY", str(POOL_SIZE))),
+    "forecast": int(os.getenv("FINSIGHT_FORECAST_CONCURRENCY", "2")),
+    "optimizer": int(os.getenv("FINSIGHT_OPTIMIZER_CONCURRENCY", "2")),
+    "advisor": int(os.getenv("FINSIGHT_ADVISOR_CONCURRENCY", "1")),
+}
+CPU_WORKERS = int(os.getenv("FINSIGHT_CPU_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_db_executor = None
+_cpu_executor = None
+_executor_lock = threading.Lock()
+_semaphores = {}
+
+
+def _get_db_executor():
+    global _db_executor
+    if _db_executor is None:
+        with _executor_lock:
+            if _db_executor is None:
+                _db_executor = ThreadPoolExecutor(max_workers=LIMITS["db"], thread_name_prefix="finsight-db")
+    return _db_executor
+
+
+def _get_cpu_executor():
+    global _cpu_executor
+    if _cpu_executor is None:
+        with _executor_lock:
+            if _cpu_executor is None:
+                if CPU_WORKERS > 0:
+                    # Each worker preloads the forecast models of hot branches
+                    _cpu_executor = ProcessPoolExecutor(max_workers=CPU_WORKERS, initializer=preload_hot_models)
+                else:
+                    _cpu_executor = ThreadPoolExecutor(
+                        max_workers=LIMITS["forecast"] + LIMITS["optimizer"] + LIMITS["advisor"],
+                        thread_name_prefix="finsight-cpu"
+                    )
+    return _cpu_executor
+
+
+def _semaphore(kind):
+    # Created lazily so they bind to the running event loop
+    if kind not in _semaphores:
+        _semaphores[kind] = asyncio.Semaphore(LIMITS[kind])
+    return _semaphores[kind]
+
+
+async def _run(kind, executor, fn, *args, **kwargs):
+    async with _semaphore(kind):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+
+
+async def run_db(fn, *args, **kwargs):
+    """Runs a blocking DB function on the dedicated DB thread pool."""
+    return await _run("db", _get_db_executor(), fn, *args, **kwargs)
+
+
+async def run_cpu(kind, fn, *args, **kwargs):
+    """
+    Runs CPU-heavy work ("forecast", "optimizer" or "advisor") on the process pool.
+    fn and its arguments must be picklable (top-level functions, plain data).
+    """
+    return await _run(kind, _get_cpu_executor(), fn, *args, **kwargs)
+
+
+def shutdown_executors():
+    global _db_executor, _cpu_executor
+    for executor in (_db_executor, _cpu_executor):
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+    _db_executor = None
+    _cpu_executor = None
+    _semaphores.clear()
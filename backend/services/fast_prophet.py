@@ -0,0 +1,245 @@
+# fast_prophet.py
+# -----------------------------------------------
+# 🏎️ Purpose: Serve Prophet forecasts with plain NumPy.
+# A fitted Prophet model is fully described by a handful of parameter arrays
+# (trend rate/offset, changepoint deltas, seasonality betas, scaling
+# constants). export_fast_params() pulls them out once; FastProphetModel
+# evaluates trend + Fourier seasonality directly, so serving needs neither
+# Prophet nor Stan, and loading is a tiny .npz read instead of an unpickle.
+#
+# Supported: linear / logistic / flat growth, additive and multiplicative
+# seasonalities. Models with holidays, extra regressors or conditional
+# seasonalities are not exported (they keep the full Prophet artifact).
+# Intervals are simulated the way Prophet 1.5 does by default (vectorized
+# predict: smoothed per-step slope shifts over the horizon + observation
+# noise), so both backends give the same bands up to sampling noise.
+# -----------------------------------------------
+
+import numpy as np
+import pandas as pd
+
+FAST_EXT = ".npz"
+GROWTH_CODES = {"linear": 0, "logistic": 1, "flat": 2}
+INTERVAL_SEED = 0   # fixed so a cached forecast and a recomputed one agree
+
+
+def export_fast_params(model):
+    """Extracts the arrays FastProphetModel needs from a fitted Prophet model."""
+    if model.growth not in GROWTH_CODES:
+        raise ValueError(f"fast path does not support '{model.growth}' growth")
+    if model.holidays is not None or getattr(model, "country_holidays", None) or model.extra_regressors:
+        raise ValueError("fast path does not support holidays or extra regressors")
+    if any(props.get("condition_name") for props in model.seasonalities.values()):
+        raise ValueError("fast path does not support conditional seasonalities")
+
+    # Without logistic_floor Prophet ignores df['floor'] and uses a constant
+    if getattr(model, "logistic_floor", model.growth == "logistic"):
+        fixed_floor = np.nan
+    elif getattr(model, "scaling", "absmax") == "minmax":
+        fixed_floor = float(model.y_min)
+    else:
+        fixed_floor = 0.0
+
+    seasonalities = list(model.seasonalities.values())
+    history = model.history
+    return {
+        "growth": np.int64(GROWTH_CODES[model.growth]),
+        "k": np.nanmean(model.params["k"]),
+        "m": np.nanmean(model.params["m"]),
+        "deltas": np.nanmean(model.params["delta"], axis=0),
+        "beta": np.nanmean(model.params["beta"], axis=0),
+        "sigma_obs": np.nanmean(model.params["sigma_obs"]),
+        "changepoints_t": np.asarray(model.changepoints_t, dtype=float),
+        "y_scale": np.float64(model.y_scale),
+        "fixed_floor": np.float64(fixed_floor),
+        "start_ns": np.int64(pd.Timestamp(model.start).value),
+        "t_scale_s": np.float64(pd.Timedelta(model.t_scale).total_seconds()),
+        "interval_width": np.float64(model.interval_width),
+        "uncertainty_samples": np.int64(model.uncertainty_samples or 0),
+        "season_periods": np.array([s["period"] for s in seasonalities], dtype=float),
+        "season_orders": np.array([s["fourier_order"] for s in seasonalities], dtype=np.int64),
+        "season_multiplicative": np.array([s["mode"] == "multiplicative" for s in seasonalities], dtype=bool),
+        "history_ds_ns": pd.to_datetime(history["ds"]).to_numpy(dtype="datetime64[ns]").astype(np.int64),
+        "history_y": history["y"].to_numpy(dtype=float),
+    }
+
+
+def save_fast_params(model, path):
+    with open(path, "wb") as f:
+        np.savez(f, **export_fast_params(model))
+
+
+# --------------------------
+# Trend functions
+# Each takes changepoints / deltas of shape (n_samples, n_changepoints) and
+# returns (n_samples, len(t)), so the point forecast is just n_samples = 1.
+# --------------------------
+def _active(t, changepoints_t):
+    return (t[None, :, None] >= changepoints_t[:, None, :]).astype(float)
+
+
+def _piecewise_linear(t, deltas, k, m, changepoints_t):
+    active = _active(t, changepoints_t)
+    k_t = k + np.einsum("stc,sc->st", active, deltas)
+    m_t = m + np.einsum("stc,sc->st", active, -changepoints_t * deltas)
+    return k_t * t[None, :] + m_t
+
+
+def _piecewise_logistic(t, cap, deltas, k, m, changepoints_t):
+    # Offsets (gammas) keep the curve continuous at each changepoint; the
+    # recursion runs over changepoints but is vectorized across samples
+    k_cum = k + np.concatenate((np.zeros((len(deltas), 1)), np.cumsum(deltas, axis=1)), axis=1)
+    gammas = np.zeros_like(deltas)
+    gamma_sum = np.zeros(len(deltas))
+    for i in range(deltas.shape[1]):
+        gammas[:, i] = (changepoints_t[:, i] - m - gamma_sum) * (1 - k_cum[:, i] / k_cum[:, i + 1])
+        gamma_sum += gammas[:, i]
+    active = _active(t, changepoints_t)
+    k_t = k + np.einsum("stc,sc->st", active, deltas)
+    m_t = m + np.einsum("stc,sc->st", active, gammas)
+    return cap[None, :] / (1 + np.exp(-k_t * (t[None, :] - m_t)))
+
+
+class FastProphetModel:
+    """Duck-types the parts of Prophet the forecast routes use: history, make_future_dataframe, predict."""
+
+    def __init__(self, params):
+        self.p = params
+        self.growth = {code: name for name, code in GROWTH_CODES.items()}[int(params["growth"])]
+        self.history = pd.DataFrame({
+            "ds": pd.to_datetime(params["history_ds_ns"]),
+            "y": params["history_y"],
+        })
+        self.history_dates = pd.to_datetime(np.unique(params["history_ds_ns"]))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls({name: data[name] for name in data.files})
+
+    def make_future_dataframe(self, periods, freq="D", include_history=True):
+        last_date = self.history_dates.max()
+        dates = pd.date_range(start=last_date, periods=periods + 1, freq=freq)
+        dates = dates[dates > last_date][:periods]
+        if include_history:
+            dates = self.history_dates.append(dates)
+        return pd.DataFrame({"ds": dates})
+
+    def _seasonal_features(self, ds_ns):
+        """Fourier features in Prophet's column order (seasonality, then sin/cos per order)."""
+        days = ds_ns / 1e9 / 86400.0
+        columns, multiplicative = [], []
+        for period, order, is_mult in zip(self.p["season_periods"], self.p["season_orders"], self.p["season_multiplicative"]):
+            angles = 2.0 * np.pi * np.arange(1, order + 1)[None, :] * days[:, None] / period
+            block = np.empty((len(days), 2 * order))
+            block[:, 0::2] = np.sin(angles)
+            block[:, 1::2] = np.cos(angles)
+            columns.append(block)
+            multiplicative.extend([bool(is_mult)] * (2 * order))
+        if not columns:
+            return np.zeros((len(days), 0)), np.zeros(0, dtype=bool)
+        return np.hstack(columns), np.array(multiplicative)
+
+    def _trend(self, t, cap_scaled, changepoints_t, deltas):
+        """Scaled trend for a batch of changepoint sets, shape (n_samples, len(t))."""
+        k, m = float(self.p["k"]), float(self.p["m"])
+        if self.growth == "linear":
+            return _piecewise_linear(t, deltas, k, m, changepoints_t)
+        if self.growth == "logistic":
+            return _piecewise_logistic(t, cap_scaled, deltas, k, m, changepoints_t)
+        return np.full((len(deltas), len(t)), m)
+
+    def _history_t(self):
+        return (self.p["history_ds_ns"] - int(self.p["start_ns"])) / 1e9 / float(self.p["t_scale_s"])
+
+    def _trend_uncertainty(self, t, cap_scaled, n_samples, rng):
+        """
+        Prophet's (1.5, vectorized) trend uncertainty: at every future step the
+        slope changes with probability n_changepoints * step, by a Laplace draw
+        scaled to the mean historical |delta|, and each shift is averaged with
+        the previous step's. Returns scaled offsets from the point trend,
+        shape (n_samples, len(t)); zero over the history.
+        """
+        offsets = np.zeros((n_samples, len(t)))
+        future = t > 1
+        n_future = int(future.sum())
+        if not n_future or self.growth == "flat":
+            return offsets
+        step = np.diff(t[future]).mean() if n_future > 1 else np.diff(self._history_t()).mean()
+        deltas = self.p["deltas"]
+        likelihood = len(self.p["changepoints_t"]) * step
+        mean_delta = np.mean(np.abs(deltas)) + 1e-8
+
+        changes = rng.random((n_samples, n_future)) < likelihood
+        shifts = rng.laplace(0, mean_delta, changes.shape) * changes
+        shifts = (np.hstack((np.zeros((n_samples, 1)), shifts))[:, :-1] + shifts) / 2
+        if self.growth == "linear":
+            offsets[:, future] = shifts.cumsum(axis=1).cumsum(axis=1) * step
+        else:
+            offsets[:, future] = self._logistic_offsets(shifts, cap_scaled[future], t[future], step)
+        return offsets
+
+    def _logistic_offsets(self, shifts, cap, t_future, step):
+        """
+        Logistic trend under the sampled slope shifts, evaluated from the start
+        of the history on a grid of `step` (historical deltas placed at their
+        changepoints), centred on its mean across samples - as Prophet does.
+        """
+        k, m = float(self.p["k"]), float(self.p["m"])
+        past_t = np.arange(0, 1 + step, step)
+        past = np.zeros(len(past_t))
+        past[[np.flatnonzero(past_t > cp)[0] for cp in self.p["changepoints_t"]]] = self.p["deltas"]
+        shifts = np.hstack((np.tile(past, (len(shifts), 1)), shifts))
+        full_t = np.concatenate((past_t, t_future))
+
+        k_cum = np.hstack((np.full((len(shifts), 1), k), np.where(shifts, np.cumsum(shifts, axis=1) + k, 0)))
+        # forward-fill the zeros: rate stays the same where nothing changed
+        idx = np.where(k_cum != 0, np.arange(k_cum.shape[1]), 0)
+        np.maximum.accumulate(idx, axis=1, out=idx)
+        k_cum = k_cum[np.arange(len(k_cum))[:, None], idx]
+        gammas = np.zeros_like(shifts)
+        gamma_sum = np.zeros(len(shifts))
+        for i in range(shifts.shape[1]):
+            gammas[:, i] = (full_t[i] - m - gamma_sum) * (1 - k_cum[:, i] / k_cum[:, i + 1])
+            gamma_sum += gammas[:, i]
+
+        n_future = len(t_future)
+        k_t = (shifts.cumsum(axis=1) + k)[:, -n_future:]
+        m_t = (gammas.cumsum(axis=1) + m)[:, -n_future:]
+        trends = cap / (1 + np.exp(-k_t * (t_future - m_t)))
+        return trends - trends.mean(axis=0)
+
+    def predict(self, df):
+        p = self.p
+        ds = pd.to_datetime(df["ds"])
+        ds_ns = ds.to_numpy(dtype="datetime64[ns]").astype(np.int64)
+        t = (ds_ns - int(p["start_ns"])) / 1e9 / float(p["t_scale_s"])
+
+        y_scale = float(p["y_scale"])
+        if np.isnan(p["fixed_floor"]):
+            floor = df["floor"].to_numpy(dtype=float)
+        else:
+            floor = np.full(len(df), float(p["fixed_floor"]))
+        cap_scaled = None
+        if self.growth == "logistic":
+            cap_scaled = (df["cap"].to_numpy(dtype=float) - floor) / y_scale
+
+        trend = self._trend(t, cap_scaled, p["changepoints_t"][None, :], p["deltas"][None, :])[0] * y_scale + floor
+
+        X, mult = self._seasonal_features(ds_ns.astype(float))
+        beta = p["beta"][:X.shape[1]]
+        additive = X[:, ~mult] @ beta[~mult] * y_scale
+        multiplicative = X[:, mult] @ beta[mult]
+        yhat = trend * (1 + multiplicative) + additive
+
+        result = pd.DataFrame({"ds": ds.to_numpy(), "trend": trend, "yhat": yhat})
+        n_samples = int(p["uncertainty_samples"])
+        if n_samples:
+            rng = np.random.default_rng(INTERVAL_SEED)
+            trends = trend + self._trend_uncertainty(t, cap_scaled, n_samples, rng) * y_scale
+            noise = rng.normal(0, float(p["sigma_obs"]), trends.shape) * y_scale
+            sims = trends * (1 + multiplicative) + additive + noise
+            width = float(p["interval_width"])
+            result["yhat_lower"] = np.quantile(sims, (1 - width) / 2, axis=0)
+            result["yhat_upper"] = np.quantile(sims, (1 + width) / 2, axis=0)
+        return result
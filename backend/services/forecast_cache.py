@@ -0,0 +1,63 @@
+# forecast_cache.py
+# -----------------------------------------------
+# ⚡ Purpose: Precomputed forecast results for the /forecast/* routes.
+# A Prophet forecast only depends on the model artifact and its metadata
+# (horizon / floor / cap live in the .json sidecar), so results are cached
+# in the API process keyed by (metric, model scope, artifact fingerprint,
+# layout). Branches without their own model share the global entry.
+# Repeat requests become a dict lookup instead of a multi-second predict().
+#
+# - Warmed at startup for the global models and FINSIGHT_HOT_BRANCHES
+# - Replacing a model artifact / .json changes its fingerprint: the next request
+#   misses, recomputes, and purges the entries built from the old artifact
+# - Entries expire after FINSIGHT_FORECAST_CACHE_TTL seconds and the cache
+#   holds at most FINSIGHT_FORECAST_CACHE_SIZE results (LRU)
+# -----------------------------------------------
+
+import os
+
+from services.cache import TTLCache
+from services.executors import run_cpu
+from services.forecast_service import build_forecast
+from services.model_registry import HOT_BRANCHES, METRICS, ModelUnavailableError, resolve_model
+
+FORECAST_CACHE_TTL = int(os.getenv("FINSIGHT_FORECAST_CACHE_TTL", str(6 * 3600)))
+FORECAST_CACHE_SIZE = int(os.getenv("FINSIGHT_FORECAST_CACHE_SIZE", "128"))
+
+_cache = TTLCache(max_entries=FORECAST_CACHE_SIZE, ttl_seconds=FORECAST_CACHE_TTL, name="forecast")
+
+
+def forecast_cache_key(metric, branch, layout="rows"):
+    ref = resolve_model(metric, branch)
+    return (metric, ref.scope, ref.fingerprint, layout)
+
+
+async def get_forecast(metric, branch, layout="rows"):
+    """Cached forecast response; computes on the forecast process pool on a miss."""
+    key = forecast_cache_key(metric, branch, layout)
+    payload = _cache.get(key)
+    if payload is None:
+        result = await run_cpu("forecast", build_forecast, metric, branch, layout)
+        payload = {k: v for k, v in result.items() if k != "branch"}
+        # Anything cached for this model under an older fingerprint is stale now
+        _cache.invalidate(lambda k: k[:2] == key[:2] and k[2] != key[2])
+        _cache.set(key, payload)
+    # Cached lists are shared between responses and must not be mutated
+    return {"branch": branch, **payload}
+
+
+async def warm_forecast_cache():
+    """Computes every forecast once so the first dashboard visit is already a cache hit."""
+    for branch in [None] + HOT_BRANCHES:
+        for metric in METRICS:
+            try:
+                await get_forecast(metric, branch)
+            except ModelUnavailableError as e:
+                print(f"[ForecastCache] skipping {metric}/{branch} warm-up: {e}")
+            except Exception as e:
+                print(f"[ForecastCache] {metric}/{branch} warm-up failed: {e}")
+    print(f"[ForecastCache] warmed {len(_cache)} forecast(s).")
+
+
+def forecast_cache_stats():
+    return _cache.stats()
@@ -0,0 +1,79 @@
+# forecast_serialization.py
+# -----------------------------------------------
+# 🧾 Purpose: Turn Prophet history / forecast frames into route payloads
+# with vectorized pandas operations instead of iterrows() + strftime per row.
+#
+# Two layouts:
+#   "rows"      - list of {month, actual, predicted, ...} dicts (what the
+#                 React charts consume today)
+#   "columnar"  - one array per field ({"ds": [...], "yhat": [...], ...});
+#                 smaller payload and no per-row dict building at all
+# -----------------------------------------------
+
+import numpy as np
+import pandas as pd
+
+LAYOUTS = ("rows", "columnar")
+
+
+def _month_labels(dates):
+    """'%b %Y' label per date, formatting each distinct month only once."""
+    codes, months = pd.factorize(dates.dt.to_period("M"), sort=False)
+    labels = np.asarray(months.strftime("%b %Y"), dtype=object)
+    return labels[codes].tolist()
+
+
+def _values(series):
+    """Plain Python floats with NaN mapped to None (valid JSON)."""
+    values = series.to_numpy(dtype=float)
+    out = values.astype(object)
+    out[np.isnan(values)] = None
+    return out.tolist()
+
+
+def split_forecast(history, forecast):
+    """Historical frame (ds, y) and the future-only slice of the forecast frame."""
+    hist_dates = pd.to_datetime(history["ds"])
+    fcst = forecast.loc[forecast["ds"] > hist_dates.max(), ["ds", "yhat", "yhat_lower", "yhat_upper"]]
+    return hist_dates, history["y"], fcst
+
+
+def serialize_forecast(history, forecast, layout="rows"):
+    """Returns {"historical": ..., "forecast": ...} in the requested layout."""
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown forecast layout '{layout}' (expected one of {LAYOUTS}).")
+
+    hist_dates, actual, fcst = split_forecast(history, forecast)
+    fcst_dates = pd.to_datetime(fcst["ds"])
+
+    if layout == "columnar":
+        return {
+            "layout": "columnar",
+            "historical": {
+                "ds": hist_dates.dt.strftime("%Y-%m-%d").tolist(),
+                "month": _month_labels(hist_dates),
+                "actual": _values(actual),
+            },
+            "forecast": {
+                "ds": fcst_dates.dt.strftime("%Y-%m-%d").tolist(),
+                "month": _month_labels(fcst_dates),
+                "yhat": _values(fcst["yhat"]),
+                "yhat_lower": _values(fcst["yhat_lower"]),
+                "yhat_upper": _values(fcst["yhat_upper"]),
+            },
+        }
+
+    historical = [
+        {"month": month, "actual": value, "predicted": None}
+        for month, value in zip(_month_labels(hist_dates), _values(actual))
+    ]
+    forecast_rows = [
+        {"month": month, "actual": None, "predicted": yhat, "confidence_low": low, "confidence_high": high}
+        for month, yhat, low, high in zip(
+            _month_labels(fcst_dates),
+            _values(fcst["yhat"]),
+            _values(fcst["yhat_lower"]),
+            _values(fcst["yhat_upper"]),
+        )
+    ]
+    return {"historical": historical, "forecast": forecast_rows}
@@ -0,0 +1,35 @@
+# forecast_service.py
+# -----------------------------------------------
+# 📈 Purpose: Prophet forecast generation for the /forecast/* routes.
+# Runs inside the forecast process pool (see services/executors.py), so
+# models come from this process's model registry (loaded lazily, LRU
+# bounded, see services/model_registry.py) and every function here takes
+# and returns plain picklable data.
+# -----------------------------------------------
+
+from services.forecast_serialization import serialize_forecast
+from services.model_registry import GLOBAL_SCOPE, ModelUnavailableError, registry
+
+FORECAST_LABELS = {
+    "disbursement": "disbursement forecast",
+    "collections": "collections forecast",
+    "growth": "customer growth forecast",
+}
+
+
+def build_forecast(metric, branch, layout="rows"):
+    """Predicts the model's horizon and returns the JSON-ready route response."""
+    model, meta, ref = registry.get(metric, branch)
+
+    print(f"Generating {FORECAST_LABELS[metric]} for: {branch} ({ref.scope} model)")
+    # Horizon, floor and cap come from the model's training metadata
+    future = model.make_future_dataframe(periods=meta["periods"], freq=meta["freq"])
+    future['floor'] = meta["floor"]
+    future['cap'] = meta["cap"]
+
+    forecast = model.predict(future)
+    return {
+        "branch": branch,
+        "model_scope": "global" if ref.scope == GLOBAL_SCOPE else "branch",
+        **serialize_forecast(model.history, forecast, layout)
+    }
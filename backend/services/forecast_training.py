@@ -0,0 +1,238 @@
+# forecast_training.py
+# -----------------------------------------------
+# 🏋️ Purpose: Batch training pipeline for the per-branch forecast models.
+# 1. Pulls every branch's series with ONE grouped query per metric:
+#      disbursement - weekly principal disbursed
+#      collections  - weekly principal collected
+#      growth       - daily cumulative client count
+# 2. Fits one logistic-growth Prophet model per (metric, branch) in a
+#    process pool, one fit per CPU core at a time
+# 3. Derives floor/cap from the data and writes versioned artifacts into
+#    the model registry layout (models/<metric>/<branch_slug>.prophet.json +
+#    .npz fast-path parameters + .json sidecar), archiving the previous version
+#
+# Run nightly from backend/ with:
+#   python -m services.forecast_training [--metrics collections growth] [--branches A B] [--workers 8]
+# -----------------------------------------------
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import pandas as pd
+
+from services.db import db_connection
+from services.model_artifacts import ARTIFACT_EXTS, save_artifacts
+from services.model_registry import MODELS_DIR, branch_slug
+
+KEEP_VERSIONS = 3   # archived versions kept per branch model
+
+# How each metric is aggregated, resampled and bounded
+TRAINING_SPECS = {
+    "disbursement": {
+        "query": """
+            SELECT o.branch_key AS branch, l.approvedon_date AS ds, SUM(l.principal_disbursed_derived) AS y
+            FROM loan l
+            JOIN client c ON l.client_id = c.id
+            JOIN office o ON c.office_id = o.id
+            WHERE l.approvedon_date IS NOT NULL {branch_filter}
+            GROUP BY o.branch_key, l.approvedon_date
+        """,
+        "freq": "W", "periods": 12, "cumulative": False,
+        "floor": "zero", "cap_factor": 1.2, "min_points": 12,
+    },
+    "collections": {
+        "query": """
+            SELECT o.branch_key AS branch, COALESCE(lr.emi_cleared_on, lr.duedate) AS ds,
+                   SUM(lr.principal_completed_derived) AS y
+            FROM loan_repayment lr
+            JOIN loan l ON lr.loan_id = l.id
+            JOIN client c ON l.client_id = c.id
+            JOIN office o ON c.office_id = o.id
+            WHERE COALESCE(lr.emi_cleared_on, lr.duedate) IS NOT NULL {branch_filter}
+            GROUP BY o.branch_key, COALESCE(lr.emi_cleared_on, lr.duedate)
+        """,
+        "freq": "W", "periods": 12, "cumulative": False,
+        "floor": "zero", "cap_factor": 1.2, "min_points": 12,
+    },
+    "growth": {
+        "query": """
+            SELECT o.branch_key AS branch, c.submittedon_date AS ds, COUNT(*) AS y
+            FROM client c
+            JOIN office o ON c.office_id = o.id
+            WHERE c.submittedon_date IS NOT NULL {branch_filter}
+            GROUP BY o.branch_key, c.submittedon_date
+        """,
+        "freq": "D", "periods": 90, "cumulative": True,
+        "floor": "min", "cap_factor": 1.5, "min_points": 30,
+    },
+}
+
+
+# --------------------------
+# 1) Bulk extraction
+# --------------------------
+def fetch_branch_series(conn, metric, branches=None):
+    """One grouped query for all branches -> {branch: DataFrame(ds, y)} at the metric's frequency."""
+    spec = TRAINING_SPECS[metric]
+    params = []
+    branch_filter = ""
+    if branches:
+        branch_filter = f"AND o.branch_key IN ({', '.join(['%s'] * len(branches))})"
+        params = list(branches)
+
+    cursor = conn.cursor()
+    cursor.execute(spec["query"].format(branch_filter=branch_filter), params)
+    raw = pd.DataFrame(cursor.fetchall(), columns=["branch", "ds", "y"])
+    cursor.close()
+    if raw.empty:
+        return {}
+
+    raw["ds"] = pd.to_datetime(raw["ds"])
+    raw["y"] = raw["y"].astype(float)
+
+    series = {}
+    for branch, group in raw.groupby("branch", sort=False):
+        s = group.set_index("ds")["y"].resample(spec["freq"]).sum()
+        if spec["cumulative"]:
+            s = s.cumsum()
+        series[branch] = s.reset_index()
+    return series
+
+
+def training_bounds(metric, y):
+    """floor / cap the logistic model is trained with (recorded in the sidecar)."""
+    spec = TRAINING_SPECS[metric]
+    floor = float(y.min()) if spec["floor"] == "min" else 0.0
+    cap = float(y.max()) * spec["cap_factor"]
+    if cap <= floor:
+        cap = floor + 1.0
+    return floor, cap
+
+
+# --------------------------
+# 2) Fitting (runs in worker processes)
+# --------------------------
+def _write_artifact(metric, branch, model, meta):
+    """Atomically installs the new model + sidecar, archiving the previous version."""
+    metric_dir = os.path.join(MODELS_DIR, metric)
+    archive_dir = os.path.join(metric_dir, "archive")
+    os.makedirs(archive_dir, exist_ok=True)
+
+    slug = branch_slug(branch)
+    base = os.path.join(metric_dir, slug)
+    meta_path = base + ".json"
+
+    previous_version = 0
+    if os.path.exists(meta_path):
+        with open(meta_path, "r") as f:
+            previous_version = json.load(f).get("version", 0)
+        for ext in ARTIFACT_EXTS + (".json",):
+            if os.path.exists(base + ext):
+                shutil.copy2(base + ext, os.path.join(archive_dir, f"{slug}.v{previous_version}{ext}"))
+        stale = previous_version - KEEP_VERSIONS
+        for ext in ARTIFACT_EXTS + (".json",):
+            stale_path = os.path.join(archive_dir, f"{slug}.v{stale}{ext}")
+            if stale > 0 and os.path.exists(stale_path):
+                os.remove(stale_path)
+
+    meta["version"] = previous_version + 1
+    save_artifacts(model, base)
+    # Superseded by the compact formats (it was archived above)
+    if os.path.exists(base + ".pkl"):
+        os.remove(base + ".pkl")
+    with open(meta_path + ".tmp", "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(meta_path + ".tmp", meta_path)
+    return meta
+
+
+def fit_branch_model(metric, branch, ds, y):
+    """Fits and saves one model. ds/y are plain lists so the task pickles cheaply."""
+    # Imported here so the parent process never needs Prophet / Stan loaded
+    from prophet import Prophet
+    logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+
+    spec = TRAINING_SPECS[metric]
+    started = time.perf_counter()
+    df = pd.DataFrame({"ds": pd.to_datetime(ds), "y": y})
+    floor, cap = training_bounds(metric, df["y"])
+    df["floor"] = floor
+    df["cap"] = cap
+
+    model = Prophet(growth="logistic")
+    model.fit(df)
+
+    meta = _write_artifact(metric, branch, model, {
+        "metric": metric,
+        "branch": branch,
+        "growth": "logistic",
+        "freq": spec["freq"],
+        "periods": spec["periods"],
+        "floor": floor,
+        "cap": cap,
+        "observations": len(df),
+        "history_start": df["ds"].min().strftime("%Y-%m-%d"),
+        "history_end": df["ds"].max().strftime("%Y-%m-%d"),
+        "trained_at": datetime.now().isoformat(timespec="seconds"),
+    })
+    meta["fit_seconds"] = round(time.perf_counter() - started, 2)
+    return meta
+
+
+# --------------------------
+# 3) Orchestration
+# --------------------------
+def train_all(metrics=None, branches=None, workers=None):
+    """Trains every (metric, branch) pair in parallel; returns a summary report."""
+    metrics = metrics or list(TRAINING_SPECS)
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+
+    jobs = []
+    with db_connection() as conn:
+        for metric in metrics:
+            series = fetch_branch_series(conn, metric, branches)
+            min_points = TRAINING_SPECS[metric]["min_points"]
+            for branch, frame in series.items():
+                if not branch or len(frame) < min_points:
+                    print(f"[Training] skipping {metric}/{branch}: {len(frame)} points (< {min_points})")
+                    continue
+                jobs.append((metric, branch, frame["ds"].dt.strftime("%Y-%m-%d").tolist(), frame["y"].tolist()))
+    print(f"[Training] fitting {len(jobs)} models on {workers} workers...")
+
+    trained, failed = [], []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(fit_branch_model, *job): job[:2] for job in jobs}
+        for future in as_completed(futures):
+            metric, branch = futures[future]
+            try:
+                meta = future.result()
+                trained.append(meta)
+                print(f"[Training] {metric}/{branch} v{meta['version']} in {meta['fit_seconds']}s")
+            except Exception as e:
+                failed.append({"metric": metric, "branch": branch, "error": str(e)})
+                print(f"❌ [Training] {metric}/{branch} failed: {e}")
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ [Training] {len(trained)} models trained, {len(failed)} failed in {elapsed:.1f}s")
+    return {
+        "trained": len(trained),
+        "failed": failed,
+        "seconds": round(elapsed, 2),
+        "models_per_second": round(len(trained) / elapsed, 3) if elapsed else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train per-branch Prophet forecast models.")
+    parser.add_argument("--metrics", nargs="*", choices=list(TRAINING_SPECS), default=None)
+    parser.add_argument("--branches", nargs="*", default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    train_all(metrics=args.metrics, branches=args.branches, workers=args.workers)
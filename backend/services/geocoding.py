@@ -0,0 +1,80 @@
+# geocoding.py
+# -----------------------------------------------
+# 📍 Purpose: Geocoders used by the offline client-location job.
+# The loan book carries no street addresses yet, so the only built-in
+# geocoder is a deterministic stand-in: every branch and client gets a
+# stable pseudo-random point derived from a hash of its key (clients within
+# CLIENT_RADIUS_KM of their branch). Routes built on these points are
+# repeatable, cacheable and comparable between runs, unlike per-request
+# mock coordinates.
+#
+# A real geocoder only needs the same two batch methods; pick one with
+# FINSIGHT_GEOCODER (default "standin").
+# -----------------------------------------------
+
+import hashlib
+import math
+import os
+
+import numpy as np
+
+NETWORK_CENTER = (23.1815, 85.3055)   # where the route planner used to put every branch
+BRANCH_SPREAD_KM = 150.0              # stand-in branches lie within this radius of the center
+CLIENT_RADIUS_KM = 5.0                # stand-in clients lie within this radius of their branch
+
+
+def _unit_pairs(keys):
+    """Two stable uniforms in [0, 1) per key, from an md5 of the key."""
+    out = np.empty((len(keys), 2))
+    for i, key in enumerate(keys):
+        digest = hashlib.md5(str(key).encode()).digest()
+        out[i, 0] = int.from_bytes(digest[:8], "big") / 2 ** 64
+        out[i, 1] = int.from_bytes(digest[8:], "big") / 2 ** 64
+    return out
+
+
+def _scatter(center_lats, center_lons, radius_km, units):
+    """Uniform points in a disc of radius_km around each center (vectorized)."""
+    r = radius_km * np.sqrt(units[:, 0])
+    theta = units[:, 1] * 2 * math.pi
+    lats = center_lats + (r * np.sin(theta)) / 110.574
+    lons = center_lons + (r * np.cos(theta)) / (111.320 * np.cos(np.radians(center_lats)))
+    return lats, lons
+
+
+class StandInGeocoder:
+    """Deterministic local geocoder: same key in, same point out, no network."""
+
+    name = "standin"
+
+    def geocode_branches(self, branches):
+        """{branch_key: (lat, lon)} for the given branch keys."""
+        if not branches:
+            return {}
+        units = _unit_pairs([f"branch:{b}" for b in branches])
+        lats, lons = _scatter(
+            np.full(len(branches), NETWORK_CENTER[0]), np.full(len(branches), NETWORK_CENTER[1]),
+            BRANCH_SPREAD_KM, units
+        )
+        return {b: (float(lat), float(lon)) for b, lat, lon in zip(branches, lats, lons)}
+
+    def geocode_clients(self, client_ids, anchors):
+        """
+        Points for a batch of clients. anchors is an (n, 2) array with each
+        client's branch location. Returns (lats, lons) arrays.
+        """
+        anchors = np.asarray(anchors, dtype=np.float64).reshape(-1, 2)
+        units = _unit_pairs([f"client:{c}" for c in client_ids])
+        return _scatter(anchors[:, 0], anchors[:, 1], CLIENT_RADIUS_KM, units)
+
+
+GEOCODERS = {
+    "standin": StandInGeocoder,
+}
+
+
+def get_geocoder(name=None):
+    name = (name or os.getenv("FINSIGHT_GEOCODER", "standin")).strip().lower()
+    if name not in GEOCODERS:
+        raise ValueError(f"Unknown geocoder '{name}'. Available: {', '.join(GEOCODERS)}")
+    return GEOCODERS[name]()
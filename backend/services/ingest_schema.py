@@ -0,0 +1,291 @@
+# ingest_schema.py
+# -----------------------------------------------
+# 🧾 Purpose: Schema-driven cleaning and validation for the loaders
+# (services/upload_csv.py, services/delta_load.py).
+#
+# - Text and date columns are read as text, numeric ones by the C CSV parser
+#   (null tokens become NaN at read time); every column is then converted
+#   once per chunk to the dtype TABLE_SCHEMAS declares (int / float / date /
+#   str). Only a numeric column that came back as text because of a bad
+#   value goes through the slower per-value pd.to_numeric
+# - Dates are parsed with explicit formats (DATE_FORMATS, tried in order on
+#   whatever the previous format did not match); only values none of them
+#   fit go through pandas' slow per-value day-first parser
+# - Foreign keys (FOREIGN_KEYS) are checked with vectorized membership tests
+#   against sorted int64 arrays of the referenced ids (ReferenceIds), loaded
+#   once per run instead of one Python set per table
+# - Rows that fail (bad int / float, missing key, unknown parent id) are not
+#   sent to MySQL: they are appended in bulk, with the reason, to
+#   data/quarantine/<file>.rejected.csv (Quarantine)
+#
+# A date no format can read is stored as NULL (as the loader always did) and
+# counted in the load report instead of rejecting its row.
+#
+# Limits (environment variables):
+#   FINSIGHT_LOAD_DATE_FORMATS   '|'-separated strptime formats tried in order
+#   FINSIGHT_QUARANTINE_DIR      where rejected rows go (default data/quarantine)
+# -----------------------------------------------
+
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # backend/
+QUARANTINE_DIR = os.getenv("FINSIGHT_QUARANTINE_DIR", os.path.join(BASE_DIR, "data", "quarantine"))
+
+DATE_FORMATS = os.getenv(
+    "FINSIGHT_LOAD_DATE_FORMATS",
+    "%d-%m-%Y|%d/%m/%Y|%Y-%m-%d|%Y-%m-%d %H:%M:%S|%d-%m-%Y %H:%M:%S|%d/%m/%Y %H:%M"
+).split("|")
+
+# Read as missing values (in addition to pandas' defaults: '', 'NA', 'NULL', 'nan', ...)
+NULL_TOKENS = ["nan", "NaN", "NAN", "None", "none", "null"]
+
+# --------------------------
+# 1) Schema
+# --------------------------
+# table -> column -> "int" | "float" | "date" | "date:<format>" | "str"
+# Columns a file has but the schema does not list are passed through as text.
+TABLE_SCHEMAS = {
+    "office": {
+        "id": "int", "hierarchy": "str", "name": "str", "opening_date": "date",
+        "bm_staff_id": "int", "activation_date": "date", "activatedby_userid": "int", "version": "int",
+    },
+    "org": {
+        "zone": "str", "branch": "str", "branch_name": "str", "zonal_head": "str", "cm_id": "str",
+        "circle_manager": "str", "actual_state": "str", "zh_id": "str",
+    },
+    "group_": {
+        "id": "int", "status_enum": "int", "activation_date": "date", "office_id": "int",
+        "staff_id": "int", "display_name": "str", "hierarchy": "str",
+        "closedon_date": "date", "account_no": "str", "version": "int",
+    },
+    "client": {
+        "id": "int", "account_no": "str", "office_joining_date": "date", "office_id": "int", "staff_id": "int",
+        "display_name": "str", "date_of_birth": "date", "submittedon_date": "date", "activatedon_userid": "int",
+        "closedon_userid": "int", "client_classification_cv_id": "int", "reactivated_on_date": "date",
+        "reactivated_on_userid": "int",
+    },
+    "loan": {
+        "id": "int", "account_no": "str", "client_id": "int", "group_id": "int", "product_id": "int",
+        "loan_officer_id": "int", "principal_amount_proposed": "float", "approved_principal": "float",
+        "annual_nominal_interest_rate": "float", "number_of_repayments": "int", "submittedon_date": "date",
+        "approvedon_date": "date", "principal_disbursed_derived": "float", "principal_outstanding_derived": "float",
+        "interest_charged_derived": "float", "interest_outstanding_derived": "float",
+        "fee_charges_charged_derived": "float", "total_expected_repayment_derived": "float",
+        "total_outstanding_derived": "float", "fixed_emi_amount": "float", "broken_period_interest": "float",
+        "calculated_maturedon_date": "date",
+    },
+    "loan_repayment": {
+        "id": "int", "loan_id": "int", "fromdate": "date", "duedate": "date", "installment": "int",
+        "principal_amount": "float", "principal_completed_derived": "float", "interest_amount": "float",
+        "interest_completed_derived": "float", "completed_derived": "int", "createdby_id": "int",
+        "created_date": "date", "lastmodifiedby_id": "int", "lastmodified_date": "date", "emi_cleared_on": "date",
+    },
+    "arrears": {
+        "loan_id": "int", "principal_overdue_derived": "float", "interest_overdue_derived": "float",
+        "fee_charges_overdue_derived": "float", "penalty_charges_overdue_derived": "float",
+        "total_overdue_derived": "float", "overdue_since_date_derived": "date", "dpd_days": "int",
+    },
+}
+
+# table -> column -> referenced table (always its `id` column); NULL references are allowed
+FOREIGN_KEYS = {
+    "group_": {"office_id": "office"},
+    "client": {"office_id": "office"},
+    "loan": {"client_id": "client", "group_id": "group_"},
+    "loan_repayment": {"loan_id": "loan"},
+    "arrears": {"loan_id": "loan"},
+}
+
+# Columns a row cannot be loaded without
+REQUIRED_COLUMNS = {
+    "office": ("id",), "group_": ("id",), "client": ("id",), "loan": ("id",),
+    "loan_repayment": ("id", "loan_id"), "arrears": ("loan_id",), "org": ("branch",),
+}
+
+# Derived columns written alongside the file's own columns.
+# branch_key = text after the last ':' of the branch/office name (indexed lookup key
+# used by the API instead of SUBSTRING_INDEX(..., ':', -1)).
+derived_cols = {
+    "office": {"branch_key": "name"},
+    "org": {"branch_key": "branch"},
+}
+
+
+def branch_key_series(series):
+    return series.astype("string").str.rsplit(":", n=1).str[-1]
+
+
+# --------------------------
+# 2) Column conversion (vectorized)
+# --------------------------
+def text_columns(table_name):
+    """read_csv dtype= for a table: its str / date columns as text, numeric ones left to the C parser."""
+    return {col: str for col, kind in TABLE_SCHEMAS.get(table_name, {}).items() if kind == "str" or kind.startswith("date")}
+
+
+def parse_dates(text, formats=DATE_FORMATS):
+    """Text column -> datetime64 column; each format only sees the values the previous ones missed."""
+    parsed = pd.Series(pd.NaT, index=text.index, dtype="datetime64[ns]")
+    todo = text.notna().to_numpy().copy()
+    for fmt in formats:
+        if not todo.any():
+            break
+        attempt = pd.to_datetime(text[todo], format=fmt, errors="coerce")
+        hit = attempt.notna()
+        parsed.loc[attempt.index[hit]] = attempt[hit]
+        todo[todo] = ~hit.to_numpy()
+    if todo.any():
+        # Leftovers only: surrounding blanks, then pandas' per-value parser
+        parsed[todo] = pd.to_datetime(text[todo].astype(str).str.strip(), errors="coerce", dayfirst=True, format="mixed")
+    return parsed
+
+
+def _date_text(parsed):
+    """datetime64 column -> 'YYYY-MM-DD' strings (None for NaT); each distinct day is formatted once."""
+    days = parsed.to_numpy().astype("datetime64[D]")
+    unique, inverse = np.unique(days, return_inverse=True)
+    text = np.datetime_as_string(unique).astype(object)[inverse]
+    text[np.isnat(days)] = None
+    return pd.Series(text, index=parsed.index, dtype=object)
+
+
+def _convert(column, kind):
+    """Returns (converted column, mask of values that could not be converted)."""
+    if kind == "str":
+        return column, np.zeros(len(column), dtype=bool)
+    present = column.notna()
+    if kind.startswith("date"):
+        formats = [kind.split(":", 1)[1]] if ":" in kind else DATE_FORMATS
+        parsed = parse_dates(column, formats)
+        return _date_text(parsed), (present & parsed.isna()).to_numpy()
+    if pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column):
+        number = column.astype("float64")
+        bad = np.zeros(len(column), dtype=bool)
+    else:
+        # The C parser met a value that is not a number somewhere in this chunk
+        number = pd.to_numeric(column.astype(str).str.strip(), errors="coerce").where(present)
+        bad = (present & number.isna()).to_numpy()
+    bad = bad | np.isinf(number.to_numpy())
+    if kind == "int":
+        fractional = (number != np.floor(number)).to_numpy() & number.notna().to_numpy()
+        bad = bad | fractional
+        number = number.mask(bad)
+        return number.astype("Int64"), bad
+    return number.mask(bad), bad
+
+
+# --------------------------
+# 3) Foreign keys
+# --------------------------
+class ReferenceIds:
+    """
+    Sorted int64 arrays of the ids of referenced tables, loaded from MySQL the
+    first time a load needs them. The orchestrator loads parents before their
+    children, so by then the parent's new rows are in. Shared by the worker threads.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._lock = threading.Lock()
+
+    def ids(self, conn, table):
+        with self._lock:
+            if table not in self._ids:
+                cursor = conn.cursor()
+                cursor.execute(f"SELECT id FROM {table}")
+                ids = np.fromiter((row[0] for row in cursor if row[0] is not None), dtype=np.int64)
+                cursor.close()
+                self._ids[table] = np.unique(ids)
+                print(f"[Load] {len(self._ids[table])} `{table}` ids loaded for FK checks")
+            return self._ids[table]
+
+    def contains(self, conn, table, values):
+        """Boolean mask: is each (non-missing) value an id of `table`? Missing values count as present."""
+        ids = self.ids(conn, table)
+        values = np.asarray(values, dtype=np.float64)
+        known = np.isnan(values)
+        wanted = values[~known].astype(np.int64)
+        pos = np.minimum(np.searchsorted(ids, wanted), max(len(ids) - 1, 0))
+        known[~known] = (ids[pos] == wanted) if len(ids) else False
+        return known
+
+
+# --------------------------
+# 4) One chunk
+# --------------------------
+def clean_chunk(df, table_name, conn=None, references=None):
+    """
+    Text chunk -> (typed chunk, reasons, dates_coerced). reasons is an object
+    array with None for rows that can be loaded and the first failed check
+    otherwise. FK checks run only when references (ReferenceIds) is given.
+    """
+    df = df.copy()
+    df.columns = df.columns.str.strip()
+    schema = TABLE_SCHEMAS.get(table_name, {})
+    reasons = np.full(len(df), None, dtype=object)
+    pending = np.ones(len(df), dtype=bool)   # rows no check has failed yet
+    coerced = 0
+
+    def reject(mask, reason):
+        mask = np.asarray(mask, dtype=bool) & pending
+        reasons[mask] = reason
+        pending[mask] = False
+
+    for col in df.columns:
+        kind = schema.get(col, "str")
+        df[col], bad = _convert(df[col], kind)
+        if bad.any():
+            if kind.startswith("date"):
+                coerced += int(bad.sum())
+            else:
+                reject(bad, f"{col}: not {'an int' if kind == 'int' else 'a number'}")
+
+    for col in REQUIRED_COLUMNS.get(table_name, ()):
+        if col in df.columns:
+            reject(df[col].isna().to_numpy(), f"{col}: missing")
+
+    if references is not None:
+        for col, parent in FOREIGN_KEYS.get(table_name, {}).items():
+            if col in df.columns:
+                values = df[col].to_numpy(dtype="float64", na_value=np.nan)
+                reject(~references.contains(conn, parent, values), f"{col}: no such {parent}")
+
+    # Add derived columns (e.g. branch_key) for this table
+    for target, source in derived_cols.get(table_name, {}).items():
+        if source in df.columns:
+            df[target] = branch_key_series(df[source])
+    return df, reasons, coerced
+
+
+# --------------------------
+# 5) Quarantine
+# --------------------------
+class Quarantine:
+    """Rejected rows of one file, appended in bulk (one write per chunk) to QUARANTINE_DIR/<file>.rejected.csv."""
+
+    def __init__(self, file_name, append=False):
+        self.path = os.path.join(QUARANTINE_DIR, f"{os.path.splitext(file_name)[0]}.rejected.csv")
+        self.count = 0
+        self._header = not (append and os.path.exists(self.path))
+        if not append and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def add(self, raw, reasons, row_numbers):
+        """raw: the rejected rows as read from the file; row_numbers: 1-based data row numbers."""
+        if not len(raw):
+            return
+        out = raw.copy()
+        out.insert(0, "_reason", list(reasons))
+        out.insert(0, "_row", list(row_numbers))
+        os.makedirs(QUARANTINE_DIR, exist_ok=True)
+        out.to_csv(self.path, mode="w" if self._header else "a", header=self._header, index=False)
+        self._header = False
+        self.count += len(out)
+
+    def add_rows(self, columns, rows, reasons, row_numbers):
+        """Rows MySQL rejected (tuples in `columns` order)."""
+        self.add(pd.DataFrame(list(rows), columns=columns), reasons, row_numbers)
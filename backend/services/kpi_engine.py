@@ -0,0 +1,121 @@
+# kpi_engine.py
+# -----------------------------------------------
+# 📊 Purpose: Consolidated KPI computation for /api/kpis.
+# All dashboard KPIs come out of ONE statement:
+#   - a single loan_repayment -> loan -> client -> office scan that uses
+#     conditional aggregation for totals, the June 30 collection rate and
+#     the average loan per customer
+#   - a first-loan-date-per-client derived table (one GROUP BY over loan)
+#     for the new-customer counts, instead of a correlated MIN() per row
+# -----------------------------------------------
+
+from datetime import datetime, timedelta
+
+KPI_QUERY = """
+SELECT
+    rp.total_disbursed,
+    rp.total_collected,
+    rp.active_loans,
+    rp.expected_till_june,
+    rp.collected_till_june,
+    rp.total_customers,
+    nc.new_customers,
+    nc.prev_customers
+FROM (
+    SELECT
+        SUM(lr.principal_amount) AS total_disbursed,
+        SUM(lr.principal_completed_derived) AS total_collected,
+        COUNT(DISTINCT lr.loan_id) AS active_loans,
+        SUM(CASE WHEN lr.duedate <= %(cutoff)s THEN lr.principal_amount ELSE 0 END) AS expected_till_june,
+        SUM(CASE WHEN lr.duedate <= %(cutoff)s THEN lr.principal_completed_derived ELSE 0 END) AS collected_till_june,
+        COUNT(DISTINCT c.id) AS total_customers
+    FROM loan_repayment lr
+    JOIN loan l ON lr.loan_id = l.id
+    JOIN client c ON l.client_id = c.id
+    JOIN office o ON c.office_id = o.id
+    {branch_filter}
+) rp
+CROSS JOIN (
+    SELECT
+        COALESCE(SUM(fl.first_loan_date >= %(last_month_start)s AND fl.first_loan_date < %(this_month_start)s), 0) AS new_customers,
+        COALESCE(SUM(fl.first_loan_date >= %(prev_month_start)s AND fl.first_loan_date < %(last_month_start)s), 0) AS prev_customers
+    FROM (
+        SELECT l.client_id, MIN(l.approvedon_date) AS first_loan_date
+        FROM loan l
+        GROUP BY l.client_id
+    ) fl
+    JOIN client c ON fl.client_id = c.id
+    JOIN office o ON c.office_id = o.id
+    WHERE fl.first_loan_date >= %(prev_month_start)s AND fl.first_loan_date < %(this_month_start)s
+    {branch_and}
+) nc
+"""
+
+BRANCH_PREDICATE = "o.branch_key = %(branch)s"
+
+
+def kpi_windows(today=None):
+    """Date boundaries used by the KPI query (June 30 cutoff + last two full months)."""
+    today = today or datetime.today()
+    first_of_this_month = datetime(today.year, today.month, 1)
+    last_month_end = first_of_this_month - timedelta(days=1)
+    last_month_start = datetime(last_month_end.year, last_month_end.month, 1)
+    prev_month_end = last_month_start - timedelta(days=1)
+    prev_month_start = datetime(prev_month_end.year, prev_month_end.month, 1)
+    return {
+        "cutoff": datetime(today.year, 6, 30).strftime("%Y-%m-%d"),
+        "this_month_start": first_of_this_month,
+        "last_month_start": last_month_start,
+        "prev_month_start": prev_month_start,
+    }
+
+
+def build_kpi_query(branch=None, today=None):
+    """Returns (sql, params) for the single-pass KPI statement."""
+    params = kpi_windows(today)
+    if branch:
+        params["branch"] = branch.strip()
+        sql = KPI_QUERY.format(
+            branch_filter="WHERE " + BRANCH_PREDICATE,
+            branch_and="AND " + BRANCH_PREDICATE,
+        )
+    else:
+        sql = KPI_QUERY.format(branch_filter="", branch_and="")
+    return sql, params
+
+
+def shape_kpis(row):
+    """Turns the aggregate row into the /api/kpis response fields."""
+    total_disbursed = row["total_disbursed"] or 0
+    total_collected = row["total_collected"] or 0
+    expected_till_june = row["expected_till_june"] or 0
+    collected_till_june = row["collected_till_june"] or 0
+    new_customers = int(row["new_customers"] or 0)
+    prev_customers = int(row["prev_customers"] or 0)
+
+    collection_rate = round((collected_till_june / expected_till_june) * 100, 2) if expected_till_june else 0.0
+    customer_change = (
+        round(((new_customers - prev_customers) / prev_customers) * 100, 2)
+        if prev_customers else None
+    )
+    avg_loan = round(total_disbursed / (row["total_customers"] or 1), 2)
+
+    return {
+        "total_disbursed": total_disbursed,
+        "total_collected": total_collected,
+        "collection_rate": collection_rate,
+        "active_loans": row["active_loans"],
+        "average_loan_per_customer": avg_loan,
+        "new_customers": new_customers,
+        "new_customers_change_pct": customer_change
+    }
+
+
+def compute_kpis(conn, branch=None):
+    """Runs the consolidated KPI query on a (pooled) connection."""
+    sql, params = build_kpi_query(branch)
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(sql, params)
+    row = cursor.fetchone()
+    cursor.close()
+    return shape_kpis(row)
@@ -0,0 +1,306 @@
+# load_orchestrator.py
+# -----------------------------------------------
+# 🗂️ Purpose: Parallel, dependency-ordered, resumable loading of the extracts
+# listed in services/upload_csv.py (load_tasks).
+#
+# - Tables are loaded after the tables their foreign keys point to
+#   (TABLE_DEPENDENCIES); tables with no pending dependency load in parallel,
+#   each on its own pooled connection (FINSIGHT_LOAD_WORKERS at a time)
+# - Every insert batch records its progress in load_checkpoint inside the
+#   same transaction, so an interrupted load resumes at the first row that
+#   was not committed - no chunk is inserted twice, none is skipped
+# - A file that changed since its checkpoint (size / mtime) starts over;
+#   a finished file is skipped until it changes (or --restart)
+# - If a table fails, the tables that depend on it are not started
+# - --delta applies only the rows that changed since the last load (inserts,
+#   updates, deletes; services/delta_load.py) instead of inserting every row
+# - Foreign keys are checked against the parent ids (one sorted id array per
+#   parent table per run, services/ingest_schema.py); rows with unknown parents
+#   go to data/quarantine/. FINSIGHT_LOAD_CHECK_FKS=0 leaves this to MySQL.
+#
+# Run from backend/ with:
+#   python -m services.load_orchestrator [--tables loan,loan_repayment] [--workers 4] [--restart]
+#                                        [--delta [--keep-missing]]
+# (python -m services.upload_csv does the same)
+# -----------------------------------------------
+
+import argparse
+import os
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from services.db import POOL_SIZE, db_connection
+from services.delta_load import delta_load_table, ensure_delta_tables, log_bulk_load, notify_change
+from services.ingest_schema import FOREIGN_KEYS, TABLE_SCHEMAS, ReferenceIds
+from services.upload_csv import DATA_DIR, insert_csv_to_table, load_tasks
+
+LOAD_WORKERS = int(os.getenv("FINSIGHT_LOAD_WORKERS", str(min(4, max(1, POOL_SIZE - 1)))))
+CHECK_FKS = os.getenv("FINSIGHT_LOAD_CHECK_FKS", "1") != "0"
+
+# Changes to these can move clients between branches, so they rebuild every branch rollup
+BRANCH_MAPPING_TABLES = {"client", "office", "org"}
+
+# table -> tables it references (must be loaded first)
+TABLE_DEPENDENCIES = {
+    table: tuple(sorted(set(FOREIGN_KEYS.get(table, {}).values()))) for table in TABLE_SCHEMAS
+}
+
+CHECKPOINT_DDL = """
+CREATE TABLE IF NOT EXISTS load_checkpoint (
+    table_name VARCHAR(64) NOT NULL,
+    file_name VARCHAR(255) NOT NULL,
+    file_size BIGINT NOT NULL,
+    file_mtime BIGINT NOT NULL,
+    rows_done BIGINT NOT NULL DEFAULT 0,
+    status VARCHAR(16) NOT NULL,
+    updated_at DATETIME NOT NULL,
+    PRIMARY KEY (table_name, file_name)
+)
+"""
+
+CHECKPOINT_UPSERT = """
+INSERT INTO load_checkpoint (table_name, file_name, file_size, file_mtime, rows_done, status, updated_at)
+VALUES (%s, %s, %s, %s, %s, %s, NOW())
+ON DUPLICATE KEY UPDATE
+    file_size = VALUES(file_size), file_mtime = VALUES(file_mtime), rows_done = VALUES(rows_done),
+    status = VALUES(status), updated_at = VALUES(updated_at)
+"""
+
+
+def ensure_checkpoint_table(conn):
+    cursor = conn.cursor()
+    cursor.execute(CHECKPOINT_DDL)
+    cursor.close()
+    conn.commit()
+
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return stat.st_size, int(stat.st_mtime)
+
+
+def _read_checkpoint(conn, table_name, file_name):
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT file_size, file_mtime, rows_done, status FROM load_checkpoint WHERE table_name = %s AND file_name = %s",
+        (table_name, file_name)
+    )
+    row = cursor.fetchone()
+    cursor.close()
+    return row
+
+
+# --------------------------
+# 1) One file (runs on a worker thread with its own pooled connection)
+# --------------------------
+def load_task(task, restart=False, delta=False, run_id=None, apply_deletes=True, references=None):
+    """
+    Loads one load_tasks entry from its checkpoint (or, with delta, applies the
+    rows that changed since the last load). Returns the load report (or a skip note).
+    """
+    table_name, file_name = task["table"], task["file"]
+    size, mtime = _file_signature(os.path.join(DATA_DIR, file_name))
+
+    with db_connection() as conn:
+        checkpoint_row = None if restart else _read_checkpoint(conn, table_name, file_name)
+        start_row = 0
+        if checkpoint_row and (checkpoint_row[0], checkpoint_row[1]) == (size, mtime):
+            if checkpoint_row[3] == "done":
+                print(f"⏭️ {file_name} already loaded into `{table_name}` ({checkpoint_row[2]} rows); skipping.")
+                return {"file": file_name, "table": table_name, "status": "already_loaded", "loan_ids": set()}
+            start_row = int(checkpoint_row[2])
+
+        if delta:
+            # Idempotent by construction: an interrupted delta load simply runs again
+            report = delta_load_table(conn, task, run_id, apply_deletes=apply_deletes, references=references)
+            cursor = conn.cursor()
+            cursor.execute(CHECKPOINT_UPSERT, (table_name, file_name, size, mtime, report["rows"], "done"))
+            cursor.close()
+            conn.commit()
+            report["status"] = "loaded"
+            return report
+
+        def checkpoint(cursor, rows_done):
+            cursor.execute(CHECKPOINT_UPSERT, (table_name, file_name, size, mtime, rows_done, "running"))
+
+        report = insert_csv_to_table(
+            conn,
+            file_name=file_name,
+            table_name=table_name,
+            columns=task["columns"],
+            is_excel=task.get("is_excel", False),
+            start_row=start_row,
+            checkpoint=checkpoint,
+            references=references
+        )
+
+        cursor = conn.cursor()
+        cursor.execute(CHECKPOINT_UPSERT, (table_name, file_name, size, mtime, start_row + report["rows"], "done"))
+        if report["inserted"]:
+            log_bulk_load(cursor, run_id, table_name)
+        cursor.close()
+        conn.commit()
+    report["status"] = "loaded"
+    return report
+
+
+# --------------------------
+# 2) Scheduling
+# --------------------------
+def _refresh_after_load(step, refresh, **kwargs):
+    """
+    Runs one derived-data refresh (alerts, rollups) on its own connection. The
+    rows are committed either way, so a failure is reported, not raised.
+    """
+    try:
+        with db_connection() as conn:
+            refresh(conn, **kwargs)
+    except Exception as e:
+        print(f"❌ Refreshing {step} after the load failed: {e}")
+        return {"step": step, "status": "failed", "error": str(e)}
+    return {"step": step, "status": "refreshed"}
+
+
+def _refresh_summaries_for_load(conn, loan_ids, full):
+    """Rebuilds the branch rollups of the touched loans (all of them if full); no-op before the first build."""
+    from services.advisor_alerts import entities_for_loans
+    from services.summary_tables import refresh_summaries, summaries_ready
+
+    if not summaries_ready(conn):
+        return
+    if full:
+        refresh_summaries(conn, full=True)
+        return
+    touched_branches, _ = entities_for_loans(conn, loan_ids)
+    refresh_summaries(conn, branches=touched_branches)
+
+
+def run_load(tasks=None, tables=None, workers=LOAD_WORKERS, restart=False, delta=False, apply_deletes=True):
+    """
+    Loads the given tasks (default: every load_tasks entry whose file exists),
+    optionally only for `tables`, in dependency order. Returns a report dict.
+    delta=True applies only changed rows; the changes share one run_id in load_change_log.
+    """
+    started = time.perf_counter()
+    run_id = uuid.uuid4().hex
+    references = ReferenceIds() if CHECK_FKS else None
+    tasks = list(load_tasks if tasks is None else tasks)
+    if tables:
+        tasks = [t for t in tasks if t["table"] in tables]
+    missing = [t for t in tasks if not os.path.exists(os.path.join(DATA_DIR, t["file"]))]
+    for t in missing:
+        print(f"⏭️ {t['file']} not found in {DATA_DIR}; skipping `{t['table']}`.")
+    tasks = [t for t in tasks if t not in missing]
+
+    with db_connection() as conn:
+        ensure_checkpoint_table(conn)
+        ensure_delta_tables(conn)
+
+    # A table waits only for dependencies that are part of this run
+    pending_by_table = {}
+    for t in tasks:
+        pending_by_table.setdefault(t["table"], []).append(t)
+    waiting_on = {
+        table: {dep for dep in TABLE_DEPENDENCIES.get(table, ()) if dep in pending_by_table}
+        for table in pending_by_table
+    }
+    open_tasks = {table: len(ts) for table, ts in pending_by_table.items()}
+    done, failed, blocked = set(), set(), set()
+    reports, touched_loans = [], set()
+
+    def ready_tables():
+        return [table for table, deps in waiting_on.items() if not deps]
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="finsight-load") as pool:
+        running = {}
+
+        def submit_ready():
+            for table in ready_tables():
+                del waiting_on[table]
+                for task in pending_by_table[table]:
+                    running[pool.submit(load_task, task, restart, delta, run_id, apply_deletes, references)] = task
+
+        submit_ready()
+        while running:
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                task = running.pop(future)
+                table = task["table"]
+                try:
+                    report = future.result()
+                    touched_loans |= report.pop("loan_ids")
+                    reports.append(report)
+                except Exception as e:
+                    print(f"❌ Loading {task['file']} into `{table}` failed: {e}")
+                    reports.append({"file": task["file"], "table": table, "status": "failed", "error": str(e)})
+                    failed.add(table)
+                open_tasks[table] -= 1
+                if open_tasks[table] == 0 and table not in failed:
+                    done.add(table)
+                    for deps in waiting_on.values():
+                        deps.discard(table)
+
+            # Dependents of a failed table (transitively) never start
+            changed = True
+            while changed:
+                changed = False
+                for table, deps in list(waiting_on.items()):
+                    if deps & (failed | blocked):
+                        del waiting_on[table]
+                        blocked.add(table)
+                        changed = True
+                        print(f"⛔ `{table}` not loaded: depends on {', '.join(sorted(deps & (failed | blocked)))}.")
+            submit_ready()
+
+    # Cached API results built from these tables are stale now
+    changed_tables = {r["table"] for r in reports if r.get("inserted") or r.get("updated") or r.get("deleted")}
+    notify_change(changed_tables)
+
+    # 🔔 Re-evaluate advisor alerts for just the loans' clients and branches
+    refreshes = []
+    if touched_loans:
+        from services.advisor_alerts import refresh_alerts
+
+        refreshes.append(_refresh_after_load("advisor alerts", refresh_alerts, loan_ids=touched_loans))
+
+    # 🧮 Rebuild the branch rollups /kpis and /delinquency read
+    full_summary = bool(changed_tables & BRANCH_MAPPING_TABLES)
+    if touched_loans or full_summary:
+        refreshes.append(_refresh_after_load("summary tables", _refresh_summaries_for_load,
+                                             loan_ids=touched_loans, full=full_summary))
+
+    elapsed = time.perf_counter() - started
+    rows = sum(r.get("rows", 0) for r in reports)
+    print(f"[Load] {len(done)} table(s) loaded, {len(failed)} failed, {len(blocked)} blocked; "
+          f"{rows} rows in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:,.0f} rows/s)")
+    return {
+        "run_id": run_id,
+        "mode": "delta" if delta else "insert",
+        "tables_loaded": sorted(done),
+        "tables_failed": sorted(failed),
+        "tables_blocked": sorted(blocked),
+        "files_missing": [t["file"] for t in missing],
+        "rows": rows,
+        "seconds": round(elapsed, 3),
+        "files": reports,
+        "refreshes": refreshes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load the FinSight extracts in dependency order.")
+    parser.add_argument("--tables", default="", help="comma-separated subset of tables to load")
+    parser.add_argument("--workers", type=int, default=LOAD_WORKERS)
+    parser.add_argument("--restart", action="store_true", help="ignore checkpoints and load every file from the top")
+    parser.add_argument("--delta", action="store_true", help="apply only inserted / updated / deleted rows")
+    parser.add_argument("--keep-missing", action="store_true",
+                        help="with --delta: do not delete rows the file no longer has (partial extracts)")
+    args = parser.parse_args()
+    tables = {t.strip() for t in args.tables.split(",") if t.strip()} or None
+    run_load(tables=tables, workers=args.workers, restart=args.restart,
+             delta=args.delta, apply_deletes=not args.keep_missing)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# migrations.py
+# -----------------------------------------------
+# 🛠️ Purpose: Idempotent schema migrations for the FinSight database.
+# Each migration checks information_schema first, so running this file
+# again is always safe.
+#
+# Run from backend/ with:  python -m services.migrations
+# -----------------------------------------------
+
+from services.db import db_connection, DB_CONFIG
+from services.upload_csv import load_tasks
+
+# --------------------------
+# 001: normalized branch key
+# --------------------------
+# Route queries used to filter on SUBSTRING_INDEX(o.name, ':', -1), which no
+# index can serve. branch_key stores that suffix once (written by the loader,
+# backfilled here) so branch filters become indexed equality lookups.
+BRANCH_KEY_COLUMNS = [
+    # (table, source column)
+    ("office", "name"),
+    ("org", "Branch"),
+]
+
+# Indexes the hot joins / filters need: (table, index name, columns)
+INDEXES = [
+    ("office", "idx_office_branch_key", "branch_key"),
+    ("org", "idx_org_branch_key", "branch_key"),
+    ("client", "idx_client_office_id", "office_id"),
+    ("loan", "idx_loan_client_id", "client_id"),
+    ("loan_repayment", "idx_loan_repayment_loan_id", "loan_id"),
+    ("arrears", "idx_arrears_loan_id", "loan_id"),
+    # Watermark scans used by the incremental summary refresh
+    ("loan_repayment", "idx_loan_repayment_lastmodified", "lastmodified_date"),
+    ("loan_repayment", "idx_loan_repayment_created", "created_date"),
+    ("loan", "idx_loan_approvedon", "approvedon_date"),
+]
+
+
+def _column_exists(cursor, table, column):
+    cursor.execute(
+        """
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_schema = %s AND table_name = %s AND column_name = %s
+        """,
+        (DB_CONFIG["database"], table, column)
+    )
+    return cursor.fetchone()[0] > 0
+
+
+def _indexed_columns(cursor, table):
+    """Leading columns of every existing index on `table` (FK indexes included)."""
+    cursor.execute(
+        """
+        SELECT index_name, column_name FROM information_schema.statistics
+        WHERE table_schema = %s AND table_name = %s AND seq_in_index = 1
+        """,
+        (DB_CONFIG["database"], table)
+    )
+    rows = cursor.fetchall()
+    return {row[0] for row in rows}, {row[1].lower() for row in rows}
+
+
+def migrate_branch_key(conn):
+    cursor = conn.cursor()
+
+    for table, source in BRANCH_KEY_COLUMNS:
+        if not _column_exists(cursor, table, "branch_key"):
+            print(f"[Migrate] adding {table}.branch_key")
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN branch_key VARCHAR(100) NULL")
+        # Backfill rows the loader has not populated yet
+        cursor.execute(
+            f"UPDATE {table} SET branch_key = SUBSTRING_INDEX({source}, ':', -1) "
+            f"WHERE branch_key IS NULL AND {source} IS NOT NULL"
+        )
+        print(f"[Migrate] {table}.branch_key backfilled ({cursor.rowcount} rows)")
+        conn.commit()
+
+    for table, index_name, column in INDEXES:
+        names, leading_columns = _indexed_columns(cursor, table)
+        if index_name in names or column.lower() in leading_columns:
+            continue
+        print(f"[Migrate] creating {index_name} on {table}({column})")
+        cursor.execute(f"CREATE INDEX {index_name} ON {table} ({column})")
+        conn.commit()
+
+    cursor.close()
+
+
+# --------------------------
+# 002: unique keys for delta loads
+# --------------------------
+# Delta loads (services/delta_load.py) upsert with INSERT ... ON DUPLICATE KEY
+# UPDATE, which needs a PRIMARY / UNIQUE index on each load_tasks "key".
+def _unique_keys(cursor, table):
+    """Column tuples of every PRIMARY / UNIQUE index on `table`."""
+    cursor.execute(
+        """
+        SELECT index_name, column_name FROM information_schema.statistics
+        WHERE table_schema = %s AND table_name = %s AND non_unique = 0
+        ORDER BY index_name, seq_in_index
+        """,
+        (DB_CONFIG["database"], table)
+    )
+    indexes = {}
+    for index_name, column in cursor.fetchall():
+        indexes.setdefault(index_name, []).append(column.lower())
+    return {tuple(columns) for columns in indexes.values()}
+
+
+def migrate_delta_keys(conn):
+    cursor = conn.cursor()
+    for task in load_tasks:
+        table, key = task["table"], tuple(c.lower() for c in task["key"])
+        if key in _unique_keys(cursor, table):
+            continue
+        index_name = f"uq_{table}_{'_'.join(key)}"
+        print(f"[Migrate] creating unique {index_name} on {table}({', '.join(key)})")
+        try:
+            cursor.execute(f"CREATE UNIQUE INDEX {index_name} ON {table} ({', '.join(key)})")
+            conn.commit()
+        except Exception as e:
+            # Usually duplicate keys left by earlier plain-INSERT loads
+            print(f"❌ [Migrate] {index_name} not created ({e}); remove the duplicate {table} rows and run again.")
+    cursor.close()
+
+
+MIGRATIONS = [
+    ("001_branch_key", migrate_branch_key),
+    ("002_delta_keys", migrate_delta_keys),
+]
+
+
+def run_migrations():
+    with db_connection() as conn:
+        for name, migration in MIGRATIONS:
+            print(f"[Migrate] running {name}...")
+            migration(conn)
+    print("[Migrate] all migrations applied.")
+
+
+if __name__ == "__main__":
+    run_migrations()
@@ -0,0 +1,88 @@
+# model_artifacts.py
+# -----------------------------------------------
+# 💾 Purpose: On-disk formats for forecast models.
+#   <base>.prophet.json  Prophet's own JSON serialization (full model;
+#                        needs Prophet to load, but no pickle / class path
+#                        coupling and loads in milliseconds)
+#   <base>.npz           extracted parameter arrays for the NumPy fast path
+#                        (services/fast_prophet.py; no Prophet / Stan needed)
+#   <base>.pkl           legacy pickle, still readable as a fallback
+# Prophet is only imported when a .prophet.json / .pkl is actually loaded.
+#
+# Convert existing pickles (run from backend/):
+#   python -m services.model_artifacts
+# -----------------------------------------------
+
+import os
+import pickle
+
+from services.fast_prophet import FAST_EXT, FastProphetModel, save_fast_params
+
+PROPHET_JSON_EXT = ".prophet.json"
+PICKLE_EXT = ".pkl"
+ARTIFACT_EXTS = (FAST_EXT, PROPHET_JSON_EXT, PICKLE_EXT)
+
+
+def save_artifacts(model, base):
+    """
+    Writes the compact formats for a fitted model next to `base`
+    (atomically, via .tmp + rename). Returns the paths written; the .npz is
+    skipped for models the fast path cannot evaluate.
+    """
+    from prophet.serialize import model_to_json
+
+    written = []
+    json_path = base + PROPHET_JSON_EXT
+    with open(json_path + ".tmp", "w") as f:
+        f.write(model_to_json(model))
+    os.replace(json_path + ".tmp", json_path)
+    written.append(json_path)
+
+    fast_path = base + FAST_EXT
+    try:
+        save_fast_params(model, fast_path + ".tmp")
+        os.replace(fast_path + ".tmp", fast_path)
+        written.append(fast_path)
+    except ValueError as e:
+        print(f"[ModelArtifacts] no fast artifact for {os.path.basename(base)}: {e}")
+        # An older .npz would otherwise keep serving the previous model
+        for path in (fast_path + ".tmp", fast_path):
+            if os.path.exists(path):
+                os.remove(path)
+    return written
+
+
+def load_artifact(path):
+    """Loads a model from any supported format, picked by extension."""
+    if path.endswith(FAST_EXT):
+        return FastProphetModel.load(path)
+    if path.endswith(PROPHET_JSON_EXT):
+        from prophet.serialize import model_from_json
+        with open(path, "r") as f:
+            return model_from_json(f.read())
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def convert_pickles(models_dir):
+    """Writes .prophet.json / .npz next to every current .pkl (archives are left alone)."""
+    converted = 0
+    for root, dirs, files in os.walk(models_dir):
+        dirs[:] = [d for d in dirs if d != "archive"]
+        for name in sorted(files):
+            if not name.endswith(PICKLE_EXT):
+                continue
+            base = os.path.join(root, name[:-len(PICKLE_EXT)])
+            try:
+                written = save_artifacts(load_artifact(base + PICKLE_EXT), base)
+                converted += 1
+                print(f"[ModelArtifacts] {os.path.relpath(base, models_dir)}: wrote {', '.join(os.path.basename(p) for p in written)}")
+            except Exception as e:
+                print(f"❌ [ModelArtifacts] could not convert {name}: {e}")
+    print(f"✅ [ModelArtifacts] converted {converted} model(s).")
+    return converted
+
+
+if __name__ == "__main__":
+    from services.model_registry import MODELS_DIR
+    convert_pickles(MODELS_DIR)
@@ -0,0 +1,195 @@
+# model_registry.py
+# -----------------------------------------------
+# 🗂️ Purpose: Per-branch forecast model registry.
+# Layout under backend/models/:
+#   <metric>/<branch_slug>.<ext> + .json   branch model + training metadata
+#   <metric>_forecast_model.<ext> + .json  network-wide fallback model
+# The .json sidecar carries what the model was trained with (freq, horizon,
+# floor, cap), so nothing about a model is hard-coded in the routes.
+#
+# Artifact formats (services/model_artifacts.py) are tried in the order set
+# by FINSIGHT_FORECAST_BACKEND:
+#   prophet (default)  .prophet.json -> .pkl            full Prophet predict
+#   fast               .npz -> .prophet.json -> .pkl    NumPy predict, no Stan
+#
+# Models load lazily on first use and live in an LRU bounded both by count
+# (FINSIGHT_MODEL_CACHE_SIZE) and by an estimated memory budget
+# (FINSIGHT_MODEL_CACHE_MB, using artifact size on disk as the estimate).
+# Hot branches can be preloaded (FINSIGHT_HOT_BRANCHES="A,B,C" or "087:A,...").
+# Branches are matched by branch_key, so "087:Deogarh" finds models/<metric>/deogarh.*
+# One registry exists per process; forecast worker processes each have theirs.
+# -----------------------------------------------
+
+import json
+import os
+import re
+import threading
+from collections import OrderedDict, namedtuple
+
+from services.model_artifacts import FAST_EXT, PICKLE_EXT, PROPHET_JSON_EXT, load_artifact
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models")
+METRICS = ("disbursement", "collections", "growth")
+GLOBAL_SCOPE = "__global__"
+
+MODEL_CACHE_SIZE = int(os.getenv("FINSIGHT_MODEL_CACHE_SIZE", "64"))
+MODEL_CACHE_MB = float(os.getenv("FINSIGHT_MODEL_CACHE_MB", "256"))
+
+ARTIFACT_ORDER = {
+    "prophet": (PROPHET_JSON_EXT, PICKLE_EXT),
+    "fast": (FAST_EXT, PROPHET_JSON_EXT, PICKLE_EXT),
+}
+FORECAST_BACKEND = os.getenv("FINSIGHT_FORECAST_BACKEND", "prophet").strip().lower()
+if FORECAST_BACKEND not in ARTIFACT_ORDER:
+    print(f"[ModelRegistry] unknown FINSIGHT_FORECAST_BACKEND '{FORECAST_BACKEND}', using 'prophet'.")
+    FORECAST_BACKEND = "prophet"
+
+# scope = branch slug or GLOBAL_SCOPE; fingerprint changes whenever the artifact or .json is replaced
+ModelRef = namedtuple("ModelRef", ["metric", "scope", "model_path", "meta_path", "fingerprint"])
+
+
+UNAVAILABLE_MESSAGES = {
+    "disbursement": "Disbursement model is not available.",
+    "collections": "Collections forecast model is not available.",
+    "growth": "Customer growth model is not available.",
+}
+
+
+class ModelUnavailableError(RuntimeError):
+    """Raised when a forecast model cannot be loaded; the message is safe to show to clients."""
+
+
+def branch_key(branch):
+    """
+    The branch as stored in office.branch_key: the UI sends "087:Deogarh",
+    the training job groups by "Deogarh" (same rule as ingest_schema.branch_key_series).
+    """
+    return str(branch).rsplit(":", 1)[-1].strip()
+
+
+def branch_slug(branch):
+    """File-system safe key for a branch ("087:Ranchi Main" / "Ranchi Main" -> "ranchi_main")."""
+    return re.sub(r"[^a-z0-9]+", "_", branch_key(branch).lower()).strip("_")
+
+
+def parse_branches(text):
+    """Comma-separated branches -> branch keys; "087:Deogarh" and "Deogarh" name the same models."""
+    return list(dict.fromkeys(branch_key(b) for b in text.split(",") if branch_key(b)))
+
+
+HOT_BRANCHES = parse_branches(os.getenv("FINSIGHT_HOT_BRANCHES", ""))
+
+
+def _paths(metric, scope):
+    if scope == GLOBAL_SCOPE:
+        base = os.path.join(MODELS_DIR, f"{metric}_forecast_model")
+    else:
+        base = os.path.join(MODELS_DIR, metric, scope)
+    return base, base + ".json"
+
+
+def _fingerprint(*paths):
+    parts = []
+    for path in paths:
+        st = os.stat(path)
+        parts.append(f"{st.st_mtime_ns:x}-{st.st_size:x}")
+    return ":".join(parts)
+
+
+def resolve_model(metric, branch=None):
+    """Finds the artifact to use: the branch's own model if trained, else the global one."""
+    if metric not in METRICS:
+        raise ModelUnavailableError(f"Unknown forecast metric '{metric}'.")
+    scopes = [GLOBAL_SCOPE]
+    if branch and branch_slug(branch):
+        scopes.insert(0, branch_slug(branch))
+    for scope in scopes:
+        base, meta_path = _paths(metric, scope)
+        for ext in ARTIFACT_ORDER[FORECAST_BACKEND]:
+            try:
+                return ModelRef(metric, scope, base + ext, meta_path, _fingerprint(base + ext, meta_path))
+            except OSError:
+                continue
+    raise ModelUnavailableError(UNAVAILABLE_MESSAGES[metric])
+
+
+class ModelRegistry:
+    """Lazy, LRU-bounded cache of loaded models keyed by (metric, scope)."""
+
+    def __init__(self, max_models=MODEL_CACHE_SIZE, max_bytes=int(MODEL_CACHE_MB * 1024 * 1024)):
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # (metric, scope) -> (fingerprint, model, meta, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "loads": 0, "evictions": 0}
+
+    def get(self, metric, branch=None):
+        """Returns (model, meta, ref) for the branch, loading it on first use."""
+        ref = resolve_model(metric, branch)
+        key = (ref.metric, ref.scope)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == ref.fingerprint:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry[1], entry[2], ref
+
+        model, meta, size = self._load(ref)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[3]
+            self._entries[key] = (ref.fingerprint, model, meta, size)
+            self._bytes += size
+            self._stats["loads"] += 1
+            self._evict()
+        return model, meta, ref
+
+    def _load(self, ref):
+        try:
+            with open(ref.meta_path, "r") as f:
+                meta = json.load(f)
+            model = load_artifact(ref.model_path)
+        except Exception as e:
+            print(f"CRITICAL ERROR: Could not load {ref.metric} model ({ref.scope}). {e}")
+            raise ModelUnavailableError(UNAVAILABLE_MESSAGES[ref.metric])
+        print(f"[ModelRegistry] loaded {ref.metric}/{ref.scope} ({os.path.basename(ref.model_path)}) in process {os.getpid()}.")
+        return model, meta, os.path.getsize(ref.model_path)
+
+    def _evict(self):
+        # Always keep the most recently loaded model, even if it alone exceeds the budget
+        while len(self._entries) > 1 and (len(self._entries) > self.max_models or self._bytes > self.max_bytes):
+            _, (_, _, _, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self._stats["evictions"] += 1
+
+    def preload(self, branches, metrics=METRICS):
+        """Loads models for hot branches up front; missing models are skipped."""
+        loaded = 0
+        for branch in branches:
+            for metric in metrics:
+                try:
+                    self.get(metric, branch)
+                    loaded += 1
+                except ModelUnavailableError as e:
+                    print(f"[ModelRegistry] preload skipped {metric}/{branch}: {e}")
+        return loaded
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["models"] = len(self._entries)
+            snapshot["bytes"] = self._bytes
+        snapshot["max_models"] = self.max_models
+        snapshot["max_bytes"] = self.max_bytes
+        return snapshot
+
+
+registry = ModelRegistry()
+
+
+def preload_hot_models():
+    """Process-pool initializer: preload FINSIGHT_HOT_BRANCHES in each worker."""
+    if HOT_BRANCHES:
+        registry.preload(HOT_BRANCHES)
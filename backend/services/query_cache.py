@@ -0,0 +1,160 @@
+# query_cache.py
+# -----------------------------------------------
+# 🗃️ Purpose: Result cache for the read-mostly dashboard routes
+# (/branches, /kpis, /delinquency). Every user of a branch asks the same
+# question; the answer only changes when new data is loaded.
+#
+# - Entries are keyed by (endpoint, branch, role), expire after
+#   FINSIGHT_QUERY_CACHE_TTL seconds and at most FINSIGHT_QUERY_CACHE_SIZE are
+#   kept (LRU; services/cache.py)
+# - Singleflight: concurrent misses for the same key share one DB query -
+#   the first request starts it, every request awaits the same task
+# - Invalidation: each endpoint lists the tables it reads (ENDPOINT_TABLES).
+#     * loads in this process call invalidate_tables via the loader's change
+#       listeners (services/delta_load.py)
+#     * loads from the CLI are seen through load_change_log, polled at most
+#       every FINSIGHT_QUERY_CACHE_POLL_SECONDS (two small indexed queries)
+#     * summary refreshes (services/summary_tables.py) report their rollup
+#       tables the same two ways
+#   A result computed while an invalidation happened is returned but not cached.
+# - Hit rate, coalesced misses and invalidations: query_cache_stats()
+#   (/api/health/query-cache)
+# -----------------------------------------------
+
+import asyncio
+import os
+import time
+
+from mysql.connector import errors
+
+from services.cache import TTLCache
+from services.db import with_connection
+from services.delta_load import add_change_listener, changed_tables, latest_change_id
+from services.executors import run_db
+
+QUERY_CACHE_TTL = int(os.getenv("FINSIGHT_QUERY_CACHE_TTL", "300"))
+QUERY_CACHE_SIZE = int(os.getenv("FINSIGHT_QUERY_CACHE_SIZE", "512"))
+POLL_SECONDS = float(os.getenv("FINSIGHT_QUERY_CACHE_POLL_SECONDS", "10"))   # <= 0: do not poll
+
+# endpoint -> tables its answer is computed from
+ENDPOINT_TABLES = {
+    "branches": {"org"},
+    "kpis": {"loan", "loan_repayment", "client", "office", "org", "branch_daily_summary", "branch_summary"},
+    "delinquency": {"arrears", "client", "office", "branch_dpd_summary"},
+}
+
+_cache = TTLCache(max_entries=QUERY_CACHE_SIZE, ttl_seconds=QUERY_CACHE_TTL, name="query")
+_inflight = {}        # key -> asyncio.Task running the query
+_generation = [0]     # bumped by every invalidation
+_poll = {"since": None, "next": 0.0}
+_stats = {"coalesced": 0, "uncached_results": 0, "polls": 0, "poll_errors": 0, "invalidations": {}}
+
+
+def query_cache_key(endpoint, branch, role):
+    return (endpoint, branch.strip() if branch else None, role)
+
+
+# --------------------------
+# 1) Invalidation
+# --------------------------
+def invalidate_endpoints(endpoints, source="manual"):
+    endpoints = set(endpoints)
+    _generation[0] += 1
+    removed = _cache.invalidate(lambda key: key[0] in endpoints)
+    _stats["invalidations"][source] = _stats["invalidations"].get(source, 0) + 1
+    if removed:
+        print(f"[QueryCache] {source}: dropped {removed} cached {', '.join(sorted(endpoints))} result(s)")
+    return removed
+
+
+def invalidate_tables(tables, source="loader"):
+    """Drops the cached results of every endpoint that reads one of `tables`."""
+    tables = set(tables)
+    endpoints = [endpoint for endpoint, reads in ENDPOINT_TABLES.items() if reads & tables]
+    return invalidate_endpoints(endpoints, source) if endpoints else 0
+
+
+add_change_listener(invalidate_tables)
+
+
+def _changes_since(conn, since_id):
+    """(tables changed after since_id, newest change id). since_id None = just read the newest id."""
+    try:
+        # Newest id first: a change logged in between is seen twice, never missed
+        newest = latest_change_id(conn)
+        return (set() if since_id is None else set(changed_tables(conn, since_id))), newest
+    except errors.ProgrammingError:
+        # No load has run with a change log yet
+        return set(), since_id or 0
+
+
+async def _poll_changes():
+    """Picks up loads done by other processes; at most one poll per POLL_SECONDS, never awaited twice."""
+    now = time.monotonic()
+    if POLL_SECONDS <= 0 or now < _poll["next"]:
+        return
+    _poll["next"] = now + POLL_SECONDS
+    _stats["polls"] += 1
+    try:
+        tables, newest = await run_db(with_connection, _changes_since, _poll["since"])
+    except Exception as e:
+        _stats["poll_errors"] += 1
+        print(f"Warning: [QueryCache] change log poll failed: {e}")
+        return
+    if _poll["since"] is not None and tables:
+        invalidate_tables(tables, source="change_log")
+    _poll["since"] = newest
+
+
+# --------------------------
+# 2) Lookup with singleflight
+# --------------------------
+async def _run_query(key, work, args):
+    generation = _generation[0]
+    try:
+        result = await run_db(with_connection, work, *args)
+    finally:
+        _inflight.pop(key, None)
+    if generation == _generation[0]:
+        _cache.set(key, result)
+    else:
+        _stats["uncached_results"] += 1
+    return result
+
+
+async def cached_query(endpoint, branch, role, work, *args):
+    """
+    Cached result of run_db(with_connection, work, *args) for (endpoint, branch, role).
+    Concurrent misses for the same key run the query once, as a task of its own,
+    so a client that disconnects does not cancel it for the others. Exceptions
+    reach every waiter and are never cached. Cached results are shared:
+    callers must not mutate them.
+    """
+    await _poll_changes()
+    key = query_cache_key(endpoint, branch, role)
+    result = _cache.get(key)
+    if result is not None:
+        return result
+
+    task = _inflight.get(key)
+    if task is None:
+        task = _inflight[key] = asyncio.ensure_future(_run_query(key, work, args))
+        # Retrieve the exception even if every waiter has gone away
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    else:
+        _stats["coalesced"] += 1
+    return await asyncio.shield(task)
+
+
+def query_cache_stats():
+    stats = _cache.stats()
+    stats.update({
+        "coalesced_misses": _stats["coalesced"],
+        "uncached_results": _stats["uncached_results"],
+        "in_flight": len(_inflight),
+        "change_log_polls": _stats["polls"],
+        "change_log_poll_errors": _stats["poll_errors"],
+        "change_log_id": _poll["since"],
+        "invalidations_by_source": dict(_stats["invalidations"]),
+    })
+    return stats
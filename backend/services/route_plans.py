@@ -0,0 +1,261 @@
+# route_plans.py
+# -----------------------------------------------
+# 🚚 Purpose: Nightly / morning route planning for the whole branch network.
+# /planning/route used to optimize every route on request. This job plans
+# every branch up front and stores the result, so the endpoint only does a
+# primary-key lookup for the standard plans: the default strategy at every
+# size in FINSIGHT_ROUTE_PLAN_SIZES (default "4,10": the TSP page's default
+# visit count and the API's default num_clients). Other sizes / strategies
+# are optimized on request as before.
+#
+# 1. Branches come from office / org; stops from client_location
+#    (services/client_locations.py - run the geocoding job first; branches
+#    with no located clients are skipped)
+# 2. Branches are optimized in parallel on a process pool
+#    (FINSIGHT_PLAN_WORKERS); driving distances go through the shared
+#    SQLite distance cache, so unchanged client sets cost no Google calls
+# 3. Plans are upserted into route_plan, one transaction per PLAN_WRITE_BATCH
+# 4. The run reports branches/s and the km local search saved vs greedy
+#
+# Plans older than FINSIGHT_ROUTE_PLAN_MAX_AGE_HOURS are ignored by the API.
+#
+# Run manually with:
+#   python -m services.route_plans [--selection nearest|overdue] [--sizes 4,10]
+#                                  [--strategy oropt] [--workers N]
+# Google distances are used when FINSIGHT_GOOGLE_MAPS_API_KEY is set.
+# -----------------------------------------------
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from mysql.connector import errors
+
+from ai_modules.route_optimizer import optimize_route, DEFAULT_TIME_BUDGET_MS
+from ai_modules.route_solver import DEFAULT_STRATEGY, STRATEGIES
+from services.client_locations import SELECTIONS, select_route_clients
+
+PLAN_WORKERS = int(os.getenv("FINSIGHT_PLAN_WORKERS", str(os.cpu_count() or 1)))
+PLAN_MAX_AGE_HOURS = int(os.getenv("FINSIGHT_ROUTE_PLAN_MAX_AGE_HOURS", "24"))
+PLAN_WRITE_BATCH = 50
+DEFAULT_ROUTE_CLIENTS = 10     # /planning/route default num_clients
+PLAN_SIZES = tuple(sorted({
+    int(n) for n in os.getenv("FINSIGHT_ROUTE_PLAN_SIZES", f"4,{DEFAULT_ROUTE_CLIENTS}").split(",") if n.strip()
+}))
+
+ROUTE_PLAN_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS route_plan (
+        branch_key VARCHAR(100) NOT NULL,
+        selection VARCHAR(16) NOT NULL,
+        strategy VARCHAR(16) NOT NULL,
+        num_clients INT NOT NULL,
+        plan_json MEDIUMTEXT NOT NULL,
+        total_distance_km DECIMAL(12, 2) NOT NULL,
+        greedy_distance_km DECIMAL(12, 2) NOT NULL,
+        client_count INT NOT NULL,
+        data_source VARCHAR(64) NOT NULL,
+        planned_at DATETIME NOT NULL,
+        PRIMARY KEY (branch_key, selection, strategy, num_clients)
+    )
+    """,
+]
+
+PLAN_UPSERT = """
+INSERT INTO route_plan
+    (branch_key, selection, strategy, num_clients, plan_json,
+     total_distance_km, greedy_distance_km, client_count, data_source, planned_at)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
+ON DUPLICATE KEY UPDATE
+    plan_json = VALUES(plan_json), total_distance_km = VALUES(total_distance_km),
+    greedy_distance_km = VALUES(greedy_distance_km), client_count = VALUES(client_count),
+    data_source = VALUES(data_source), planned_at = VALUES(planned_at)
+"""
+
+
+def ensure_route_plan_tables(conn):
+    cursor = conn.cursor()
+    for ddl in ROUTE_PLAN_DDL:
+        cursor.execute(ddl)
+    cursor.close()
+    conn.commit()
+
+
+def _all_branches(conn):
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT branch_key FROM office WHERE branch_key IS NOT NULL "
+        "UNION SELECT branch_key FROM org WHERE branch_key IS NOT NULL"
+    )
+    branches = sorted({row[0].strip() for row in cursor.fetchall() if row[0] and row[0].strip()})
+    cursor.close()
+    return branches
+
+
+# --------------------------
+# 1) Per-branch work (runs in the process pool)
+# --------------------------
+def plan_branch(branch, origin, clients, strategy, time_budget_ms, api_key):
+    """Optimizes one branch; returns (branch, result) with the same shape /planning/route returns."""
+    branch_location = {"id": "BRANCH", "name": f"Branch {branch}", "lat": origin[0], "lon": origin[1]}
+    stops = [
+        {"id": str(c["id"]), "name": c["display_name"], "lat": c["lat"], "lon": c["lon"]}
+        for c in clients
+    ]
+    result = optimize_route(branch_location, stops, api_key=api_key, strategy=strategy, time_budget_ms=time_budget_ms)
+    return branch, result
+
+
+def _plan_row(branch, selection, strategy, num_clients, result):
+    result["selection"] = selection
+    result["location_source"] = "client_location"
+    return (
+        branch, selection, strategy, num_clients, json.dumps(result),
+        result["total_distance_km"], result["solver"]["greedy_distance_km"],
+        result["client_count"], result["data_source"]
+    )
+
+
+def _write_plans(conn, rows):
+    cursor = conn.cursor()
+    try:
+        cursor.executemany(PLAN_UPSERT, rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+# --------------------------
+# 2) Batch run
+# --------------------------
+def plan_network(conn, selection="nearest", sizes=PLAN_SIZES, strategy=DEFAULT_STRATEGY,
+                 time_budget_ms=DEFAULT_TIME_BUDGET_MS, api_key=None, workers=PLAN_WORKERS, branches=None):
+    """
+    Plans every branch (or the given ones) for each num_clients in sizes and
+    stores the plans in route_plan. Returns a report dict: planned / skipped /
+    failed counts, branches per second and the kilometres saved against the
+    greedy tours.
+    """
+    if selection not in SELECTIONS:
+        raise ValueError(f"Unknown client selection '{selection}'. Use one of: {', '.join(SELECTIONS)}")
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown route strategy '{strategy}'. Use one of: {', '.join(STRATEGIES)}")
+
+    started = time.perf_counter()
+    ensure_route_plan_tables(conn)
+    branches = sorted(set(b.strip() for b in branches if b)) if branches is not None else _all_branches(conn)
+
+    sizes = sorted(set(sizes))
+    # Stop selection is indexed DB work; keep it here so workers never touch MySQL
+    jobs, skipped = [], []
+    for branch in branches:
+        for num_clients in sizes:
+            located = select_route_clients(conn, branch, num_clients, selection)
+            if not located:
+                skipped.append(branch)
+                break
+            jobs.append((branch, num_clients) + located)
+
+    planned, failed, pending = set(), set(), []
+    plans = 0
+    greedy_km = planned_km = 0.0
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(jobs) or 1))) as pool:
+        futures = {
+            pool.submit(plan_branch, branch, origin, clients, strategy, time_budget_ms, api_key): (branch, num_clients)
+            for branch, num_clients, origin, clients in jobs
+        }
+        for future in as_completed(futures):
+            branch, num_clients = futures[future]
+            try:
+                _, result = future.result()
+            except Exception as e:
+                print(f"[RoutePlans] ❌ {branch} ({num_clients} clients): {e}")
+                failed.add(branch)
+                continue
+            greedy_km += result["solver"]["greedy_distance_km"]
+            planned_km += result["total_distance_km"]
+            pending.append(_plan_row(branch, selection, strategy, num_clients, result))
+            planned.add(branch)
+            plans += 1
+            if len(pending) >= PLAN_WRITE_BATCH:
+                _write_plans(conn, pending)
+                pending = []
+    if pending:
+        _write_plans(conn, pending)
+
+    planned -= failed
+    elapsed = time.perf_counter() - started
+    rate = len(planned) / elapsed if elapsed > 0 else 0.0
+    km_saved = greedy_km - planned_km
+    print(f"[RoutePlans] ✅ planned {len(planned)} branches ({plans} plans, sizes {sizes}) in {elapsed:.2f}s "
+          f"({rate:.1f} branches/s), "
+          f"{len(skipped)} without located clients, {len(failed)} failed; "
+          f"{km_saved:.1f} km saved vs greedy ({greedy_km:.1f} -> {planned_km:.1f} km)")
+    return {
+        "selection": selection,
+        "strategy": strategy,
+        "sizes": sizes,
+        "plans_written": plans,
+        "branches_planned": len(planned),
+        "branches_skipped": len(skipped),
+        "branches_failed": sorted(failed),
+        "seconds": round(elapsed, 3),
+        "branches_per_second": round(rate, 2),
+        "greedy_distance_km": round(greedy_km, 2),
+        "total_distance_km": round(planned_km, 2),
+        "km_saved_vs_greedy": round(km_saved, 2),
+    }
+
+
+# --------------------------
+# 3) Read used by /planning/route
+# --------------------------
+def read_route_plan(conn, branch, selection, strategy, num_clients):
+    """The stored plan for exactly this request, or None if missing / stale / not built yet."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            """
+            SELECT plan_json, planned_at FROM route_plan
+            WHERE branch_key = %s AND selection = %s AND strategy = %s AND num_clients = %s
+              AND planned_at >= NOW() - INTERVAL %s HOUR
+            """,
+            (branch.strip(), selection, strategy, num_clients, PLAN_MAX_AGE_HOURS)
+        )
+        row = cursor.fetchone()
+    except errors.ProgrammingError:
+        # route_plan does not exist yet
+        return None
+    finally:
+        cursor.close()
+    if not row:
+        return None
+    plan = json.loads(row[0])
+    plan["precomputed"] = True
+    plan["planned_at"] = row[1].isoformat() if row[1] else None
+    return plan
+
+
+if __name__ == "__main__":
+    from services.db import db_connection
+
+    parser = argparse.ArgumentParser(description="Plan routes for every branch and store them in route_plan.")
+    parser.add_argument("--selection", default="nearest", choices=SELECTIONS)
+    parser.add_argument("--sizes", default=",".join(map(str, PLAN_SIZES)),
+                        help="comma-separated num_clients values to plan per branch")
+    parser.add_argument("--strategy", default=DEFAULT_STRATEGY, choices=STRATEGIES)
+    parser.add_argument("--time-budget-ms", type=int, default=DEFAULT_TIME_BUDGET_MS)
+    parser.add_argument("--workers", type=int, default=PLAN_WORKERS)
+    args = parser.parse_args()
+
+    with db_connection() as conn:
+        print(plan_network(
+            conn, args.selection, [int(n) for n in args.sizes.split(",") if n.strip()], args.strategy,
+            args.time_budget_ms,
+            api_key=os.getenv("FINSIGHT_GOOGLE_MAPS_API_KEY") or None, workers=args.workers
+        ))
@@ -0,0 +1,385 @@
+# summary_tables.py
+# -----------------------------------------------
+# 🧮 Purpose: Materialized branch-level KPI summaries for the dashboard.
+# /api/kpis and /api/delinquency read these small rollup tables instead of
+# re-aggregating loan_repayment / arrears on every page load, so reads scale
+# with (branches x days) rather than with the number of repayment rows.
+#
+# Tables:
+#   branch_daily_summary  - per branch, per day: principal due/collected,
+#                           installments, amount disbursed, new clients
+#   branch_summary        - per branch snapshot of non-additive counts
+#                           (active loans, customers with repayments, clients)
+#   branch_dpd_summary    - per branch histogram of delinquent clients by dpd_days
+#   summary_state         - refresh watermark + global max dpd
+#
+# Refresh is incremental: only branches with loan_repayment / loan rows
+# created or modified since the last watermark are rebuilt. After a load,
+# run_load (services/load_orchestrator.py) rebuilds the branches of the
+# loaded loans, repayments and arrears rows (arrears has no timestamps), or
+# every branch when client / office / org rows changed.
+#
+# Run manually with:  python -m services.summary_tables [--full]
+# -----------------------------------------------
+
+import sys
+import uuid
+from datetime import datetime
+
+from mysql.connector import errors
+
+from services.delta_load import ensure_delta_tables, log_bulk_load, notify_change
+from services.kpi_engine import kpi_windows, shape_kpis
+
+BRANCH_EXPR = "o.branch_key"
+UNDATED = "9999-12-31"   # bucket for installments without a due date (never inside a KPI window)
+REFRESH_BATCH = 50        # branches rebuilt per transaction
+
+SUMMARY_TABLES = ("branch_daily_summary", "branch_summary", "branch_dpd_summary")
+
+SUMMARY_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS branch_daily_summary (
+        branch VARCHAR(100) NOT NULL,
+        summary_date DATE NOT NULL,
+        principal_due DECIMAL(20, 2) NOT NULL DEFAULT 0,
+        principal_collected DECIMAL(20, 2) NOT NULL DEFAULT 0,
+        installments INT NOT NULL DEFAULT 0,
+        disbursed_amount DECIMAL(20, 2) NOT NULL DEFAULT 0,
+        new_clients INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (branch, summary_date)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS branch_summary (
+        branch VARCHAR(100) NOT NULL PRIMARY KEY,
+        active_loans INT NOT NULL DEFAULT 0,
+        repaying_customers INT NOT NULL DEFAULT 0,
+        total_clients INT NOT NULL DEFAULT 0,
+        refreshed_at DATETIME NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS branch_dpd_summary (
+        branch VARCHAR(100) NOT NULL,
+        dpd_days INT NOT NULL,
+        customer_count INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (branch, dpd_days)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS summary_state (
+        state_key VARCHAR(64) NOT NULL PRIMARY KEY,
+        state_value VARCHAR(64) NULL
+    )
+    """,
+]
+
+
+# --------------------------
+# 1) Rebuild statements (parameterised by a branch IN (...) list)
+# --------------------------
+DAILY_INSERT = f"""
+INSERT INTO branch_daily_summary
+    (branch, summary_date, principal_due, principal_collected, installments, disbursed_amount, new_clients)
+SELECT branch, summary_date,
+       COALESCE(SUM(principal_due), 0), COALESCE(SUM(principal_collected), 0),
+       SUM(installments), COALESCE(SUM(disbursed_amount), 0), SUM(new_clients)
+FROM (
+    SELECT {BRANCH_EXPR} AS branch, COALESCE(lr.duedate, '{UNDATED}') AS summary_date,
+           lr.principal_amount AS principal_due, lr.principal_completed_derived AS principal_collected,
+           1 AS installments, 0 AS disbursed_amount, 0 AS new_clients
+    FROM loan_repayment lr
+    JOIN loan l ON lr.loan_id = l.id
+    JOIN client c ON l.client_id = c.id
+    JOIN office o ON c.office_id = o.id
+    WHERE {BRANCH_EXPR} IN ({{branches}})
+    UNION ALL
+    SELECT {BRANCH_EXPR}, l.approvedon_date, 0, 0, 0, l.principal_disbursed_derived, 0
+    FROM loan l
+    JOIN client c ON l.client_id = c.id
+    JOIN office o ON c.office_id = o.id
+    WHERE l.approvedon_date IS NOT NULL AND {BRANCH_EXPR} IN ({{branches}})
+    UNION ALL
+    SELECT {BRANCH_EXPR}, fl.first_loan_date, 0, 0, 0, 0, 1
+    FROM (
+        SELECT client_id, MIN(approvedon_date) AS first_loan_date
+        FROM loan
+        GROUP BY client_id
+    ) fl
+    JOIN client c ON fl.client_id = c.id
+    JOIN office o ON c.office_id = o.id
+    WHERE fl.first_loan_date IS NOT NULL AND {BRANCH_EXPR} IN ({{branches}})
+) rows_by_day
+GROUP BY branch, summary_date
+"""
+
+SNAPSHOT_INSERT = f"""
+INSERT INTO branch_summary (branch, active_loans, repaying_customers, total_clients, refreshed_at)
+SELECT k.branch, COALESCE(r.active_loans, 0), COALESCE(r.repaying_customers, 0), k.total_clients, NOW()
+FROM (
+    SELECT {BRANCH_EXPR} AS branch, COUNT(DISTINCT c.id) AS total_clients
+    FROM client c
+    JOIN office o ON c.office_id = o.id
+    WHERE {BRANCH_EXPR} IN ({{branches}})
+    GROUP BY branch
+) k
+LEFT JOIN (
+    SELECT {BRANCH_EXPR} AS branch,
+           COUNT(DISTINCT lr.loan_id) AS active_loans,
+           COUNT(DISTINCT c.id) AS repaying_customers
+    FROM loan_repayment lr
+    JOIN loan l ON lr.loan_id = l.id
+    JOIN client c ON l.client_id = c.id
+    JOIN office o ON c.office_id = o.id
+    WHERE {BRANCH_EXPR} IN ({{branches}})
+    GROUP BY branch
+) r ON r.branch = k.branch
+"""
+
+# Same arrears -> client join as the live /delinquency queries. arrears holds one
+# row per loan_id, so each client lands in exactly one dpd_days cell and the
+# histogram sums back to the live COUNT(DISTINCT c.id) figures.
+DPD_INSERT = f"""
+INSERT INTO branch_dpd_summary (branch, dpd_days, customer_count)
+SELECT {BRANCH_EXPR} AS branch, a.dpd_days, COUNT(DISTINCT c.id)
+FROM arrears a
+JOIN client c ON a.loan_id = c.id
+JOIN office o ON c.office_id = o.id
+WHERE a.dpd_days > 0 AND {BRANCH_EXPR} IN ({{branches}})
+GROUP BY branch, a.dpd_days
+"""
+
+CHANGED_BRANCHES_QUERY = f"""
+SELECT DISTINCT {BRANCH_EXPR} AS branch
+FROM loan_repayment lr
+JOIN loan l ON lr.loan_id = l.id
+JOIN client c ON l.client_id = c.id
+JOIN office o ON c.office_id = o.id
+WHERE lr.created_date >= %(since)s OR lr.lastmodified_date >= %(since)s
+UNION
+SELECT DISTINCT {BRANCH_EXPR}
+FROM loan l
+JOIN client c ON l.client_id = c.id
+JOIN office o ON c.office_id = o.id
+WHERE l.submittedon_date >= %(since)s OR l.approvedon_date >= %(since)s
+"""
+
+
+# --------------------------
+# 2) Refresh
+# --------------------------
+def ensure_summary_tables(conn):
+    cursor = conn.cursor()
+    for ddl in SUMMARY_DDL:
+        cursor.execute(ddl)
+    cursor.close()
+    conn.commit()
+
+
+def _get_state(cursor, key):
+    cursor.execute("SELECT state_value FROM summary_state WHERE state_key = %s", (key,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _set_state(cursor, key, value):
+    cursor.execute(
+        "INSERT INTO summary_state (state_key, state_value) VALUES (%s, %s) "
+        "ON DUPLICATE KEY UPDATE state_value = VALUES(state_value)",
+        (key, value)
+    )
+
+
+def _all_branches(cursor):
+    cursor.execute(f"SELECT DISTINCT {BRANCH_EXPR} FROM office o")
+    return [row[0] for row in cursor.fetchall() if row[0] is not None]
+
+
+def changed_branches(conn, since):
+    """Branches that have repayment / loan rows created or modified on or after `since`."""
+    cursor = conn.cursor()
+    cursor.execute(CHANGED_BRANCHES_QUERY, {"since": since})
+    branches = [row[0] for row in cursor.fetchall() if row[0] is not None]
+    cursor.close()
+    return branches
+
+
+def _rebuild_branches(conn, branches):
+    """Deletes and recomputes every summary row for the given branches, one transaction per batch."""
+    cursor = conn.cursor()
+    for start in range(0, len(branches), REFRESH_BATCH):
+        batch = branches[start:start + REFRESH_BATCH]
+        placeholders = ", ".join(["%s"] * len(batch))
+        try:
+            for table in SUMMARY_TABLES:
+                cursor.execute(f"DELETE FROM {table} WHERE branch IN ({placeholders})", batch)
+            # Each template repeats the IN list once per sub-select
+            for template in (DAILY_INSERT, SNAPSHOT_INSERT, DPD_INSERT):
+                cursor.execute(template.format(branches=placeholders), batch * template.count("{branches}"))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    cursor.close()
+
+
+def refresh_summaries(conn, branches=None, full=False):
+    """
+    Brings the summary tables up to date.
+    - full=True (or first run): rebuild every branch
+    - branches=[...]: rebuild exactly these branches (e.g. after an arrears reload)
+    - otherwise: rebuild branches with rows changed since the last watermark
+    Returns a small report dict.
+    """
+    started = datetime.now()
+    ensure_summary_tables(conn)
+    ensure_delta_tables(conn)
+    cursor = conn.cursor()
+
+    watermark = _get_state(cursor, "watermark")
+    if full or watermark is None:
+        mode = "full"
+        branches = _all_branches(cursor)
+    elif branches is not None:
+        mode = "explicit"
+    else:
+        mode = "incremental"
+        branches = changed_branches(conn, watermark)
+
+    branches = sorted(set(b.strip() for b in branches if b))
+    if branches:
+        _rebuild_branches(conn, branches)
+
+    # Global max dpd drives the bucket scale factor in /delinquency
+    cursor.execute("SELECT MAX(dpd_days) FROM arrears WHERE dpd_days IS NOT NULL")
+    max_dpd = cursor.fetchone()[0]
+    _set_state(cursor, "max_dpd", str(max_dpd or 1))
+    # Date columns are DATE-typed, so the watermark is inclusive of today's rows
+    _set_state(cursor, "watermark", started.strftime("%Y-%m-%d"))
+    # Cached /kpis and /delinquency results are stale now: tell this process's
+    # listeners, and other processes through the change log they poll
+    if branches:
+        run_id = uuid.uuid4().hex
+        for table in SUMMARY_TABLES:
+            log_bulk_load(cursor, run_id, table)
+    conn.commit()
+    cursor.close()
+    if branches:
+        notify_change(SUMMARY_TABLES)
+
+    elapsed = (datetime.now() - started).total_seconds()
+    print(f"[Summary] {mode} refresh rebuilt {len(branches)} branches in {elapsed:.2f}s")
+    return {"mode": mode, "branches_refreshed": len(branches), "seconds": round(elapsed, 3)}
+
+
+# --------------------------
+# 3) Reads used by the API routes
+# --------------------------
+def summaries_ready(conn):
+    """True once a refresh has completed (summary tables exist and carry a watermark)."""
+    cursor = conn.cursor()
+    try:
+        return _get_state(cursor, "watermark") is not None
+    except errors.ProgrammingError:
+        # summary_state does not exist yet
+        return False
+    finally:
+        cursor.close()
+
+
+SUMMARY_KPI_QUERY = """
+SELECT
+    d.total_disbursed, d.total_collected, d.expected_till_june, d.collected_till_june,
+    d.new_customers, d.prev_customers,
+    s.active_loans, s.total_customers
+FROM (
+    SELECT
+        SUM(principal_due) AS total_disbursed,
+        SUM(principal_collected) AS total_collected,
+        SUM(CASE WHEN summary_date <= %(cutoff)s THEN principal_due ELSE 0 END) AS expected_till_june,
+        SUM(CASE WHEN summary_date <= %(cutoff)s THEN principal_collected ELSE 0 END) AS collected_till_june,
+        SUM(CASE WHEN summary_date >= %(last_month_start)s AND summary_date < %(this_month_start)s
+                 THEN new_clients ELSE 0 END) AS new_customers,
+        SUM(CASE WHEN summary_date >= %(prev_month_start)s AND summary_date < %(last_month_start)s
+                 THEN new_clients ELSE 0 END) AS prev_customers
+    FROM branch_daily_summary
+    {branch_filter}
+) d
+CROSS JOIN (
+    SELECT SUM(active_loans) AS active_loans, SUM(repaying_customers) AS total_customers
+    FROM branch_summary
+    {branch_filter}
+) s
+"""
+
+
+def read_kpis(conn, branch=None):
+    """/api/kpis figures from the rollups, or None if summaries have not been built yet."""
+    if not summaries_ready(conn):
+        return None
+    params = kpi_windows()
+    branch_filter = ""
+    if branch:
+        params["branch"] = branch.strip()
+        branch_filter = "WHERE branch = %(branch)s"
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(SUMMARY_KPI_QUERY.format(branch_filter=branch_filter), params)
+    row = cursor.fetchone()
+    cursor.close()
+    return shape_kpis(row)
+
+
+def read_delinquency_counts(conn, branch=None):
+    """
+    Inputs for /api/delinquency from the rollups, or None if not built yet.
+    Returns (bucket_results, total_clients, delinquent_count) in the same
+    shape as the live queries.
+    """
+    if not summaries_ready(conn):
+        return None
+    # State lookups index rows by position: plain cursor
+    cursor = conn.cursor()
+    max_dpd = float(_get_state(cursor, "max_dpd") or 1)
+    cursor.close()
+    cursor = conn.cursor(dictionary=True)
+    scale_factor = 90 / max_dpd if max_dpd > 90 else 1
+
+    where, params = "", []
+    if branch:
+        where, params = " AND branch = %s", [branch.strip()]
+
+    cursor.execute(
+        f"""
+        SELECT
+            CASE
+                WHEN ROUND(dpd_days * {scale_factor}) BETWEEN 1 AND 30 THEN '1-30 Days'
+                WHEN ROUND(dpd_days * {scale_factor}) BETWEEN 31 AND 60 THEN '31-60 Days'
+                ELSE '60+ Days'
+            END AS bucket,
+            CAST(SUM(customer_count) AS SIGNED) AS customer_count
+        FROM branch_dpd_summary
+        WHERE dpd_days > 0{where}
+        GROUP BY bucket
+        """,
+        params
+    )
+    bucket_results = cursor.fetchall()
+
+    cursor.execute(
+        "SELECT COALESCE(SUM(total_clients), 0) AS total FROM branch_summary"
+        + (" WHERE branch = %s" if branch else ""),
+        params
+    )
+    total_clients = int(cursor.fetchone()["total"])
+    cursor.close()
+
+    delinquent_count = sum(b["customer_count"] for b in bucket_results)
+    return bucket_results, total_clients, delinquent_count
+
+
+if __name__ == "__main__":
+    from services.db import db_connection
+
+    with db_connection() as conn:
+        print(refresh_summaries(conn, full="--full" in sys.argv))
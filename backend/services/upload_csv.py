@@ -1,153 +1,285 @@
+# upload_csv.py
+# -----------------------------------------------
+# 📤 Purpose: Bulk loader for the FinSight CSV / Excel extracts.
+# Files are streamed in chunks of CHUNK_ROWS rows (bounded memory), typed and
+# validated column-wise against the table schema (services/ingest_schema.py),
+# and inserted with executemany in batches of BATCH_ROWS rows (mysql.connector
+# sends one multi-row INSERT per batch), committing after every batch.
+# Rows that fail validation go to data/quarantine/<file>.rejected.csv in bulk;
+# a batch MySQL still rejects is retried row by row so one bad row only skips
+# itself (and is quarantined too). Each file reports rows/s.
+#
+# Limits (environment variables):
+#   FINSIGHT_LOAD_CHUNK_ROWS   rows read from the file at a time   (default 50000)
+#   FINSIGHT_LOAD_BATCH_ROWS   rows per INSERT / commit            (default 5000)
+#
+# Run from backend/ with:  python -m services.upload_csv
+# -----------------------------------------------
+
 import os
-import mysql.connector
+import time
+
+import numpy as np
 import pandas as pd
 
+from services.ingest_schema import NULL_TOKENS, Quarantine, clean_chunk, derived_cols, text_columns
+
 # Base setup
-BASE_DIR = os.path.dirname(os.path.dirname(__file__))  # backend/
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # backend/
 DATA_DIR = os.path.join(BASE_DIR, "data")
+CHUNK_ROWS = int(os.getenv("FINSIGHT_LOAD_CHUNK_ROWS", "50000"))
+BATCH_ROWS = int(os.getenv("FINSIGHT_LOAD_BATCH_ROWS", "5000"))
+MAX_ROW_ERRORS_LOGGED = 20   # per file; the rest are only counted
 
-# MySQL connection
-conn = mysql.connector.connect(
-    host="localhost",
-    user="root",
-    password="BtKQ@448",
-    database="FinSight"
-)
-cursor = conn.cursor()
-
-# Date columns to handle
-date_cols = [
-    'fromdate', 'duedate', 'created_date', 'lastmodified_date', 'emi_cleared_on',
-    'submittedon_date', 'approvedon_date', 'activation_date', 'closedon_date',
-    'calculated_maturedon_date', 'opening_date', 'overdue_since_date_derived','date_of_birth','submittedon_date',
-    'office_joining_date','reactivated_on_date'
-]
+# Tables whose new rows can change advisor facts, and the column holding the loan id
+alert_loan_columns = {
+    "loan": "id",
+    "loan_repayment": "loan_id",
+    "arrears": "loan_id",
+}
 
-# Optional: Preload loan ids for foreign key validation
-cursor.execute("SELECT id FROM loan")
-valid_loan_ids = set(row[0] for row in cursor.fetchall())
 
-def insert_csv_to_table(file_name, table_name, columns, is_excel=False):
-    file_path = os.path.join(DATA_DIR, file_name)
+# --------------------------
+# 1) Reading (one chunk at a time; cleaning is services/ingest_schema.py)
+# --------------------------
+def read_chunks(file_path, is_excel=False, chunk_rows=CHUNK_ROWS, skip_rows=0, table_name=None):
+    """
+    Yields DataFrames of at most chunk_rows rows, starting after the first
+    skip_rows data rows. Text / date columns of table_name are read as text
+    (every column without a table_name); clean_chunk types them.
+    """
+    dtype = text_columns(table_name) if table_name else str
+    if is_excel:
+        # openpyxl cannot stream through pandas; the Excel extracts (org) are small
+        df = pd.read_excel(file_path, dtype=dtype, na_values=NULL_TOKENS).iloc[skip_rows:]
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+    else:
+        skip = range(1, skip_rows + 1) if skip_rows else None
+        yield from pd.read_csv(
+            file_path, chunksize=chunk_rows, dtype=dtype, na_values=NULL_TOKENS, skiprows=skip, low_memory=False
+        )
 
-    # Load file
-    df = pd.read_excel(file_path) if is_excel else pd.read_csv(file_path)
 
-    # Clean data
-    df.columns = df.columns.str.strip()  # Strip column names
-    df = df.where(pd.notnull(df), None)  # Replace NaNs with None
-    df = df.replace({pd.NA: None, 'nan': None, 'NaN': None, 'NAN': None, '': None})
+def chunk_rows_as_tuples(df, columns):
+    """Column-wise conversion to DB values: missing -> None, numpy / pandas scalars -> Python."""
+    values = []
+    for col in columns:
+        series = df[col]
+        values.append(series.astype(object).where(series.notna(), None).tolist())
+    return list(zip(*values))
 
-    # Format date columns
-    for col in date_cols:
-        if col in df.columns:
-            df[col] = pd.to_datetime(df[col], errors='coerce', dayfirst=True).dt.strftime('%Y-%m-%d')
-            df[col] = df[col].where(pd.notnull(df[col]), None)
 
-    # Insert rows
-    # Insert rows
-    for index, row in df.iterrows():
+def split_chunk(conn, raw, table_name, first_row, quarantine, references=None):
+    """
+    Cleans one raw chunk and sends its rejected rows to the quarantine file.
+    Returns (typed rows that can be loaded, their 1-based file row numbers, dates coerced).
+    """
+    df, reasons, coerced = clean_chunk(raw, table_name, conn, references)
+    row_numbers = np.arange(first_row + 1, first_row + len(raw) + 1)
+    rejected = pd.notna(reasons)
+    if rejected.any():
+        quarantine.add(raw[rejected], reasons[rejected], row_numbers[rejected])
+        df, row_numbers = df[~rejected], row_numbers[~rejected]
+    return df, row_numbers, coerced
+
+
+# --------------------------
+# 2) Inserting (executemany batches, commit per batch)
+# --------------------------
+def insert_batch(conn, cursor, sql, rows, table_name, row_numbers, rows_done, errors_seen,
+                 checkpoint=None, quarantine=None, columns=None):
+    """
+    Inserts one batch; falls back to row-by-row when MySQL rejects it. Returns rows inserted.
+    Rows MySQL rejects go to the quarantine file (when given). checkpoint(cursor, rows_done)
+    runs inside the batch's transaction, so the recorded progress and the inserted
+    rows commit (or roll back) together.
+    """
+    try:
+        if rows:
+            cursor.executemany(sql, rows)
+        if checkpoint:
+            checkpoint(cursor, rows_done)
+        conn.commit()
+        return len(rows)
+    except Exception:
+        conn.rollback()
+
+    inserted = 0
+    failed, failed_numbers, failed_reasons = [], [], []
+    for row, row_number in zip(rows, row_numbers):
         try:
-            values = tuple(
-                None if pd.isna(row[col]) or str(row[col]).lower() == "nan"
-                else row[col].item() if hasattr(row[col], "item") else row[col]
-                for col in columns
-            )
-            placeholders = ','.join(['%s'] * len(columns))
-            cursor.execute(
-                f"INSERT INTO {table_name} ({','.join(columns)}) VALUES ({placeholders})",
-                values
-            )
+            cursor.execute(sql, row)
+            inserted += 1
         except Exception as e:
-            print(f"❌ Error inserting row {index + 1} in {table_name}: {e}")
+            errors_seen[0] += 1
+            failed.append(row)
+            failed_numbers.append(row_number)
+            failed_reasons.append(f"mysql: {e}")
+            if errors_seen[0] <= MAX_ROW_ERRORS_LOGGED:
+                print(f"❌ Error inserting row {row_number} in {table_name}: {e}")
+    if checkpoint:
+        checkpoint(cursor, rows_done)
+    conn.commit()
+    if quarantine is not None and failed:
+        quarantine.add_rows(columns, failed, failed_reasons, failed_numbers)
+    return inserted
 
 
-    conn.commit()
-    print(f"✅ {len(df)} rows attempted in `{table_name}` from {file_name}.")
+def insert_csv_to_table(conn, file_name, table_name, columns, is_excel=False,
+                        chunk_rows=CHUNK_ROWS, batch_rows=BATCH_ROWS, start_row=0, checkpoint=None,
+                        references=None):
+    """
+    Streams one file into `table_name`. Returns a small report (rows, rows/s, loan ids).
+    start_row skips data rows a previous run already committed; checkpoint is
+    called with the number of file rows done inside every batch transaction.
+    references (ingest_schema.ReferenceIds) turns on foreign key checks; rows that
+    fail cleaning or the checks go to data/quarantine/<file>.rejected.csv.
+    """
+    file_path = os.path.join(DATA_DIR, file_name)
+    started = time.perf_counter()
+    loan_col = alert_loan_columns.get(table_name)
+    quarantine = Quarantine(file_name, append=start_row > 0)
+
+    cursor = conn.cursor()
+    total, inserted, coerced = start_row, 0, 0
+    errors_seen = [0]
+    loan_ids = set()
+    sql = None
+    for raw in read_chunks(file_path, is_excel, chunk_rows, start_row, table_name):
+        raw.columns = raw.columns.str.strip()
+        if sql is None:
+            # Derived columns (e.g. branch_key) only when the file has their source column
+            columns = list(columns) + [
+                c for c, source in derived_cols.get(table_name, {}).items() if source in raw.columns and c not in columns
+            ]
+            placeholders = ','.join(['%s'] * len(columns))
+            sql = f"INSERT INTO {table_name} ({','.join(columns)}) VALUES ({placeholders})"
+        missing = [c for c in columns if c not in raw.columns and c not in derived_cols.get(table_name, {})]
+        if missing:
+            cursor.close()
+            raise ValueError(f"{file_name} has no column(s) {', '.join(missing)} for table {table_name}")
+
+        chunk, row_numbers, chunk_coerced = split_chunk(conn, raw, table_name, total, quarantine, references)
+        coerced += chunk_coerced
+        rows = chunk_rows_as_tuples(chunk, columns)
+        chunk_end = total + len(raw)
+        # A chunk whose rows were all quarantined still records its progress
+        for start in range(0, max(len(rows), 1), batch_rows):
+            stop = min(start + batch_rows, len(rows))
+            rows_done = int(row_numbers[stop - 1]) if stop < len(rows) else chunk_end
+            inserted += insert_batch(
+                conn, cursor, sql, rows[start:stop], table_name, row_numbers[start:stop], rows_done,
+                errors_seen, checkpoint, quarantine, columns
+            )
+        if loan_col and len(chunk):
+            loan_ids.update(int(v) for v in chunk[loan_col].dropna().unique())
+        total = chunk_end
+    cursor.close()
+
+    elapsed = time.perf_counter() - started
+    processed = total - start_row
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    resumed = f" (resumed after row {start_row})" if start_row else ""
+    print(f"✅ {inserted}/{processed} rows inserted into `{table_name}` from {file_name}{resumed} "
+          f"in {elapsed:.1f}s ({rate:,.0f} rows/s), {quarantine.count} quarantined, {coerced} unreadable dates.")
+    return {
+        "file": file_name,
+        "table": table_name,
+        "rows": processed,
+        "resumed_from_row": start_row,
+        "inserted": inserted,
+        "rejected": quarantine.count,
+        "dates_coerced": coerced,
+        "quarantine_file": quarantine.path if quarantine.count else None,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(rate, 1),
+        "loan_ids": loan_ids,
+    }
 
-# 📥 List of files to load
+# 📥 List of files to load (files missing from data/ are skipped;
+# load order and parallelism come from services/load_orchestrator.py).
+# "key" = the columns that identify a row (used by delta loads, services/delta_load.py)
 load_tasks = [
-    # {
-    #     "file": "new_group.csv",
-    #     "table": "group_",
-    #     "columns": [
-    #         "id", "status_enum", "activation_date", "office_id",
-    #         "staff_id", "display_name", "hierarchy",
-    #         "closedon_date", "account_no", "version"
-    #     ]
-    # },
-    # {
-    #     "file": "new_loan.csv",
-    #     "table": "loan",
-    #     "columns": [
-    #         "id", "account_no", "client_id", "group_id", "product_id", "loan_officer_id",
-    #         "principal_amount_proposed", "approved_principal", "annual_nominal_interest_rate",
-    #         "number_of_repayments", "submittedon_date", "approvedon_date", "principal_disbursed_derived",
-    #         "principal_outstanding_derived", "interest_charged_derived", "interest_outstanding_derived",
-    #         "fee_charges_charged_derived", "total_expected_repayment_derived",
-    #         "total_outstanding_derived", "fixed_emi_amount", "broken_period_interest",
-    #         "calculated_maturedon_date"
-    #     ]
-    # },
-    # {
-    #     "file": "new_client.csv",
-    #     "table": "client",
-    #     "columns": [
-    #         "id", "account_no", "office_joining_date", "office_id", "staff_id",
-    #         "display_name", "date_of_birth", "submittedon_date", "activatedon_userid",
-    #         "closedon_userid", "client_classification_cv_id", "reactivated_on_date",
-    #         "reactivated_on_userid"
-    #     ]
-    # },
-
-    # {
-    #     "file": "new_loan_repayment.csv",
-    #     "table": "loan_repayment",
-    #     "columns": [
-    #         "id", "loan_id", "fromdate", "duedate", "installment", "principal_amount",
-    #         "principal_completed_derived", "interest_amount", "interest_completed_derived",
-    #         "completed_derived", "createdby_id", "created_date", "lastmodifiedby_id",
-    #         "lastmodified_date", "emi_cleared_on"
-    #     ]
-    # },
-    # {
-    #     "file": "new_ORG.xlsx",
-    #     "table": "org",
-    #     "columns": [
-    #         "zone", "branch", "branch_name", "zonal_head", "cm_id",
-    #         "circle_manager", "actual_state", "zh_id"
-    #     ],
-    #     "is_excel": True
-    # },
-    # {
-    #     "file": "new_office.csv",
-    #     "table": "office",
-    #     "columns": [
-    #         "id", "hierarchy", "name", "opening_date",
-    #         "bm_staff_id", "activation_date", "activatedby_userid", "version"
-    #     ]
-    # },
-    # {
-    #     "file": "cleaned_arrears.csv",
-    #     "table": "arrears",
-    #     "columns": [
-    #         "loan_id", "principal_overdue_derived", "interest_overdue_derived",
-    #         "fee_charges_overdue_derived", "penalty_charges_overdue_derived",
-    #         "total_overdue_derived", "overdue_since_date_derived", "dpd_days"
-    #     ]
-    # },
+    {
+        "file": "new_group.csv",
+        "table": "group_",
+        "key": ["id"],
+        "columns": [
+            "id", "status_enum", "activation_date", "office_id",
+            "staff_id", "display_name", "hierarchy",
+            "closedon_date", "account_no", "version"
+        ]
+    },
+    {
+        "file": "new_loan.csv",
+        "table": "loan",
+        "key": ["id"],
+        "columns": [
+            "id", "account_no", "client_id", "group_id", "product_id", "loan_officer_id",
+            "principal_amount_proposed", "approved_principal", "annual_nominal_interest_rate",
+            "number_of_repayments", "submittedon_date", "approvedon_date", "principal_disbursed_derived",
+            "principal_outstanding_derived", "interest_charged_derived", "interest_outstanding_derived",
+            "fee_charges_charged_derived", "total_expected_repayment_derived",
+            "total_outstanding_derived", "fixed_emi_amount", "broken_period_interest",
+            "calculated_maturedon_date"
+        ]
+    },
+    {
+        "file": "new_client.csv",
+        "table": "client",
+        "key": ["id"],
+        "columns": [
+            "id", "account_no", "office_joining_date", "office_id", "staff_id",
+            "display_name", "date_of_birth", "submittedon_date", "activatedon_userid",
+            "closedon_userid", "client_classification_cv_id", "reactivated_on_date",
+            "reactivated_on_userid"
+        ]
+    },
+    {
+        "file": "new_loan_repayment.csv",
+        "table": "loan_repayment",
+        "key": ["id"],
+        "columns": [
+            "id", "loan_id", "fromdate", "duedate", "installment", "principal_amount",
+            "principal_completed_derived", "interest_amount", "interest_completed_derived",
+            "completed_derived", "createdby_id", "created_date", "lastmodifiedby_id",
+            "lastmodified_date", "emi_cleared_on"
+        ]
+    },
+    {
+        "file": "new_ORG.xlsx",
+        "table": "org",
+        "key": ["branch"],
+        "columns": [
+            "zone", "branch", "branch_name", "zonal_head", "cm_id",
+            "circle_manager", "actual_state", "zh_id"
+        ],
+        "is_excel": True
+    },
+    {
+        "file": "new_office.csv",
+        "table": "office",
+        "key": ["id"],
+        "columns": [
+            "id", "hierarchy", "name", "opening_date",
+            "bm_staff_id", "activation_date", "activatedby_userid", "version"
+        ]
+    },
+    {
+        "file": "cleaned_arrears.csv",
+        "table": "arrears",
+        "key": ["loan_id"],
+        "columns": [
+            "loan_id", "principal_overdue_derived", "interest_overdue_derived",
+            "fee_charges_overdue_derived", "penalty_charges_overdue_derived",
+            "total_overdue_derived", "overdue_since_date_derived", "dpd_days"
+        ]
+    },
 ]
 
-# 🔁 Load all files
-for task in load_tasks:
-    insert_csv_to_table(
-        file_name=task["file"],
-        table_name=task["table"],
-        columns=task["columns"],
-        is_excel=task.get("is_excel", False)
-    )
 
-# Cleanup
-cursor.close()
-conn.close()
+if __name__ == "__main__":
+    from services.load_orchestrator import main
 
+    main()
@@ -0,0 +1,10 @@
+# conftest.py
+# -----------------------------------------------
+# 🧪 Purpose: Lets the tests import `services.*` / `ai_modules.*` the way the
+# app does (run from backend/ with:  python -m pytest tests)
+# -----------------------------------------------
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
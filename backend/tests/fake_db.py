@@ -0,0 +1,49 @@
+# fake_db.py
+# -----------------------------------------------
+# 🧪 Purpose: Minimal stand-in for a mysql.connector connection.
+# Every statement goes to handler(sql, params), which returns the result rows
+# as dicts (column -> value) or None. Cursors return tuples, or the dicts for
+# conn.cursor(dictionary=True) - like mysql.connector does.
+# -----------------------------------------------
+
+
+class FakeCursor:
+    def __init__(self, conn, dictionary=False):
+        self.conn = conn
+        self.dictionary = dictionary
+        self.rows = []
+
+    def execute(self, sql, params=()):
+        self.rows = self.conn.handler(" ".join(sql.split()), params) or []
+
+    def executemany(self, sql, seq_params):
+        for params in seq_params:
+            self.execute(sql, params)
+
+    def _shape(self, row):
+        return dict(row) if self.dictionary else tuple(row.values())
+
+    def fetchone(self):
+        return self._shape(self.rows.pop(0)) if self.rows else None
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return [self._shape(row) for row in rows]
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, handler):
+        self.handler = handler
+        self.commits = 0
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self, dictionary)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
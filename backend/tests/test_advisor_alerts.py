@@ -0,0 +1,102 @@
+# test_advisor_alerts.py
+# -----------------------------------------------
+# 🧪 Purpose: Alerts raised by a refresh are what /advisor and /advisor/alerts read back.
+# -----------------------------------------------
+
+import re
+from datetime import datetime
+
+import pytest
+
+from ai_modules.advisor_engine import load_rules
+from ai_modules.rule_compiler import FactTable, compile_rules
+from services import advisor_alerts
+from tests.fake_db import FakeConnection
+
+BRANCH_FACTS = {"branch_collection_rate_30d": 50, "customer_growth_30d": 1, "current_par_percent": 30}
+
+
+class AlertStore:
+    """The advisor_* tables in memory; answers the statements advisor_alerts runs."""
+
+    def __init__(self):
+        self.state, self.facts, self.alerts = {}, {}, []
+
+    def __call__(self, sql, params):
+        params = list(params)
+        if sql.startswith("CREATE TABLE"):
+            return None
+        if sql.startswith("SELECT state_value FROM advisor_state"):
+            return [{"state_value": self.state[params[0]]}] if params[0] in self.state else []
+        if sql.startswith("INSERT INTO advisor_state"):
+            self.state[params[0]] = params[1]
+            return None
+        if sql.startswith("SELECT DISTINCT branch_key FROM office"):
+            return [{"branch_key": "Deogarh"}, {"branch_key": "Gwalior"}]
+        if sql.startswith("SELECT id FROM client"):
+            return []
+        if sql.startswith("SELECT DISTINCT entity_id FROM advisor_fact"):
+            return [{"entity_id": key[1]} for key in self.facts if key[0] == params[0]]
+        if sql.startswith("SELECT 1 FROM advisor_fact WHERE entity_type = 'network'"):
+            return [{"1": 1}] if any(key[0] == "network" for key in self.facts) else []
+        if sql.startswith("SELECT entity_id, fact, fact_value FROM advisor_fact"):
+            return [{"entity_id": k[1], "fact": k[2], "fact_value": v}
+                    for k, v in self.facts.items() if k[0] == params[0] and k[1] in params[1:]]
+        if sql.startswith("INSERT INTO advisor_fact"):
+            self.facts[tuple(params[:3])] = params[3]
+            return None
+        if sql.startswith("SELECT id, entity_id, rule_name FROM advisor_alert"):
+            return [{"id": i, "entity_id": a["entity_id"], "rule_name": a["rule_name"]}
+                    for i, a in enumerate(self.alerts)
+                    if a["entity_type"] == params[0] and a["cleared_at"] is None and a["entity_id"] in params[1:]]
+        if sql.startswith("INSERT INTO advisor_alert"):
+            keys = ("entity_type", "entity_id", "branch_key", "rule_name", "alert", "recommendation")
+            self.alerts.append(dict(zip(keys, params), raised_at=datetime(2026, 1, 1), cleared_at=None))
+            return None
+        if sql.startswith("SELECT entity_type, entity_id, branch_key"):
+            rows = [a for a in self.alerts if a["entity_type"] == params[0]]
+            if "branch_key = %s" in sql:
+                rows = [a for a in rows if a["branch_key"] == params[1]]
+            if "cleared_at IS NULL" in sql:
+                rows = [a for a in rows if a["cleared_at"] is None]
+            return [dict(a) for a in rows[:params[-1]]]
+        raise AssertionError(f"unexpected statement: {sql}")
+
+
+def _fact_table(conn, scope, branch=None, ids=None):
+    ids = [str(i) for i in ids]
+    if scope == "clients":
+        return FactTable(ids, {"client_current_dpd": [0] * len(ids)})
+    branches = [None if scope == "network" else i for i in ids]
+    return FactTable(ids, {fact: [value] * len(ids) for fact, value in BRANCH_FACTS.items()}, branches)
+
+
+@pytest.fixture
+def refreshed(monkeypatch):
+    monkeypatch.setattr(advisor_alerts, "load_fact_table", _fact_table)
+    store = AlertStore()
+    conn = FakeConnection(store)
+    report = advisor_alerts.refresh_alerts(conn, compiled=compile_rules(load_rules(advisor_alerts.RULES_PATH)))
+    assert report["mode"] == "full" and report["raised"] > 0
+    return conn
+
+
+def test_no_alerts_before_first_refresh():
+    assert advisor_alerts.read_alerts(FakeConnection(AlertStore())) is None
+
+
+def test_branch_alerts_are_read_after_refresh(refreshed):
+    stored = advisor_alerts.read_alerts(refreshed, "Deogarh")
+
+    assert stored is not None and re.match(r"\d{4}-\d{2}-\d{2} ", stored["refreshed_at"])
+    assert stored["alerts"]
+    assert {a["branch"] for a in stored["alerts"]} == {"Deogarh"}
+    assert all(a["cleared_at"] is None for a in stored["alerts"])
+
+
+def test_network_alerts_have_one_row_per_rule(refreshed):
+    stored = advisor_alerts.read_alerts(refreshed, None, "network")
+
+    reasons = [a["reason"] for a in stored["alerts"]]
+    assert reasons and len(reasons) == len(set(reasons))
+    assert {a["entity_id"] for a in stored["alerts"]} == {"network"}
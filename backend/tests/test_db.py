@@ -0,0 +1,26 @@
+# test_db.py
+# -----------------------------------------------
+# 🧪 Purpose: A pool size mysql.connector cannot create is refused at import.
+# -----------------------------------------------
+
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _import_db(pool_size):
+    env = dict(os.environ, FINSIGHT_DB_POOL_SIZE=str(pool_size))
+    return subprocess.run([sys.executable, "-c", "import services.db"], cwd=BACKEND_DIR, env=env,
+                          capture_output=True, text=True, timeout=60)
+
+
+def test_pool_size_over_the_connector_limit_fails_clearly():
+    result = _import_db(33)
+    assert result.returncode != 0
+    assert "FINSIGHT_DB_POOL_SIZE=33: mysql.connector pools hold 1 to 32 connections." in result.stderr
+
+
+def test_pool_size_at_the_limit_is_accepted():
+    assert _import_db(32).returncode == 0
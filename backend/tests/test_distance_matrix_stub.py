@@ -0,0 +1,57 @@
+# test_distance_matrix_stub.py
+# -----------------------------------------------
+# 🧪 Purpose: Planning the same route twice against the local Distance Matrix
+# stub bills Google once; the second plan is served by the distance cache.
+# -----------------------------------------------
+
+import json
+import os
+import subprocess
+import sys
+import urllib.request
+
+from ai_modules.distance_matrix_stub import start_stub_server
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PLAN_ONE_ROUTE = """
+from ai_modules.route_optimizer import optimize_route
+
+start = {"id": "branch", "name": "Branch", "lat": 21.5, "lon": 84.7}
+clients = [
+    {"id": str(i), "name": f"Client {i}", "lat": 21.5 + 0.01 * (i % 4), "lon": 84.7 + 0.013 * (i // 4)}
+    for i in range(1, 13)
+]
+route = optimize_route(start, clients, api_key="stub-key", include_polyline=False)
+assert route["data_source"] == "Google Maps API", route["data_source"]
+"""
+
+
+def _stats(base_url):
+    with urllib.request.urlopen(f"{base_url}/stats", timeout=5) as resp:
+        return json.load(resp)
+
+
+def _plan_route(base_url, cache_path):
+    # A fresh process each time: the stub URL is read from the environment at import
+    env = dict(os.environ, FINSIGHT_GOOGLE_MAPS_BASE_URL=base_url, FINSIGHT_DISTANCE_CACHE_PATH=cache_path)
+    subprocess.run([sys.executable, "-c", PLAN_ONE_ROUTE], cwd=BACKEND_DIR, env=env, check=True,
+                   capture_output=True, timeout=60)
+
+
+def test_second_plan_fetches_no_new_elements(tmp_path):
+    server, base_url = start_stub_server()
+    try:
+        cache_path = str(tmp_path / "distance_cache.sqlite3")
+
+        _plan_route(base_url, cache_path)
+        first = _stats(base_url)
+        _plan_route(base_url, cache_path)
+        second = _stats(base_url)
+    finally:
+        server.shutdown()
+
+    assert first["matrix_elements"] > 0
+    assert first["failures"] == 0
+    assert second["matrix_elements"] == first["matrix_elements"]
+    assert second["matrix_requests"] == first["matrix_requests"]
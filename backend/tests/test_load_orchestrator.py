@@ -0,0 +1,59 @@
+from contextlib import contextmanager
+
+from services import load_orchestrator
+from tests.fake_db import FakeConnection
+
+
+@contextmanager
+def fake_connection():
+    yield FakeConnection(lambda sql, params: None)
+
+
+def test_failed_refresh_is_reported_not_raised(monkeypatch):
+    monkeypatch.setattr(load_orchestrator, "db_connection", fake_connection)
+
+    def refresh_alerts(conn, loan_ids):
+        raise RuntimeError("advisor_state is locked")
+
+    report = load_orchestrator._refresh_after_load("advisor alerts", refresh_alerts, loan_ids={1, 2})
+    assert report == {"step": "advisor alerts", "status": "failed", "error": "advisor_state is locked"}
+
+
+def test_refresh_gets_the_keyword_arguments(monkeypatch):
+    monkeypatch.setattr(load_orchestrator, "db_connection", fake_connection)
+    seen = {}
+
+    def refresh_alerts(conn, loan_ids):
+        seen["loan_ids"] = loan_ids
+
+    report = load_orchestrator._refresh_after_load("advisor alerts", refresh_alerts, loan_ids={7})
+    assert report == {"step": "advisor alerts", "status": "refreshed"}
+    assert seen == {"loan_ids": {7}}
+
+
+def _record_summary_refreshes(monkeypatch, ready=True):
+    from services import advisor_alerts, summary_tables
+
+    calls = []
+    monkeypatch.setattr(summary_tables, "summaries_ready", lambda conn: ready)
+    monkeypatch.setattr(summary_tables, "refresh_summaries", lambda conn, **kwargs: calls.append(kwargs))
+    monkeypatch.setattr(advisor_alerts, "entities_for_loans", lambda conn, loan_ids: ({"B1", "B2"}, {10, 11}))
+    return calls
+
+
+def test_loaded_loans_rebuild_only_their_branches(monkeypatch):
+    calls = _record_summary_refreshes(monkeypatch)
+    load_orchestrator._refresh_summaries_for_load(FakeConnection(lambda sql, params: None), {1, 2}, full=False)
+    assert calls == [{"branches": {"B1", "B2"}}]
+
+
+def test_branch_mapping_changes_rebuild_every_branch(monkeypatch):
+    calls = _record_summary_refreshes(monkeypatch)
+    load_orchestrator._refresh_summaries_for_load(FakeConnection(lambda sql, params: None), set(), full=True)
+    assert calls == [{"full": True}]
+
+
+def test_rollups_that_were_never_built_are_left_alone(monkeypatch):
+    calls = _record_summary_refreshes(monkeypatch, ready=False)
+    load_orchestrator._refresh_summaries_for_load(FakeConnection(lambda sql, params: None), {1}, full=False)
+    assert calls == []
@@ -0,0 +1,52 @@
+# test_model_registry.py
+# -----------------------------------------------
+# 🧪 Purpose: Branch requests resolve to the models the training job writes.
+# -----------------------------------------------
+
+import json
+
+from services import model_registry
+from services.model_artifacts import PROPHET_JSON_EXT
+
+
+def _write_model(models_dir, metric, scope_path):
+    path = models_dir / scope_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.with_name(path.name + PROPHET_JSON_EXT).write_text("{}")
+    path.with_name(path.name + ".json").write_text(json.dumps({"freq": "D", "periods": 30}))
+
+
+def test_branch_key_matches_office_branch_key():
+    assert model_registry.branch_key("087:Deogarh") == "Deogarh"
+    assert model_registry.branch_key("Deogarh") == "Deogarh"
+    assert model_registry.branch_slug("254:Mungra Badshahpur") == "mungra_badshahpur"
+
+
+def test_ui_branch_loads_branch_model(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_registry, "MODELS_DIR", str(tmp_path))
+    monkeypatch.setattr(model_registry, "FORECAST_BACKEND", "prophet")
+    monkeypatch.setattr(model_registry, "load_artifact", lambda path: ("model", path))
+    _write_model(tmp_path, "disbursement", "disbursement_forecast_model")
+    # Where forecast_training writes the model of office.branch_key "Deogarh"
+    _write_model(tmp_path, "disbursement", "disbursement/" + model_registry.branch_slug("Deogarh"))
+
+    # What Forecast.jsx sends
+    model, meta, ref = model_registry.ModelRegistry().get("disbursement", "087:Deogarh")
+
+    assert ref.scope == "deogarh"
+    assert model == ("model", str(tmp_path / "disbursement" / ("deogarh" + PROPHET_JSON_EXT)))
+    assert meta["periods"] == 30
+
+
+def test_branch_without_model_falls_back_to_global(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_registry, "MODELS_DIR", str(tmp_path))
+    monkeypatch.setattr(model_registry, "FORECAST_BACKEND", "prophet")
+    _write_model(tmp_path, "collections", "collections_forecast_model")
+
+    ref = model_registry.resolve_model("collections", "167:Gwalior")
+
+    assert ref.scope == model_registry.GLOBAL_SCOPE
+
+
+def test_hot_branches_are_normalized():
+    assert model_registry.parse_branches("087:Deogarh, Deogarh ,167:Gwalior,") == ["Deogarh", "Gwalior"]
@@ -0,0 +1,31 @@
+# test_query_cache.py
+# -----------------------------------------------
+# 🧪 Purpose: change log polling for loads done by other processes.
+# -----------------------------------------------
+
+from services import query_cache
+from tests.fake_db import FakeConnection
+
+
+def _change_log(rows):
+    def handler(sql, params):
+        if sql.startswith("SELECT COALESCE(MAX(id), 0) FROM load_change_log"):
+            return [{"newest": max([0] + [row_id for row_id, _ in rows])}]
+        if sql.startswith("SELECT table_name, COUNT(*) FROM load_change_log WHERE id > %s"):
+            tables = {}
+            for row_id, table in rows:
+                if row_id > params[0]:
+                    tables[table] = tables.get(table, 0) + 1
+            return [{"table_name": t, "changes": n} for t, n in tables.items()]
+        raise AssertionError(f"unexpected statement: {sql}")
+    return FakeConnection(handler)
+
+
+def test_first_poll_only_reads_the_newest_id():
+    conn = _change_log([(1, "loan"), (2, "arrears")])
+    assert query_cache._changes_since(conn, None) == (set(), 2)
+
+
+def test_poll_returns_tables_changed_since_the_last_id():
+    conn = _change_log([(1, "loan"), (2, "arrears"), (3, "branch_summary"), (4, "branch_dpd_summary")])
+    assert query_cache._changes_since(conn, 2) == ({"branch_summary", "branch_dpd_summary"}, 4)
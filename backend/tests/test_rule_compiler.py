@@ -0,0 +1,122 @@
+# test_rule_compiler.py
+# -----------------------------------------------
+# 🧪 Purpose: The compiled rule network fires exactly the rules the original
+# rule-by-rule loop fired, one fact set at a time and as a FactTable.
+# -----------------------------------------------
+
+import json
+import os
+import random
+
+from ai_modules.advisor_engine import run_inference_engine
+from ai_modules.rule_compiler import FactTable, compile_rules
+
+RULES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ai_modules", "rules.json")
+
+# Edge cases rules.json does not have yet
+EXTRA_RULES = [
+    {"rule_name": "Numeric equals", "if": [{"fact": "branch_code", "operator": "equals", "value": 7}],
+     "then": {"alert": "a"}},
+    {"rule_name": "Unknown operator", "if": [{"fact": "current_par_percent", "operator": "at_least", "value": 5}],
+     "then": {"alert": "b"}},
+    {"rule_name": "Non-numeric threshold",
+     "if": [{"fact": "current_par_percent", "operator": "greater_than", "value": "high"}],
+     "then": {"alert": "c"}},
+    {"rule_name": "Band", "if": [
+        {"fact": "current_par_percent", "operator": "greater_than", "value": 5},
+        {"fact": "current_par_percent", "operator": "less_than", "value": 20},
+        {"fact": "loan_product_type", "operator": "equals", "value": "Group Loan"},
+    ], "then": {"alert": "d"}},
+    {"rule_name": "No conditions", "if": [], "then": {"alert": "e"}},
+]
+
+
+def check_condition(fact_value, operator, rule_value):
+    """The original advisor_engine check, before the rules were compiled."""
+    try:
+        if operator == "greater_than":
+            return float(fact_value) > float(rule_value)
+        if operator == "less_than":
+            return float(fact_value) < float(rule_value)
+        if operator == "equals":
+            return str(fact_value) == str(rule_value)
+    except Exception:
+        return False
+    return False
+
+
+def reference_fired(facts, rules):
+    """Names of the rules the original loop fired, in rules.json order."""
+    return [
+        rule["rule_name"] for rule in rules
+        if all(c["fact"] in facts and check_condition(facts[c["fact"]], c["operator"], c["value"]) for c in rule["if"])
+    ]
+
+
+def _candidate_values(rules):
+    """fact -> values worth trying: each threshold and its neighbours, matches, near misses, junk."""
+    values = {}
+    for rule in rules:
+        for c in rule["if"]:
+            pool = values.setdefault(c["fact"], [None, "n/a", float("nan"), True, 0, -1])
+            try:
+                threshold = float(c["value"])
+            except (TypeError, ValueError):
+                pool += [c["value"], str(c["value"]).lower()]
+                continue
+            pool += [threshold, threshold - 0.01, threshold + 0.01, int(threshold), str(threshold),
+                     str(c["value"]), threshold * 2, threshold / 2]
+    return values
+
+
+def _random_fact_sets(rules, count, seed=20261018):
+    rng = random.Random(seed)
+    candidates = _candidate_values(rules)
+    fact_sets = []
+    for _ in range(count):
+        facts = {fact: rng.choice(pool) for fact, pool in candidates.items() if rng.random() < 0.85}
+        facts["unused_fact"] = rng.random()
+        fact_sets.append(facts)
+    return fact_sets
+
+
+def _rules():
+    with open(RULES_PATH) as f:
+        return json.load(f) + EXTRA_RULES
+
+
+def test_compiled_engine_matches_the_original_loop():
+    rules = _rules()
+    compiled = compile_rules(rules)
+
+    mismatches = 0
+    for facts in _random_fact_sets(rules, 3000):
+        expected = reference_fired(facts, rules)
+        got = run_inference_engine(facts, compiled)
+        mismatches += [rec["reason"] for rec in got] != expected
+    assert mismatches == 0
+
+
+def test_fact_table_matches_the_original_loop():
+    rules = _rules()
+    compiled = compile_rules(rules)
+    fact_sets = _random_fact_sets(rules, 3000, seed=7)
+    facts_used = sorted({fact for facts in fact_sets for fact in facts})
+    table = FactTable(range(len(fact_sets)), {fact: [facts.get(fact) for facts in fact_sets] for fact in facts_used})
+
+    rows, fired = compiled.evaluate_table(table, chunk_rows=512)
+
+    got = [[] for _ in fact_sets]
+    for row, rule in zip(rows.tolist(), fired.tolist()):
+        got[row].append(compiled.rule_names[rule])
+    # In a table None means unknown, i.e. the fact is missing
+    expected = [reference_fired({f: v for f, v in facts.items() if v is not None}, rules) for facts in fact_sets]
+    assert sum(g != e for g, e in zip(got, expected)) == 0
+
+
+def test_random_facts_exercise_both_outcomes():
+    rules = _rules()
+    fired = [reference_fired(facts, rules) for facts in _random_fact_sets(rules, 3000)]
+    fired_names = {name for names in fired for name in names}
+    assert fired_names == {rule["rule_name"] for rule in rules} - {"Unknown operator", "Non-numeric threshold"}
+    assert any(names == ["No conditions"] for names in fired)
@@ -0,0 +1,76 @@
+# test_summary_tables.py
+# -----------------------------------------------
+# 🧪 Purpose: /api/delinquency inputs read back from built rollups.
+# -----------------------------------------------
+
+from services import summary_tables
+from tests.fake_db import FakeConnection
+
+
+def _rollups(state):
+    def handler(sql, params):
+        if sql.startswith("SELECT state_value FROM summary_state"):
+            return [{"state_value": state[params[0]]}] if params[0] in state else []
+        if "FROM branch_dpd_summary" in sql:
+            assert list(params) == ["Deogarh"]
+            return [{"bucket": "1-30 Days", "customer_count": 4}, {"bucket": "60+ Days", "customer_count": 1}]
+        if "FROM branch_summary" in sql:
+            return [{"total": 20}]
+        raise AssertionError(f"unexpected statement: {sql}")
+    return FakeConnection(handler)
+
+
+def test_delinquency_counts_before_first_refresh():
+    assert summary_tables.read_delinquency_counts(_rollups({})) is None
+
+
+def test_delinquency_counts_from_rollups():
+    conn = _rollups({"watermark": "2026-10-18", "max_dpd": "120"})
+
+    buckets, total_clients, delinquent = summary_tables.read_delinquency_counts(conn, "Deogarh")
+
+    assert [b["bucket"] for b in buckets] == ["1-30 Days", "60+ Days"]
+    assert (total_clients, delinquent) == (20, 5)
+
+
+def _refreshable(statements):
+    def handler(sql, params):
+        statements.append(sql)
+        if sql.startswith("SELECT state_value FROM summary_state"):
+            return [{"state_value": "2026-10-01"}]
+        if sql.startswith("SELECT MAX(dpd_days)"):
+            return [{"max_dpd": 90}]
+        return None
+    return FakeConnection(handler)
+
+
+def test_refresh_drops_cached_rollup_results(monkeypatch):
+    from services import delta_load, query_cache
+
+    monkeypatch.setattr(delta_load, "_change_listeners", [query_cache.invalidate_tables])
+    for endpoint in ("branches", "kpis", "delinquency"):
+        query_cache._cache.set(query_cache.query_cache_key(endpoint, "Deogarh", "admin"), {"cached": True})
+    statements = []
+
+    summary_tables.refresh_summaries(_refreshable(statements), branches=["Deogarh"])
+
+    assert query_cache._cache.get(query_cache.query_cache_key("kpis", "Deogarh", "admin")) is None
+    assert query_cache._cache.get(query_cache.query_cache_key("delinquency", "Deogarh", "admin")) is None
+    assert query_cache._cache.get(query_cache.query_cache_key("branches", "Deogarh", "admin")) == {"cached": True}
+    # Other processes see the refresh in the change log
+    logged = [sql for sql in statements if sql.startswith("INSERT INTO load_change_log")]
+    assert len(logged) == len(summary_tables.SUMMARY_TABLES)
+    query_cache._cache.invalidate(lambda key: True)
+
+
+def test_refresh_with_nothing_to_rebuild_keeps_the_cache(monkeypatch):
+    from services import delta_load
+
+    heard = []
+    monkeypatch.setattr(delta_load, "_change_listeners", [heard.append])
+    statements = []
+
+    summary_tables.refresh_summaries(_refreshable(statements), branches=[])
+
+    assert heard == []
+    assert not any(sql.startswith("INSERT INTO load_change_log") for sql in statements)
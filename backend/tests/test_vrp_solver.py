@@ -0,0 +1,65 @@
+# test_vrp_solver.py
+# -----------------------------------------------
+# 🧪 Purpose: Multi-officer plans leave no client behind while officers have room.
+# -----------------------------------------------
+
+import numpy as np
+import pytest
+
+from ai_modules.distance_matrix import haversine_matrix
+from ai_modules.route_solver import tour_length
+from ai_modules.vrp_solver import solve_vrp
+
+ROAD_FACTOR = 1.4
+
+
+def _matrix(seed, clients, spread=0.2):
+    rng = np.random.default_rng(seed)
+    lats = 23.3 + rng.random(clients + 1) * spread
+    lons = 85.3 + rng.random(clients + 1) * spread
+    return haversine_matrix(lats, lons) * ROAD_FACTOR
+
+
+def _visited(tours):
+    return sorted(c for tour in tours for c in tour[1:-1])
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_no_unassigned_clients_within_capacity(seed):
+    # 35 clients, 3 officers x 12 stops: everyone fits
+    km = _matrix(seed, 35)
+
+    tours, unassigned, _ = solve_vrp(km, officers=3, max_stops=12, time_budget_s=0.05)
+
+    assert unassigned == []
+    assert _visited(tours) == list(range(1, 36))
+    assert len(tours) <= 3
+    assert all(len(tour) - 2 <= 12 for tour in tours)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_unassigned_clients_fit_in_no_tour(seed):
+    km = _matrix(seed, 40)
+    max_stops, max_route_km = 10, 30.0
+
+    tours, unassigned, _ = solve_vrp(km, officers=3, max_stops=max_stops, max_route_km=max_route_km,
+                                     time_budget_s=0.05)
+
+    assert sorted(_visited(tours) + unassigned) == list(range(1, 41))
+    for tour in tours:
+        assert len(tour) - 2 <= max_stops
+        assert tour_length(km, tour) <= max_route_km + 1e-6
+    for client in unassigned:
+        for tour in tours:
+            if len(tour) - 2 < max_stops:
+                added = min(km[a, client] + km[client, b] - km[a, b] for a, b in zip(tour[:-1], tour[1:]))
+                assert tour_length(km, tour) + added > max_route_km - 1e-6
+
+
+def test_more_clients_than_capacity_fills_every_officer():
+    km = _matrix(7, 50)
+
+    tours, unassigned, _ = solve_vrp(km, officers=3, max_stops=12, time_budget_s=0.05)
+
+    assert [len(tour) - 2 for tour in tours] == [12, 12, 12]
+    assert len(unassigned) == 50 - 36